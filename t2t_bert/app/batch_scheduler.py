@@ -0,0 +1,80 @@
+import time
+import numpy as np
+from queue import Queue, Empty
+from threading import Thread
+from concurrent.futures import Future
+
+def pad_features(features_lst, pad_id=0):
+	"""Stacks per-request feature dicts into one batch.
+
+	List valued features (input_ids, input_mask, segment_ids) are padded to
+	the longest sequence in the batch rather than to max_seq_length; scalar
+	features are stacked as they are.
+	"""
+	batch = {}
+	for key in features_lst[0]:
+		values = [features[key] for features in features_lst]
+		if isinstance(values[0], (list, tuple, np.ndarray)):
+			max_length = max([len(value) for value in values])
+			padded = np.full((len(values), max_length), pad_id, dtype=np.int32)
+			for index, value in enumerate(values):
+				padded[index, :len(value)] = value
+			batch[key] = padded
+		else:
+			batch[key] = np.array(values).astype(np.int32)
+	return batch
+
+class MicroBatchScheduler(object):
+	"""Coalesces concurrent single-example requests into model batches.
+
+	A batch is closed once it holds max_batch_size requests or max_wait_ms
+	has passed since its first request arrived, whichever comes first.
+	predict_fn receives the padded batch and must return one result per
+	row, which is routed back to the Future returned by `submit`.
+	"""
+	def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5, pad_id=0):
+		self.predict_fn = predict_fn
+		self.max_batch_size = max_batch_size
+		self.max_wait_ms = max_wait_ms
+		self.pad_id = pad_id
+		self.request_queue = Queue()
+		self.thread = Thread(target=self.run, daemon=True)
+
+	def start(self):
+		self.thread.start()
+		return self
+
+	def submit(self, features):
+		future = Future()
+		self.request_queue.put((features, future))
+		return future
+
+	def submit_batch(self, features_lst):
+		return [self.submit(features) for features in features_lst]
+
+	def collect_batch(self):
+		batch = [self.request_queue.get()]
+		deadline = time.time() + self.max_wait_ms / 1000.0
+		while len(batch) < self.max_batch_size:
+			timeout = deadline - time.time()
+			if timeout <= 0:
+				break
+			try:
+				batch.append(self.request_queue.get(timeout=timeout))
+			except Empty:
+				break
+		return batch
+
+	def run(self):
+		while True:
+			batch = self.collect_batch()
+			futures = [future for _, future in batch]
+			try:
+				features = pad_features([features for features, _ in batch], self.pad_id)
+				results = self.predict_fn(features)
+			except Exception as e:
+				for future in futures:
+					future.set_exception(e)
+				continue
+			for future, result in zip(futures, results):
+				future.set_result(result)
@@ -0,0 +1,70 @@
+import sys,os
+sys.path.append("..")
+import argparse
+import time
+import json
+import numpy as np
+from app.infer import InferAPI
+
+"""
+Cold-start and steady-state latency of the InferAPI predict modes:
+	python benchmark_infer.py --config infer_config.json \
+		--input_file sentences.txt --modes estimator,session,saved_model
+infer_config.json holds the InferAPI config (label2id, init_checkpoint,
+bert_config, max_length, bert_vocab, model_dir, saved_model_dir).
+"""
+
+def check_outputs(api, sent_lst, output):
+	"""Every predict mode must return one scalar class id per sentence."""
+	assert len(output) == len(sent_lst), "{} outputs for {} sentences".format(len(output), len(sent_lst))
+	labels = set(api.label_dict["id2label"].values())
+	for item in output:
+		assert np.ndim(item["pred_label"]) == 0, "pred_label is not a class id: {}".format(item["pred_label"])
+		assert np.ndim(item["max_prob"]) == 0, "max_prob is not a probability: {}".format(item["max_prob"])
+		assert item["label"] in labels, "unknown label {}".format(item["label"])
+
+def run(config, mode, sentences, batch_size, num_requests):
+	config = dict(config, predict_mode=mode)
+	api = InferAPI(config)
+	api.load_label_dict()
+
+	start = time.time()
+	api.init_model()
+	init_time = time.time() - start
+	start = time.time()
+	output = api.infer(sentences[:batch_size])
+	first_time = time.time() - start
+	check_outputs(api, sentences[:batch_size], output)
+
+	latency = []
+	for index in range(num_requests):
+		offset = (index * batch_size) % len(sentences)
+		sent_lst = sentences[offset:offset+batch_size] or sentences[:batch_size]
+		start = time.time()
+		api.infer(sent_lst)
+		latency.append(time.time() - start)
+
+	latency_ms = np.array(latency) * 1000.0
+	print("mode: {} batch_size: {} requests: {}".format(mode, batch_size, num_requests))
+	print("cold start: init {:.1f} ms first request {:.1f} ms".format(
+			init_time * 1000.0, first_time * 1000.0))
+	print("steady state: p50 {:.1f} ms p90 {:.1f} ms p99 {:.1f} ms".format(
+			np.percentile(latency_ms, 50),
+			np.percentile(latency_ms, 90),
+			np.percentile(latency_ms, 99)))
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--config", type=str, required=True)
+	parser.add_argument("--input_file", type=str, required=True)
+	parser.add_argument("--modes", type=str, default="estimator,session,saved_model")
+	parser.add_argument("--batch_size", type=int, default=1)
+	parser.add_argument("--num_requests", type=int, default=100)
+	args = parser.parse_args()
+
+	with open(args.config, "r") as frobj:
+		config = json.load(frobj)
+	with open(args.input_file, "r") as frobj:
+		sentences = [line.strip() for line in frobj if line.strip()]
+	for mode in args.modes.split(","):
+		run(config, mode, sentences, args.batch_size, args.num_requests)
@@ -0,0 +1,57 @@
+from __future__ import print_function
+
+import argparse
+import time
+import json
+import requests
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+"""
+Load test for the app/*_predict.py tornado handlers. Start the server once
+with "micro_batching":True and once with False, run this script against
+each and compare:
+	python benchmark_predict_server.py --url http://127.0.0.1:9883/sentiment \
+		--input_file sentences.txt --concurrency 32 --num_requests 2000
+"""
+
+def send(session, url, sentence):
+	start = time.time()
+	response = session.post(url, data=json.dumps({"sentences":[sentence]}))
+	response.raise_for_status()
+	return time.time() - start
+
+def run(url, sentences, concurrency, num_requests):
+	session = requests.Session()
+	adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency,
+											pool_maxsize=concurrency)
+	session.mount("http://", adapter)
+
+	# warm up the graph before timing
+	send(session, url, sentences[0])
+
+	start = time.time()
+	with ThreadPoolExecutor(max_workers=concurrency) as executor:
+		latency = list(executor.map(lambda i: send(session, url, sentences[i % len(sentences)]),
+							range(num_requests)))
+	total_time = time.time() - start
+
+	latency_ms = np.array(latency) * 1000.0
+	print("requests: {} concurrency: {}".format(num_requests, concurrency))
+	print("p50: {:.1f} ms p90: {:.1f} ms p99: {:.1f} ms".format(
+			np.percentile(latency_ms, 50),
+			np.percentile(latency_ms, 90),
+			np.percentile(latency_ms, 99)))
+	print("throughput: {:.1f} sentences/s".format(num_requests / total_time))
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--url", type=str, default="http://127.0.0.1:9883/sentiment")
+	parser.add_argument("--input_file", type=str, required=True)
+	parser.add_argument("--concurrency", type=int, default=32)
+	parser.add_argument("--num_requests", type=int, default=2000)
+	args = parser.parse_args()
+
+	with open(args.input_file, "r") as frobj:
+		sentences = [line.strip() for line in frobj if line.strip()]
+	run(args.url, sentences, args.concurrency, args.num_requests)
@@ -10,6 +10,7 @@ from model_io import model_io
 from example import feature_writer, write_to_tfrecords, classifier_processor
 import json
 from data_generator import tokenization
+from app.batch_scheduler import MicroBatchScheduler
 import os
 
 os.environ["CUDA_VISIBLE_DEVICES"] = ""
@@ -120,6 +121,30 @@ class InferAPI(object):
             "segment_ids":np.array(segment_ids_lst).astype(np.int32),
             "label_ids":np.array(label_ids_lst).astype(np.int32)}
 
+    def get_single_features(self, sent):
+        """Unpadded features of one sentence, padded later per micro batch."""
+        sent = full2half(sent)
+        tokens_a = self.tokenizer.tokenize(sent)
+        if len(tokens_a) > self.max_seq_length - 2:
+            tokens_a = tokens_a[0:(self.max_seq_length - 2)]
+        tokens = ["[CLS]"] + tokens_a + ["[SEP]"]
+        input_ids = self.tokenizer.convert_tokens_to_ids(tokens)
+        return {"input_ids":input_ids,
+            "input_mask":[1] * len(input_ids),
+            "segment_ids":[0] * len(input_ids),
+            "label_ids":0}
+
+    def predict_padded_batch(self, features):
+        """Runs one padded batch through the queued estimator, which yields
+        one prediction per row."""
+        self.input_queue.put(features)
+        predictions_lst = []
+        for _ in range(len(features["input_ids"])):
+            predictions = self.output_queue.get()
+            predictions["label"] = self.label_dict["id2label"][str(predictions["pred_label"])]
+            predictions_lst.append(predictions)
+        return predictions_lst
+
     def input_fn(self, input_features):
         dataset = tf.data.Dataset.from_tensor_slices(input_features)
         dataset = dataset.batch(self.config.get("batch_size", 20))
@@ -163,10 +188,11 @@ class InferAPI(object):
                        'segment_ids': tf.int32,
                        'label_ids': tf.int32}
         
-        output_shapes = {'input_ids': [None, self.max_seq_length ],
-                       'input_mask': [None, self.max_seq_length ],
-                       'segment_ids': [None, self.max_seq_length ],
-                       'label_ids': [1,]}
+        # sequence length is dynamic, micro batches are padded to their longest sentence
+        output_shapes = {'input_ids': [None, None],
+                       'input_mask': [None, None],
+                       'segment_ids': [None, None],
+                       'label_ids': [None,]}
         dataset = tf.data.Dataset.from_generator(self.generate_from_queue, output_types=output_types, output_shapes=output_shapes)
         #dataset = dataset.batch(self.config.get("batch_size", 20))
         return dataset
@@ -211,7 +237,10 @@ model_config = {
     "bert_config":"/data/xuht/bert/chinese_L-12_H-768_A-12/bert_config.json",
     "max_length":128,
     "bert_vocab":"/data/xuht/bert/chinese_L-12_H-768_A-12/vocab.txt",
-    "model_dir":"/data/xuht/eventy_detection/event/model"
+    "model_dir":"/data/xuht/eventy_detection/event/model",
+    "micro_batching":True,
+    "max_batch_size":32,
+    "max_wait_ms":5
     
 }
 
@@ -221,6 +250,9 @@ api.init_model()
 from threading import Thread
 t = Thread(target=api.predict_from_queue, daemon=True)
 t.start()
+scheduler = MicroBatchScheduler(api.predict_padded_batch,
+                max_batch_size=model_config["max_batch_size"],
+                max_wait_ms=model_config["max_wait_ms"]).start()
 # while True:
 #     import time
 #     try:
@@ -234,15 +266,19 @@ import tornado.ioloop
 import tornado.web
 import tornado.httpserver
 import json
+import asyncio
 
 
 class PredictHandler(tornado.web.RequestHandler):
-     def post(self):
+    async def post(self):
         body = json.loads(self.request.body.decode(), encoding="utf-8")
         sentences = body.get("sentences")
-        result = api.predict_batch(sentences)
+        if model_config["micro_batching"]:
+            futures = scheduler.submit_batch([api.get_single_features(sent) for sent in sentences])
+            result = await asyncio.gather(*[asyncio.wrap_future(future) for future in futures])
+        else:
+            result = api.predict_batch(sentences)
         result = [[[row['label']] for row in result], [[float(row['max_prob'])] for row in result]]
-        # print(result)
         return self.write(json.dumps({"code":200, "data":result}, ensure_ascii=False))
 def main():
     application = tornado.web.Application([(r"/lxm",PredictHandler),])
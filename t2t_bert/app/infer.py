@@ -10,6 +10,8 @@ from model_io import model_io
 from example import feature_writer, write_to_tfrecords, classifier_processor
 import json
 from data_generator import tokenization
+from data_generator import length_bucketing
+from threading import Lock
 
 import os
 
@@ -27,6 +29,19 @@ def full2half(s):
 		n.append(num)
 	return ''.join(n)
 
+def saved_model_outputs(predictions):
+	"""The export model_fn returns the [batch_size, num_classes] probabilities
+	as both pred_label and max_prob, turns them into the class id and its
+	probability as the estimator and session modes return them."""
+	prob = np.asarray(predictions["max_prob"])
+	if prob.ndim < 2:
+		return predictions
+	outputs = dict(predictions)
+	outputs["prob"] = prob
+	outputs["pred_label"] = np.argmax(prob, axis=-1)
+	outputs["max_prob"] = np.max(prob, axis=-1)
+	return outputs
+
 class InferAPI(object):
 	def __init__(self, config):
 		self.config = config
@@ -36,41 +51,66 @@ class InferAPI(object):
 			self.label_dict = json.load(frobj)
 
 	def init_model(self):
+		"""Builds the predictor selected by config["predict_mode"].
+
+		"estimator" (default) calls Estimator.predict per request, which
+		rebuilds the graph and restores the checkpoint every time. "session"
+		builds the graph once and keeps a live tf.Session, "saved_model"
+		loads config["saved_model_dir"] exported by distributed_bin/export_api.py.
+		In session mode config["bucket_boundaries"] (e.g. [16, 32, 64]) pads
+		each batch to its length bucket instead of max_length.
+		"""
+		self.predict_mode = self.config.get("predict_mode", "estimator")
+		self.predict_lock = Lock()
+		if self.predict_mode == "session":
+			self.init_session_model()
+		elif self.predict_mode == "saved_model":
+			self.init_saved_model()
+		else:
+			self.init_estimator_model()
+
+	def init_model_fn(self):
+		init_checkpoint = self.config["init_checkpoint"]
+		bert_config = json.load(open(self.config["bert_config"], "r"))
+
+		self.model_config = Bunch(bert_config)
+		self.model_config.use_one_hot_embeddings = True
+		self.model_config.scope = "bert"
+		self.model_config.dropout_prob = 0.1
+		self.model_config.label_type = "single_label"
+
+		opt_config = Bunch({"init_lr":2e-5, "num_train_steps":1e30, "cycle":False})
+		model_io_config = Bunch({"fix_lm":False})
+
+		self.num_classes = len(self.label_dict["id2label"])
+		self.init_tokenizer()
+
+		self.model_io_fn = model_io.ModelIO(model_io_config)
+
+		model_fn = bert_classifier_estimator.classifier_model_fn_builder(
+										self.model_config, 
+										self.num_classes, 
+										init_checkpoint, 
+										reuse=None, 
+										load_pretrained=True,
+										model_io_fn=self.model_io_fn,
+										model_io_config=model_io_config, 
+										opt_config=opt_config)
+		return model_fn
+
+	def init_tokenizer(self):
+		self.max_seq_length = self.config["max_length"]
+		self.tokenizer = tokenization.FullTokenizer(
+			vocab_file=self.config["bert_vocab"], 
+			do_lower_case=True)
+
+	def init_estimator_model(self):
 
 		self.graph = tf.Graph()
 		with self.graph.as_default():
 
-			init_checkpoint = self.config["init_checkpoint"]
-			bert_config = json.load(open(self.config["bert_config"], "r"))
-
-			self.model_config = Bunch(bert_config)
-			self.model_config.use_one_hot_embeddings = True
-			self.model_config.scope = "bert"
-			self.model_config.dropout_prob = 0.1
-			self.model_config.label_type = "single_label"
-
-			opt_config = Bunch({"init_lr":2e-5, "num_train_steps":1e30, "cycle":False})
-			model_io_config = Bunch({"fix_lm":False})
-
-			self.num_classes = len(self.label_dict["id2label"])
-			self.max_seq_length = self.config["max_length"]
-
-			self.tokenizer = tokenization.FullTokenizer(
-				vocab_file=self.config["bert_vocab"], 
-				do_lower_case=True)
-
 			self.sess = tf.Session()
-			self.model_io_fn = model_io.ModelIO(model_io_config)
-	
-			model_fn = bert_classifier_estimator.classifier_model_fn_builder(
-											self.model_config, 
-											self.num_classes, 
-											init_checkpoint, 
-											reuse=None, 
-											load_pretrained=True,
-											model_io_fn=self.model_io_fn,
-											model_io_config=model_io_config, 
-											opt_config=opt_config)
+			model_fn = self.init_model_fn()
 
 			estimator_config = tf.estimator.RunConfig()
 			self.estimator = tf.estimator.Estimator(
@@ -78,63 +118,107 @@ class InferAPI(object):
         				model_dir=self.config["model_dir"],
         				config=estimator_config)
 
+	def get_single_features(self, sent):
+		"""Unpadded features of one sentence."""
+		sent = full2half(sent)
+		tokens_a = self.tokenizer.tokenize(sent)
+		if len(tokens_a) > self.max_seq_length - 2:
+			tokens_a = tokens_a[0:(self.max_seq_length - 2)]
+		tokens = ["[CLS]"] + tokens_a + ["[SEP]"]
+		input_ids = self.tokenizer.convert_tokens_to_ids(tokens)
+		return {"input_ids":input_ids,
+			"input_mask":[1] * len(input_ids),
+			"segment_ids":[0] * len(input_ids),
+			"label_ids":0}
+
 	def get_input_features(self, sent_lst):
-		input_ids_lst, input_mask_lst, segment_ids_lst = [], [], []
-		label_ids_lst = []
-		for sent in sent_lst:
-			sent = full2half(sent)
-			tokens_a = self.tokenizer.tokenize(sent)
-			if len(tokens_a) > self.max_seq_length - 2:
-				tokens_a = tokens_a[0:(self.max_seq_length - 2)]
-
-			tokens = []
-			segment_ids = []
-			tokens.append("[CLS]")
-			segment_ids.append(0)
-
-			for token in tokens_a:
-				tokens.append(token)
-				segment_ids.append(0)
-			tokens.append("[SEP]")
-			segment_ids.append(0)
-
-			input_ids = self.tokenizer.convert_tokens_to_ids(tokens)
-			input_mask = [1] * len(input_ids)
-
-			# Zero-pad up to the sequence length.
-			while len(input_ids) < self.max_seq_length:
-				input_ids.append(0)
-				input_mask.append(0)
-				segment_ids.append(0)
-			label_ids = 0
-
-			input_ids_lst.append(input_ids)
-			input_mask_lst.append(input_mask)
-			segment_ids_lst.append(segment_ids)
-			label_ids_lst.append(label_ids)
-
-		return  {"input_ids":np.array(input_ids_lst).astype(np.int32),
-			"input_mask":np.array(input_mask_lst).astype(np.int32),
-			"segment_ids":np.array(segment_ids_lst).astype(np.int32),
-			"label_ids":np.array(label_ids_lst).astype(np.int32)}
+		features_lst = [self.get_single_features(sent) for sent in sent_lst]
+		return length_bucketing.pad_to_length(features_lst, self.max_seq_length)
 
 	def input_fn(self, input_features):
 		dataset = tf.data.Dataset.from_tensor_slices(input_features)
 		dataset = dataset.batch(self.config.get("batch_size", 20))
 		return dataset
 
-	def infer(self, sent_lst):
+	def init_session_model(self):
+		"""Builds the predict graph once and keeps its session open.
+
+		Variables come from the latest checkpoint in config["model_dir"] as
+		Estimator.predict would pick them, else from init_checkpoint.
+		"""
+		self.graph = tf.Graph()
 		with self.graph.as_default():
-			input_features = self.get_input_features(sent_lst)
-			output = []
-			for result in self.estimator.predict(input_fn=lambda:  self.input_fn(input_features)):
-				output.append(result)
+			model_fn = self.init_model_fn()
 
+			self.feed_tensors = {
+				"input_ids":tf.placeholder(tf.int32, [None, None], name='input_ids'),
+				"input_mask":tf.placeholder(tf.int32, [None, None], name='input_mask'),
+				"segment_ids":tf.placeholder(tf.int32, [None, None], name='segment_ids'),
+				"label_ids":tf.placeholder(tf.int32, [None], name='label_ids')
+			}
+			output_spec = model_fn(self.feed_tensors, None, tf.estimator.ModeKeys.PREDICT)
+			self.fetch_tensors = output_spec.predictions
 
-			for item in output:
-				item["label"] = self.label_dict["id2label"][str(item["pred_label"])]
-			
-			return output
+			self.sess = tf.Session()
+			# load_pretrained initializes from init_checkpoint
+			self.sess.run(tf.global_variables_initializer())
+			checkpoint = tf.train.latest_checkpoint(self.config.get("model_dir", ""))
+			if checkpoint:
+				saver = tf.train.Saver()
+				saver.restore(self.sess, checkpoint)
+				print("==succeeded in restoring {}==".format(checkpoint))
+			self.graph.finalize()
+		self.predict_fn = self.session_predict
+
+	def init_saved_model(self):
+		from tensorflow.contrib import predictor
+		self.init_tokenizer()
+		self.graph = tf.Graph()
+		with self.graph.as_default():
+			self.saved_model_predict_fn = predictor.from_saved_model(self.config["saved_model_dir"])
+		self.predict_fn = self.saved_model_predict
+
+	def saved_model_predict(self, features):
+		feed_features = {key:features[key] for key in self.saved_model_predict_fn.feed_tensors}
+		return saved_model_outputs(self.saved_model_predict_fn(feed_features))
+
+	def session_predict(self, features):
+		feed_dict = {self.feed_tensors[key]:features[key] for key in self.feed_tensors}
+		return self.sess.run(self.fetch_tensors, feed_dict=feed_dict)
+
+	def predict(self, features):
+		"""Runs one padded feature batch, safe to call from many threads.
+
+		Returns the predictions dict of the model_fn with one row per example.
+		"""
+		with self.predict_lock:
+			return self.predict_fn(features)
+
+	def infer(self, sent_lst):
+		if self.predict_mode == "session" and self.config.get("bucket_boundaries"):
+			# the session graph takes any length, pad per length bucket
+			features_lst = [self.get_single_features(sent) for sent in sent_lst]
+			boundaries = length_bucketing.parse_bucket_boundaries(
+								self.config["bucket_boundaries"], self.max_seq_length)
+			output = length_bucketing.bucketed_predict(self.predict, features_lst,
+								boundaries, self.config.get("batch_size", 20))
+		elif self.predict_mode != "estimator":
+			input_features = self.get_input_features(sent_lst)
+			predictions = self.predict(input_features)
+			output = []
+			for index in range(len(sent_lst)):
+				output.append({key:predictions[key][index] for key in predictions})
+		else:
+			with self.graph.as_default():
+				input_features = self.get_input_features(sent_lst)
+				output = []
+				for result in self.estimator.predict(input_fn=lambda:  self.input_fn(input_features)):
+					output.append(result)
+
+		for item in output:
+			item["label"] = self.label_dict["id2label"][str(item["pred_label"])]
+		
+		return output
 
 	# def infer(self, sent_lst):
 	# 	with self.graph.as_default():
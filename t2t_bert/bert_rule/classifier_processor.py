@@ -43,7 +43,7 @@ def clean(text):
 class RuleMatch(object):
 	def __init__(self, config={}):
 		self.config = config
-		self.rule_match_api = KeywordProcessor()	
+		self.rule_match_api = KeywordProcessor(backend="aho_corasick")	
 
 	def load(self):
 		with open(self.config["rule_path"], "r") as frobj:
@@ -0,0 +1,104 @@
+import numpy as np
+import tensorflow as tf
+
+"""
+Compact masked lm pretraining records.
+
+The padded schema stores input_ids, input_mask and segment_ids as
+[max_seq_length] int64 lists and the masked lm features as
+[max_predictions_per_seq] lists. The compact schema stores
+	input_ids             unpadded little endian int32 bytes
+	length                number of tokens
+	segment_a_length      number of segment 0 tokens, the rest is segment 1
+	masked_lm_positions   unpadded int32 bytes
+	masked_lm_ids         unpadded int32 bytes
+	next_sentence_labels  int64
+and decode_compact_record rebuilds the padded features, masks and
+weights in the input pipeline. Files can be GZIP or ZLIB compressed, see
+record_options.
+"""
+
+RECORD_DTYPE = np.dtype("<i4")
+
+compact_name_to_features = {
+	"input_ids":tf.FixedLenFeature([], tf.string),
+	"length":tf.FixedLenFeature([], tf.int64),
+	"segment_a_length":tf.FixedLenFeature([], tf.int64),
+	"masked_lm_positions":tf.FixedLenFeature([], tf.string),
+	"masked_lm_ids":tf.FixedLenFeature([], tf.string),
+	"next_sentence_labels":tf.FixedLenFeature([], tf.int64),
+}
+
+def record_options(compression_type):
+	"""TFRecordWriter options of "", "GZIP" or "ZLIB"."""
+	if not compression_type:
+		return None
+	return tf.python_io.TFRecordOptions(
+				getattr(tf.python_io.TFRecordCompressionType, compression_type.upper()))
+
+def create_int_feature(values):
+	return tf.train.Feature(int64_list=tf.train.Int64List(value=list(values)))
+
+def create_ids_feature(values):
+	return tf.train.Feature(bytes_list=tf.train.BytesList(
+				value=[np.asarray(values, dtype=RECORD_DTYPE).tobytes()]))
+
+def create_compact_example(input_ids, segment_ids, masked_lm_positions,
+							masked_lm_ids, next_sentence_label):
+	"""tf.train.Example of one unpadded instance, segment_ids must be
+	zeros followed by ones."""
+	segment_ids = np.asarray(segment_ids)
+	segment_a_length = int(np.sum(segment_ids == 0))
+	assert np.all(segment_ids[segment_a_length:] == 1), \
+		"compact records need segment ids of the form 0..0 1..1"
+	features = {
+		"input_ids":create_ids_feature(input_ids),
+		"length":create_int_feature([len(input_ids)]),
+		"segment_a_length":create_int_feature([segment_a_length]),
+		"masked_lm_positions":create_ids_feature(masked_lm_positions),
+		"masked_lm_ids":create_ids_feature(masked_lm_ids),
+		"next_sentence_labels":create_int_feature([next_sentence_label])
+	}
+	return tf.train.Example(features=tf.train.Features(feature=features))
+
+def _pad_ids(ids, length):
+	ids = ids[:length]
+	ids = tf.pad(ids, [[0, length - tf.shape(ids)[0]]])
+	ids.set_shape([length])
+	return ids
+
+def decode_compact_record(record, max_seq_length, max_predictions_per_seq,
+						with_ori_ids=False):
+	"""Features of the padded schema, as int32 and float32 like
+	tf_data_utils._decode_record, from a compact record."""
+	example = tf.parse_single_example(record, compact_name_to_features)
+	length = tf.minimum(tf.to_int32(example["length"]), max_seq_length)
+	segment_a_length = tf.to_int32(example["segment_a_length"])
+	input_ids = _pad_ids(tf.decode_raw(example["input_ids"], tf.int32), max_seq_length)
+	masked_lm_positions = tf.decode_raw(example["masked_lm_positions"], tf.int32)
+	num_predictions = tf.minimum(tf.shape(masked_lm_positions)[0], max_predictions_per_seq)
+	masked_lm_positions = _pad_ids(masked_lm_positions, max_predictions_per_seq)
+	masked_lm_ids = _pad_ids(tf.decode_raw(example["masked_lm_ids"], tf.int32),
+							max_predictions_per_seq)
+
+	positions = tf.range(max_seq_length)
+	input_mask = tf.cast(positions < length, tf.int32)
+	features = {
+		"input_ids":input_ids,
+		"input_mask":input_mask,
+		"segment_ids":tf.cast(positions >= segment_a_length, tf.int32) * input_mask,
+		"masked_lm_positions":masked_lm_positions,
+		"masked_lm_ids":masked_lm_ids,
+		"masked_lm_weights":tf.cast(tf.range(max_predictions_per_seq) < num_predictions,
+									tf.float32),
+		"next_sentence_labels":tf.to_int32(example["next_sentence_labels"])
+	}
+	if with_ori_ids:
+		# the unmasked input, masked_lm_ids put back at their positions
+		prediction_mask = tf.cast(tf.range(max_predictions_per_seq) < num_predictions, tf.int32)
+		position_one_hot = tf.one_hot(masked_lm_positions, max_seq_length, dtype=tf.int32)
+		position_one_hot *= tf.expand_dims(prediction_mask, axis=-1)
+		is_masked = tf.reduce_max(position_one_hot, axis=0)
+		features["input_ori_ids"] = input_ids * (1 - is_masked) + tf.reduce_sum(
+						position_one_hot * tf.expand_dims(masked_lm_ids, axis=-1), axis=0)
+	return features
@@ -40,6 +40,9 @@ from heapq import nsmallest
 import sys,os
 
 from data_generator import tokenization
+from data_generator import document_store
+from data_generator import masked_lm_sampler
+from data_generator import compact_pretrain_record
 import tensorflow as tf
 
 from collections import namedtuple
@@ -50,6 +53,9 @@ from heapq import nsmallest
 from itertools import accumulate
 import random
 import time, re
+import tempfile
+import traceback
+from queue import Empty
 
 from multiprocessing import Process, Manager
 
@@ -119,24 +125,48 @@ flags.DEFINE_string("doc_index", "mrc_pretrain",
 flags.DEFINE_string("doc_type", "_doc",
 					"Input raw text file (or comma-separated list of files).")
 
-try:
-	from data_generator import es_indexing
-	config = {
-		'username':FLAGS.es_user_name,
-		'password':FLAGS.password,
-		'es_url':'http://zsearch.alipay.com:9999'
-	}
-	es_api = es_indexing.ESSearch(config)
+flags.DEFINE_string("doc_store", "mmap",
+					"Where tokenized documents are kept for instance creation: "
+					"mmap for a local memory-mapped store, es for elasticsearch.")
+
+flags.DEFINE_string("doc_store_path", None,
+					"Local path prefix of the mmap document store, "
+					"defaults to doc_index under the temp dir.")
+
+flags.DEFINE_bool("batch_masking", False,
+					"Whether to mask instances in numpy batches instead of one by one.")
+
+flags.DEFINE_integer("masking_batch_size", 1024,
+					"Number of instances masked together when batch_masking is on.")
+
+flags.DEFINE_string("record_format", "padded",
+					"padded tf.train.Example lists or compact unpadded int32 records, "
+					"see compact_pretrain_record.")
+
+flags.DEFINE_string("compression_type", "",
+					"Output record compression: empty, GZIP or ZLIB.")
+
+if FLAGS.doc_store == "es":
 	try:
-		es_api.delete(FLAGS.doc_index)
-		es_api.create(FLAGS.doc_index)
-		time.sleep(60)
-		print("==delete old index and create new index==")
+		from data_generator import es_indexing
+		config = {
+			'username':FLAGS.es_user_name,
+			'password':FLAGS.password,
+			'es_url':'http://zsearch.alipay.com:9999'
+		}
+		es_api = es_indexing.ESSearch(config)
+		try:
+			es_api.delete(FLAGS.doc_index)
+			es_api.create(FLAGS.doc_index)
+			time.sleep(60)
+			print("==delete old index and create new index==")
+		except:
+			es_api.create(FLAGS.doc_index)
+			time.sleep(60)
+			print("==create new index==")
 	except:
-		es_api.create(FLAGS.doc_index)
-		time.sleep(60)
-		print("==create new index==")
-except:
+		es_api = None
+else:
 	es_api = None
 
 TrainingInstance = namedtuple("TrainingInstance",
@@ -164,6 +194,16 @@ def write_single_sintance_to_example_files(writer, instance, tokenizer, max_seq_
 	segment_ids = list(instance.segment_ids)
 	# assert len(input_ids) <= max_seq_length
 
+	if FLAGS.record_format == "compact":
+		next_sentence_label = 1 if instance.is_random_next else 0
+		tf_example = compact_pretrain_record.create_compact_example(input_ids,
+						segment_ids,
+						list(instance.masked_lm_positions),
+						tokenizer.convert_tokens_to_ids(instance.masked_lm_labels),
+						next_sentence_label)
+		writer.write(tf_example.SerializeToString())
+		return
+
 	input_ids = tokenizer.padding(input_ids, max_seq_length, 0)
 	input_mask = tokenizer.padding(input_mask, max_seq_length, 0)
 	segment_ids = tokenizer.padding(segment_ids, max_seq_length, 0)
@@ -212,6 +252,59 @@ def write_single_sintance_to_example_files(writer, instance, tokenizer, max_seq_
 			tf.logging.info(
 					"%s: %s" % (feature_name, " ".join([str(x) for x in values])))
 
+def is_punctuation_token(token):
+	return bool(re.search(CH_PUNCTUATION, token) or re.search(EN_PUNCTUATION, token))
+
+def write_instance_batch_to_example_files(writer, instances, sampler, id_remap,
+									tokenizer, max_seq_length, inst_index):
+	"""Masks a batch of unmasked instances with `sampler` and writes them.
+
+	Sampling runs on exact vocab ids so "##" pieces keep their identity for
+	whole word masking, `id_remap` then applies convert_tokens_to_ids's
+	id mapping to the written ids.
+	"""
+	unk_id = tokenizer.vocab["[UNK]"]
+	input_ids, lengths = masked_lm_sampler.pad_id_batch(
+			[[tokenizer.vocab.get(token, unk_id) for token in instance.tokens]
+				for instance in instances], max_seq_length)
+	segment_ids, _ = masked_lm_sampler.pad_id_batch(
+			[instance.segment_ids for instance in instances], max_seq_length)
+	input_mask = (np.arange(max_seq_length)[None, :] < lengths[:, None]).astype(np.int32)
+
+	masked = sampler.mask_batch(input_ids, lengths)
+	masked_input_ids = id_remap[masked["input_ids"]]
+	masked_lm_ids = np.where(masked["masked_lm_weights"] > 0,
+							id_remap[masked["masked_lm_ids"]], 0)
+
+	for row, instance in enumerate(instances):
+		next_sentence_label = 1 if instance.is_random_next else 0
+		if FLAGS.record_format == "compact":
+			num_predictions = int(np.sum(masked["masked_lm_weights"][row] > 0))
+			tf_example = compact_pretrain_record.create_compact_example(
+							masked_input_ids[row][:lengths[row]],
+							segment_ids[row][:lengths[row]],
+							masked["masked_lm_positions"][row][:num_predictions],
+							masked_lm_ids[row][:num_predictions],
+							next_sentence_label)
+			writer.write(tf_example.SerializeToString())
+			continue
+		features = collections.OrderedDict()
+		features["input_ids"] = create_int_feature(masked_input_ids[row])
+		features["input_mask"] = create_int_feature(input_mask[row])
+		features["segment_ids"] = create_int_feature(segment_ids[row])
+		features["masked_lm_positions"] = create_int_feature(masked["masked_lm_positions"][row])
+		features["masked_lm_ids"] = create_int_feature(masked_lm_ids[row])
+		features["masked_lm_weights"] = create_float_feature(masked["masked_lm_weights"][row])
+		features["next_sentence_labels"] = create_int_feature([next_sentence_label])
+
+		tf_example = tf.train.Example(features=tf.train.Features(feature=features))
+		writer.write(tf_example.SerializeToString())
+
+		if inst_index + row < 10:
+			tf.logging.info("*** Example ***")
+			tf.logging.info("tokens: %s" % " ".join(
+					[x for x in instance.tokens]))
+
 def create_int_feature(values):
 	feature = tf.train.Feature(int64_list=tf.train.Int64List(value=list(values)))
 	return feature
@@ -260,8 +353,11 @@ def create_instances_from_document(
 		all_documents, document_index, vocab_words,
 		max_seq_length, short_seq_prob,
 		masked_lm_prob, max_predictions_per_seq,
-		rng, num_of_documents):
-	"""Creates `TrainingInstance`s for a single document."""
+		rng, num_of_documents, do_mask=True):
+	"""Creates `TrainingInstance`s for a single document.
+
+	With do_mask=False the instances are left unmasked, for batch masking.
+	"""
 	document = get_document(all_documents, es_api, document_index)
 	if not document:
 		return []
@@ -353,9 +449,12 @@ def create_instances_from_document(
 		tokens.append("[SEP]")
 		segment_ids.append(1)
 
-		(tokens, masked_lm_positions,
-		 masked_lm_labels) = create_masked_lm_predictions(
-				 tokens, masked_lm_prob, max_predictions_per_seq, vocab_words, rng)
+		if do_mask:
+			(tokens, masked_lm_positions,
+			 masked_lm_labels) = create_masked_lm_predictions(
+					 tokens, masked_lm_prob, max_predictions_per_seq, vocab_words, rng)
+		else:
+			masked_lm_positions, masked_lm_labels = [], []
 		instance = TrainingInstance(
 				tokens=tokens,
 				segment_ids=segment_ids,
@@ -372,9 +471,100 @@ def valid_line(tokens):
 	else:
 		return True
 
-def read_file(input_files, tokenizer, max_seq_length):
-	"""Create `TrainingInstance`s from raw text."""
-	# all_documents = [[]]
+def build_file_shards(input_files, process_num):
+	"""Splits input files into byte ranges, about `process_num` in total."""
+	file_sizes = [(input_file, tf.gfile.Stat(input_file).length) for input_file in input_files]
+	total_size = sum([size for _, size in file_sizes])
+	shard_size = max(1, int(np.ceil(total_size / float(process_num))))
+	shards = []
+	for input_file, size in file_sizes:
+		for start in range(0, size, shard_size):
+			shards.append((input_file, start, min(start + shard_size, size)))
+	return shards
+
+def read_file_shard(input_file, start, end, tokenizer):
+	"""Yields the tokenized documents owned by byte range [start, end).
+
+	Documents are delimited by blank lines. A shard owns every document that
+	starts after the first blank line at or after `start` (or at offset 0),
+	and reads past `end` up to and including the first blank line there, so
+	neighbouring shards never split or duplicate a document.
+	"""
+	with tf.gfile.GFile(input_file, "rb") as reader:
+		if start > 0:
+			# skip the line holding byte start-1, it belongs to the previous shard
+			reader.seek(start - 1)
+			reader.readline()
+			while True:
+				pos = reader.tell()
+				line = reader.readline()
+				if not line:
+					return
+				# same blank test as the document loop, unicode whitespace included
+				if not tokenization.convert_to_unicode(line).strip():
+					if pos >= end:
+						return
+					break
+
+		document = []
+		while True:
+			pos = reader.tell()
+			line = reader.readline()
+			if not line:
+				break
+			line = tokenization.convert_to_unicode(line).strip()
+
+			# Empty lines are used as document delimiters
+			if not line:
+				if document:
+					yield document
+				document = []
+				if pos >= end:
+					return
+				continue
+
+			tokens = tokenizer.tokenize(line)
+			if tokens and valid_line(tokens):
+				document.append(tokens)
+		if document:
+			yield document
+
+class WorkerError(object):
+	"""Sent by a failed tokenize_shards worker instead of its sentinel."""
+	def __init__(self, message):
+		self.message = message
+
+def tokenize_shards(shards, tokenizer, queue, to_ids=False, batch_size=100):
+	"""Worker: tokenizes its shards and streams documents to `queue` in
+	batches, followed by a None sentinel, or a WorkerError if it fails.
+	With `to_ids` sentences are sent as vocab ids instead of tokens."""
+	try:
+		documents = []
+		for (input_file, start, end) in shards:
+			for document in read_file_shard(input_file, start, end, tokenizer):
+				if to_ids:
+					document = [[tokenizer.vocab[token] for token in tokens]
+									for tokens in document]
+				documents.append(document)
+				if len(documents) >= batch_size:
+					queue.put(documents)
+					documents = []
+		if documents:
+			queue.put(documents)
+	except Exception:
+		queue.put(WorkerError(traceback.format_exc()))
+		raise
+	queue.put(None)
+
+def read_file(input_files, tokenizer, max_seq_length, process_num=20,
+			doc_store_path=None, queue_timeout=60):
+	"""Tokenizes raw text in `process_num` processes and writes documents to
+	the mmap store at `doc_store_path`, or indexes them to es if it is None.
+
+	Returns the number of stored documents, whose doc_id are 0..n-1. Raises
+	RuntimeError if a worker fails or dies, the queue is checked for dead
+	workers every `queue_timeout` seconds.
+	"""
 
 	# Input file format:
 	# (1) One sentence per line. These should ideally be actual sentences, not
@@ -382,86 +572,87 @@ def read_file(input_files, tokenizer, max_seq_length):
 	# sentence boundaries for the "next sentence prediction" task).
 	# (2) Blank lines between documents. Document boundaries are needed so
 	# that the "next sentence prediction" task doesn't span between documents.
-	es_all_documents = [[]]
-	valid_doc_cnt = 0
-	for input_file in input_files:
-		with tf.gfile.GFile(input_file, "r") as reader:
-			while True:
-				line = reader.readline()
-				
-				if not line:
-					break
-				line = line.strip()
+	shards = build_file_shards(input_files, process_num)
+	queue = multiprocessing.Queue(maxsize=4 * process_num)
+	workers = []
+	for worker_id in range(process_num):
+		worker_shards = shards[worker_id::process_num]
+		if not worker_shards:
+			continue
+		worker = Process(target=tokenize_shards,
+						args=(worker_shards, tokenizer, queue, doc_store_path is not None))
+		worker.daemon = True
+		worker.start()
+		workers.append(worker)
+	tf.logging.info("** tokenizing %d shards with %d processes **", len(shards), len(workers))
+
+	if doc_store_path is not None:
+		doc_writer = document_store.DocumentStoreWriter(doc_store_path)
+	else:
+		doc_writer = None
 
-				# Empty lines are used as document delimiters
-				if not line:
-					# all_documents.append([])
-					es_all_documents.append([])
-					continue
-				# tf.logging.info(" line {}".format(line))
-
-				tokens = tokenizer.tokenize(line)
-				valid_flag = valid_line(tokens)
-
-				if tokens and valid_flag:
-					# all_documents[-1].append(tokens)
-					es_all_documents[-1].append(tokens)
-				if np.mod(len(es_all_documents), 1000) == 0:
-					es_index_documents = []
-					for item in es_all_documents:
-						if not item:
-							continue
-						es_index_documents.append({
-								"doc":json.dumps(item, ensure_ascii=False),
-								"doc_id":valid_doc_cnt
-							})
-						valid_doc_cnt += 1
-					es_api.index_batch_doc(FLAGS.doc_index, FLAGS.doc_type, es_index_documents, 1000)
-					es_all_documents = [[]]
-					doc_index_lst = []
-					
-	if len(es_all_documents) >= 1:
-		es_index_documents = []
-		for item in es_all_documents:
-			if not item:
-				continue
-			es_index_documents.append({
-					"doc":json.dumps(item, ensure_ascii=False),
-					"doc_id":valid_doc_cnt
-				})
+	valid_doc_cnt = 0
+	es_index_documents = []
+	finished = 0
+	while finished < len(workers):
+		try:
+			documents = queue.get(timeout=queue_timeout)
+		except Empty:
+			# a killed worker never sends its sentinel
+			dead = [worker.pid for worker in workers
+						if not worker.is_alive() and worker.exitcode != 0]
+			if dead:
+				raise RuntimeError("tokenizer processes {} died".format(dead))
+			continue
+		if documents is None:
+			finished += 1
+			continue
+		if isinstance(documents, WorkerError):
+			raise RuntimeError("tokenizer process failed:\n{}".format(documents.message))
+		for document in documents:
+			if doc_writer:
+				doc_writer.add_document(document)
+			else:
+				es_index_documents.append({
+						"doc":json.dumps(document, ensure_ascii=False),
+						"doc_id":valid_doc_cnt
+					})
 			valid_doc_cnt += 1
+		if len(es_index_documents) >= 1000:
+			es_api.index_batch_doc(FLAGS.doc_index, FLAGS.doc_type, es_index_documents, 1000)
+			es_index_documents = []
+
+	if es_index_documents:
 		es_api.index_batch_doc(FLAGS.doc_index, FLAGS.doc_type, es_index_documents, 1000)
-		es_all_documents = [[]]
-	
+	if doc_writer:
+		doc_writer.close()
+
+	for worker in workers:
+		worker.join()
+		if worker.exitcode != 0:
+			raise RuntimeError("tokenizer process {} exited with {}".format(
+								worker.pid, worker.exitcode))
+
 	document_cnt = valid_doc_cnt
 
 	return document_cnt
 
-	# Remove empty documents
-	# all_documents = [x for x in all_documents if x]
-	# tf.logging.info(" input file {} all_documents {}".format(input_file, len(all_documents)))
-	# rng.shuffle(all_documents)
-
-	# if es_api:
-	# 	es_all_documents = []
-	# 	total_num = 0
-	# 	for index, item in enumerate(all_documents):
-	# 		es_all_documents.append({
-	# 				"ori_doc":json.dumps(item, ensure_ascii=False),
-	# 				"doc":json.dumps(item, ensure_ascii=False),
-	# 				"doc_id":index
-	# 			})
-	# 		total_num += 1
-	# 		if np.mod(len(es_all_documents), 1000) == 0 or total_num == len(all_documents):
-	# 			es_api.index_batch_doc(FLAGS.doc_index, FLAGS.doc_type, es_all_documents, 1000)
-	# 			es_all_documents = []
-	# return all_documents
-
 def create_instances_chunk_from_document(all_documents, document_index_chunk, 
 		max_seq_length, masked_lm_prob, max_predictions_per_seq, 
 		short_seq_prob, tokenizer, output_file, rng, num_of_documents, chunk_id):
 	vocab_words = list(tokenizer.vocab.keys())
-	writer = tf.python_io.TFRecordWriter(output_file)
+	writer = tf.python_io.TFRecordWriter(output_file,
+				options=compact_pretrain_record.record_options(FLAGS.compression_type))
+
+	if FLAGS.batch_masking:
+		sampler = masked_lm_sampler.MaskedLmSampler.from_vocab(tokenizer.vocab,
+							masked_lm_prob=masked_lm_prob,
+							max_predictions_per_seq=max_predictions_per_seq,
+							do_whole_word_mask=FLAGS.do_whole_word_mask,
+							exclude_fn=is_punctuation_token,
+							seed=FLAGS.random_seed + chunk_id)
+		id_remap = np.asarray(tokenizer.convert_tokens_to_ids(vocab_words), dtype=np.int32)
+	pending_instances = []
 
 	total_written = 0
 	inst_index = 0
@@ -473,7 +664,18 @@ def create_instances_chunk_from_document(all_documents, document_index_chunk,
 							all_documents, document_index, vocab_words,
 							max_seq_length, short_seq_prob,
 							masked_lm_prob, max_predictions_per_seq,
-							rng, num_of_documents)
+							rng, num_of_documents,
+							do_mask=not FLAGS.batch_masking)
+		if FLAGS.batch_masking:
+			pending_instances.extend(instances)
+			if len(pending_instances) >= FLAGS.masking_batch_size:
+				write_instance_batch_to_example_files(writer, pending_instances,
+									sampler, id_remap, tokenizer,
+									max_seq_length, inst_index)
+				inst_index += len(pending_instances)
+				total_written += len(pending_instances)
+				pending_instances = []
+			continue
 		for instance in instances:
 			write_single_sintance_to_example_files(writer, instance, 
 									tokenizer, max_seq_length,
@@ -482,6 +684,12 @@ def create_instances_chunk_from_document(all_documents, document_index_chunk,
 			inst_index += 1
 			total_written += 1
 
+	if pending_instances:
+		write_instance_batch_to_example_files(writer, pending_instances,
+							sampler, id_remap, tokenizer,
+							max_seq_length, inst_index)
+		total_written += len(pending_instances)
+
 	writer.close()
 	tf.logging.info("Wrote %d total instances %d", total_written, chunk_id)
 
@@ -513,17 +721,25 @@ def multi_process(input_files, tokenizer,
 
 	chunk_num = process_num - 1
 
-	num_of_documents = read_file(input_files, tokenizer, max_seq_length)
-	# num_of_documents = len(all_documents)
-	time.sleep(60)
+	if es_api:
+		num_of_documents = read_file(input_files, tokenizer, max_seq_length, process_num)
+		# make the indexed documents visible to search before workers query them
+		es_api.refresh(FLAGS.doc_index)
+		all_documents_shared = []
+	else:
+		doc_store_path = FLAGS.doc_store_path or os.path.join(
+								tempfile.gettempdir(), FLAGS.doc_index)
+		num_of_documents = read_file(input_files, tokenizer, max_seq_length, process_num,
+								doc_store_path=doc_store_path)
+		# workers map the store themselves, only its path and vocab are pickled
+		all_documents_shared = document_store.MmapDocumentStore(doc_store_path,
+								inv_vocab=tokenizer.inv_vocab)
 
 	print(num_of_documents, dupe_factor)
 
 	chunks = build_index_chunk(num_of_documents, process_num, dupe_factor)
 	pool = multiprocessing.Pool(processes=process_num)
 
-	all_documents_shared = []
-
 	for chunk_id, chunk_key in enumerate(chunks):
 		output_file_ = output_file + "/chunk_{}.tfrecords".format(chunk_id)
 		print("#mask_language_model_multi_processing.length of chunk: {} ;file_name:{};chunk_id:{}".format(len(chunks[chunk_key]),output_file_,chunk_id))
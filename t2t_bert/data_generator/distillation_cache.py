@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+"""Memory-mapped store of teacher top-k logits for knowledge distillation.
+
+Entries are keyed by a 64 bit content hash of the input text, so student
+data can be matched to teacher outputs by text instead of by line
+position. A store at `path` is four local files:
+	path.keys        uint64 text hashes, sorted
+	path.indices     int32 [num_entries, top_k] class ids
+	path.values      float16 [num_entries, top_k] teacher logits
+	path.meta.json   num_entries, num_classes, top_k
+Lookups are a binary search over the memory-mapped keys.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import six
+
+KEY_DTYPE = np.uint64
+INDEX_DTYPE = np.int32
+VALUE_DTYPE = np.float16
+
+
+def text_hash(text):
+	"""Stable 64 bit hash of a text, the same across processes and runs."""
+	if isinstance(text, six.text_type):
+		text = text.encode("utf-8")
+	return np.frombuffer(hashlib.md5(text).digest()[:8], dtype=KEY_DTYPE)[0]
+
+
+def top_k_logits(logits, top_k):
+	"""Class ids and logits of the top_k classes of [batch, num_classes]."""
+	logits = np.asarray(logits, dtype=np.float32)
+	if top_k >= logits.shape[-1]:
+		indices = np.tile(np.arange(logits.shape[-1], dtype=INDEX_DTYPE), (logits.shape[0], 1))
+		return indices, logits
+	indices = np.argpartition(-logits, top_k - 1, axis=-1)[:, :top_k]
+	values = np.take_along_axis(logits, indices, axis=-1)
+	order = np.argsort(-values, axis=-1)
+	return (np.take_along_axis(indices, order, axis=-1).astype(INDEX_DTYPE),
+			np.take_along_axis(values, order, axis=-1))
+
+
+class DistillationCacheWriter(object):
+	"""Appends teacher logits and sorts the store by key on close."""
+
+	def __init__(self, path, num_classes, top_k=None):
+		self.path = path
+		self.num_classes = num_classes
+		self.top_k = min(top_k or num_classes, num_classes)
+		store_dir = os.path.dirname(path)
+		if store_dir and not os.path.exists(store_dir):
+			os.makedirs(store_dir)
+		self.key_writer = open(path + ".keys", "wb")
+		self.index_writer = open(path + ".indices", "wb")
+		self.value_writer = open(path + ".values", "wb")
+		self.num_entries = 0
+
+	def add_top_k(self, keys, indices, values):
+		"""Adds hashed keys [n] with their top_k ids and logits [n, top_k]."""
+		np.asarray(keys, dtype=KEY_DTYPE).tofile(self.key_writer)
+		np.asarray(indices, dtype=INDEX_DTYPE).reshape(-1, self.top_k).tofile(self.index_writer)
+		np.asarray(values, dtype=VALUE_DTYPE).reshape(-1, self.top_k).tofile(self.value_writer)
+		self.num_entries += len(keys)
+
+	def add_batch(self, texts, logits):
+		"""Adds texts [n] with their teacher logits [n, num_classes]."""
+		indices, values = top_k_logits(logits, self.top_k)
+		self.add_top_k([text_hash(text) for text in texts], indices, values)
+
+	def add(self, text, logits):
+		self.add_batch([text], [logits])
+
+	def close(self, chunk_size=1000000):
+		self.key_writer.close()
+		self.index_writer.close()
+		self.value_writer.close()
+		if self.num_entries:
+			self._sort_by_key(chunk_size)
+		with open(self.path + ".meta.json", "w") as fwobj:
+			json.dump({
+				"num_entries":self.num_entries,
+				"num_classes":self.num_classes,
+				"top_k":self.top_k
+				}, fwobj)
+
+	def _sort_by_key(self, chunk_size):
+		# stable, so the first write of a repeated text wins the lookup
+		keys = np.fromfile(self.path + ".keys", dtype=KEY_DTYPE)
+		order = np.argsort(keys, kind="mergesort")
+		keys[order].tofile(self.path + ".keys")
+		for suffix, dtype in [(".indices", INDEX_DTYPE), (".values", VALUE_DTYPE)]:
+			shape = (self.num_entries, self.top_k)
+			source = np.memmap(self.path + suffix, dtype=dtype, mode="r", shape=shape)
+			target = np.memmap(self.path + suffix + ".tmp", dtype=dtype, mode="w+", shape=shape)
+			for start in range(0, self.num_entries, chunk_size):
+				target[start:start+chunk_size] = source[order[start:start+chunk_size]]
+			target.flush()
+			del source, target
+			os.rename(self.path + suffix + ".tmp", self.path + suffix)
+
+
+def _memmap(path, dtype, shape):
+	# np.memmap refuses to map empty files
+	if shape[0] == 0:
+		return np.zeros(shape, dtype=dtype)
+	return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+class DistillationCache(object):
+	"""Read-only random access to a store written by DistillationCacheWriter.
+
+	Like MmapDocumentStore the files are mapped lazily and dropped on
+	pickling, so worker processes map the store themselves.
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		with open(path + ".meta.json", "r") as frobj:
+			self.meta = json.load(frobj)
+		self.num_entries = self.meta["num_entries"]
+		self.num_classes = self.meta["num_classes"]
+		self.top_k = self.meta["top_k"]
+		self._keys = None
+		self._indices = None
+		self._values = None
+
+	@staticmethod
+	def exists(path):
+		return os.path.exists(path + ".meta.json")
+
+	def _maybe_open(self):
+		if self._keys is None:
+			self._keys = _memmap(self.path + ".keys", KEY_DTYPE, (self.num_entries,))
+			self._indices = _memmap(self.path + ".indices", INDEX_DTYPE,
+									(self.num_entries, self.top_k))
+			self._values = _memmap(self.path + ".values", VALUE_DTYPE,
+									(self.num_entries, self.top_k))
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state["_keys"] = None
+		state["_indices"] = None
+		state["_values"] = None
+		return state
+
+	def __len__(self):
+		return self.num_entries
+
+	def _find(self, key):
+		self._maybe_open()
+		position = int(np.searchsorted(self._keys, key, side="left"))
+		if position < self.num_entries and self._keys[position] == key:
+			return position
+		return None
+
+	def __contains__(self, text):
+		return self._find(text_hash(text)) is not None
+
+	def get_top_k(self, text):
+		"""Top-k class ids and float32 logits of text, or None if missing."""
+		position = self._find(text_hash(text))
+		if position is None:
+			return None
+		return (np.array(self._indices[position]),
+				self._values[position].astype(np.float32))
+
+	def get_probs(self, text, temperature=1.0):
+		"""Teacher distribution over num_classes as a list, or None if missing.
+
+		With top_k < num_classes the softmax runs over the stored logits only
+		and every other class gets probability 0.
+		"""
+		top_k = self.get_top_k(text)
+		if top_k is None:
+			return None
+		indices, values = top_k
+		values = values / temperature
+		values = np.exp(values - np.max(values))
+		probs = np.zeros(self.num_classes, dtype=np.float32)
+		probs[indices] = values / np.sum(values)
+		return probs.tolist()
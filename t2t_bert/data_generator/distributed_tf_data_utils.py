@@ -1,6 +1,7 @@
 import tensorflow as tf
 import numpy as np
 import collections
+from data_generator import tf_data_utils
 
 try:
 	import tensorflow.contrib.pai_soar as pai
@@ -53,6 +54,15 @@ def create_float_feature(values):
 	feature = tf.train.Feature(float_list=tf.train.FloatList(value=list(values)))
 	return feature
 
+def batch_or_pack(dataset, name_to_features, params):
+	"""Batches padded examples, or rows of packed examples when
+	params.pack_sequences is set, see tf_data_utils.pack_sequences."""
+	if params.get("pack_sequences", False):
+		dataset = tf_data_utils.pack_sequences(dataset, name_to_features,
+						params.get("max_examples_per_row", None))
+		return dataset.batch(params.get("batch_size", 32), drop_remainder=True)
+	return dataset.batch(params.get("batch_size", 32))
+
 def train_input_fn(input_file, _parse_fn, name_to_features,
 		params, **kargs):
 	if_shard = kargs.get("if_shard", "1")
@@ -70,7 +80,7 @@ def train_input_fn(input_file, _parse_fn, name_to_features,
 							buffer_size=params.get("buffer_size", 1024)+3*params.get("batch_size", 32),
 							seed=np.random.randint(0,1e10,1)[0],
 							reshuffle_each_iteration=True)
-	dataset = dataset.batch(params.get("batch_size", 32))
+	dataset = batch_or_pack(dataset, name_to_features, params)
 	dataset = dataset.repeat(params.get("epoch", 100))
 	iterator = dataset.make_one_shot_iterator()
 	features = iterator.get_next()
@@ -141,7 +151,7 @@ def all_reduce_train_input_fn(input_file, _parse_fn, name_to_features,
 							reshuffle_each_iteration=True)
 	dataset = dataset.map(lambda x:_parse_fn(x, name_to_features),
 						num_parallel_calls=kargs.get("num_parallel_calls", 10))
-	dataset = dataset.batch(params.get("batch_size", 32))
+	dataset = batch_or_pack(dataset, name_to_features, params)
 
 	return dataset
 
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+"""Memory-mapped store of tokenized documents for pretraining data creation.
+
+A store at `path` is four local files:
+	path.tokens     int32 token ids of every sentence, concatenated
+	path.sentences  int64 end offset of every sentence into path.tokens
+	path.documents  int64 end offset of every document into path.sentences
+	path.meta.json  counts and dtypes
+Any document is then read with two offset lookups and a slice of the
+memory map, without loading the corpus into memory.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+
+import numpy as np
+
+TOKEN_DTYPE = np.int32
+OFFSET_DTYPE = np.int64
+
+
+class DocumentStoreWriter(object):
+	"""Appends documents (lists of token-id lists) to a new store."""
+
+	def __init__(self, path):
+		self.path = path
+		store_dir = os.path.dirname(path)
+		if store_dir and not os.path.exists(store_dir):
+			os.makedirs(store_dir)
+		self.token_writer = open(path + ".tokens", "wb")
+		self.sentence_writer = open(path + ".sentences", "wb")
+		self.document_writer = open(path + ".documents", "wb")
+		self.num_tokens = 0
+		self.num_sentences = 0
+		self.num_documents = 0
+
+	def add_document(self, document):
+		sentence_ends = []
+		for sentence in document:
+			np.asarray(sentence, dtype=TOKEN_DTYPE).tofile(self.token_writer)
+			self.num_tokens += len(sentence)
+			sentence_ends.append(self.num_tokens)
+		np.asarray(sentence_ends, dtype=OFFSET_DTYPE).tofile(self.sentence_writer)
+		self.num_sentences += len(sentence_ends)
+		np.asarray([self.num_sentences], dtype=OFFSET_DTYPE).tofile(self.document_writer)
+		self.num_documents += 1
+		return self.num_documents - 1
+
+	def close(self):
+		self.token_writer.close()
+		self.sentence_writer.close()
+		self.document_writer.close()
+		with open(self.path + ".meta.json", "w") as fwobj:
+			json.dump({
+				"num_tokens":self.num_tokens,
+				"num_sentences":self.num_sentences,
+				"num_documents":self.num_documents,
+				"token_dtype":np.dtype(TOKEN_DTYPE).name,
+				"offset_dtype":np.dtype(OFFSET_DTYPE).name
+				}, fwobj)
+
+
+def _memmap(path, dtype, size):
+	# np.memmap refuses to map empty files
+	if size == 0:
+		return np.zeros(0, dtype=dtype)
+	return np.memmap(path, dtype=dtype, mode="r", shape=(size,))
+
+
+class MmapDocumentStore(object):
+	"""Read-only random access to a store written by DocumentStoreWriter.
+
+	The files are mapped lazily on first access and dropped on pickling, so
+	each worker process maps the store itself instead of receiving a copy.
+	Indexing with `store[i]` returns document i as a list of token lists
+	when `inv_vocab` is given, else as a list of int32 id arrays.
+	"""
+
+	def __init__(self, path, inv_vocab=None):
+		self.path = path
+		self.inv_vocab = inv_vocab
+		with open(path + ".meta.json", "r") as frobj:
+			self.meta = json.load(frobj)
+		self.num_documents = self.meta["num_documents"]
+		self._tokens = None
+		self._sentence_ends = None
+		self._document_ends = None
+
+	def _maybe_open(self):
+		if self._tokens is None:
+			self._tokens = _memmap(self.path + ".tokens", TOKEN_DTYPE,
+									self.meta["num_tokens"])
+			self._sentence_ends = _memmap(self.path + ".sentences", OFFSET_DTYPE,
+									self.meta["num_sentences"])
+			self._document_ends = _memmap(self.path + ".documents", OFFSET_DTYPE,
+									self.meta["num_documents"])
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		state["_tokens"] = None
+		state["_sentence_ends"] = None
+		state["_document_ends"] = None
+		return state
+
+	def __len__(self):
+		return self.num_documents
+
+	def get_document_ids(self, index):
+		"""Returns document `index` as a list of int32 id arrays (views)."""
+		self._maybe_open()
+		sentence_start = int(self._document_ends[index - 1]) if index > 0 else 0
+		sentence_end = int(self._document_ends[index])
+		document = []
+		for sentence_index in range(sentence_start, sentence_end):
+			token_start = int(self._sentence_ends[sentence_index - 1]) if sentence_index > 0 else 0
+			token_end = int(self._sentence_ends[sentence_index])
+			document.append(self._tokens[token_start:token_end])
+		return document
+
+	def get_document(self, index):
+		document = self.get_document_ids(index)
+		if self.inv_vocab is None:
+			return document
+		return [[self.inv_vocab[token_id] for token_id in sentence.tolist()]
+					for sentence in document]
+
+	def __getitem__(self, index):
+		return self.get_document(index)
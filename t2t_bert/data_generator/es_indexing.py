@@ -37,6 +37,9 @@ class ESSearch(object):
 	def delete(self, index):
 		self.es.indices.delete(index=index)
 
+	def refresh(self, index):
+		self.es.indices.refresh(index=index)
+
 	def index_batch_doc(self, doc_index, doc_type, data_chunk, batch_size):
 		# try:
 		# 	self.es.indices.create(index=doc_index)
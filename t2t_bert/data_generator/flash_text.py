@@ -37,10 +37,15 @@ class KeywordProcessor(object):
 		* Idea came from this `Stack Overflow Question <https://stackoverflow.com/questions/44178449/regex-replace-is-taking-time-for-millions-of-documents-how-to-make-it-faster>`_.
 	"""
 
-	def __init__(self):
+	def __init__(self, backend="trie"):
 		"""
 		Args:
+			backend (str): "trie" walks the keyword trie dict for every candidate
+				start, "aho_corasick" matches with an AhoCorasickAutomaton compiled
+				from it, with the same longest-match spans
 		"""
+		self.backend = backend
+		self._automaton = None
 		self._keyword = '_keyword_'
 		self._white_space_chars = set(['.', '\t', '\n', '\a', ' ', ','])
 #         try:
@@ -121,6 +126,7 @@ class KeywordProcessor(object):
 			>>> keyword_processor['Big Apple'] = 'New York'
 		"""
 		status = False
+		self._automaton = None
 		if not clean_name and keyword:
 			clean_name = keyword
 
@@ -145,6 +151,7 @@ class KeywordProcessor(object):
 			>>> del keyword_processor['Big Apple']
 		"""
 		status = False
+		self._automaton = None
 		if keyword:
 			current_dict = self.keyword_trie_dict
 			character_trie_list = []
@@ -407,6 +414,10 @@ class KeywordProcessor(object):
 			# if sentence is empty or none just return empty list
 			return keywords_extracted
 
+		# the automaton only covers the every-char-is-a-boundary case
+		if self.backend == "aho_corasick" and not self.non_word_boundaries:
+			return self.build_automaton().extract(sentence)
+
 		current_dict = self.keyword_trie_dict
 		# print("keyword trie dict", current_dict)
 		sequence_start_pos = 0
@@ -491,6 +502,27 @@ class KeywordProcessor(object):
 			return keywords_extracted
 		return keywords_extracted #[value[0] for value in keywords_extracted]
 
+	def build_automaton(self):
+		"""Compiles the keyword trie into an AhoCorasickAutomaton, once until
+		keywords change.
+		"""
+		if self._automaton is None:
+			self._automaton = AhoCorasickAutomaton(self.keyword_trie_dict, self._keyword)
+		return self._automaton
+
+	def extract_keywords_batch(self, sentences, span_info=False):
+		"""Runs extract_keywords over a list of sentences.
+		Args:
+			sentences (list): sentences, each a string or a list of tokens
+		Returns:
+			keywords_extracted (list(list)): extract_keywords output per sentence
+		"""
+		if self.backend == "aho_corasick" and not self.non_word_boundaries:
+			automaton = self.build_automaton()
+			return [automaton.extract(sentence) if sentence else []
+						for sentence in sentences]
+		return [self.extract_keywords(sentence, span_info) for sentence in sentences]
+
 	def replace_keywords(self, sentence):
 		"""Searches in the string for all keywords present in corpus.
 		Keywords present are replaced by the clean name and a new string is returned.
@@ -612,4 +644,116 @@ class KeywordProcessor(object):
 		output_sentence = []
 		for sent in new_sentence:
 			output_sentence.extend(sent)
-		return output_sentence
\ No newline at end of file
+		return output_sentence
+
+class AhoCorasickAutomaton(object):
+	"""Aho-Corasick automaton over the symbols of a KeywordProcessor trie.
+	States are numbered breadth first and kept in flat arrays: goto
+	transitions in one dict keyed by state * num_symbols + symbol id, plus
+	failure links, depths, clean names and dictionary suffix links. One pass
+	over a sentence finds the longest keyword starting at every position,
+	then a greedy scan keeps the leftmost-longest non-overlapping matches,
+	exactly what KeywordProcessor.extract_keywords returns when every char is
+	a word boundary.
+	Args:
+		keyword_trie_dict (dict): KeywordProcessor.keyword_trie_dict
+		keyword_key (str): key holding the clean name in the trie dict
+	"""
+
+	def __init__(self, keyword_trie_dict, keyword_key='_keyword_'):
+		self.symbol_ids = {}
+		nodes = [keyword_trie_dict]
+		parent = [0]
+		symbol = [-1]
+		self.depth = [0]
+		self.clean_name = [None]
+		index = 0
+		while index < len(nodes):
+			for key, child in nodes[index].items():
+				if key == keyword_key:
+					self.clean_name[index] = child
+					continue
+				if key not in self.symbol_ids:
+					self.symbol_ids[key] = len(self.symbol_ids)
+				nodes.append(child)
+				parent.append(index)
+				symbol.append(self.symbol_ids[key])
+				self.depth.append(self.depth[index] + 1)
+				self.clean_name.append(None)
+			index += 1
+
+		self.num_states = len(nodes)
+		self.num_symbols = max(len(self.symbol_ids), 1)
+		self.transitions = {}
+		for state in range(1, self.num_states):
+			self.transitions[parent[state] * self.num_symbols + symbol[state]] = state
+
+		# breadth-first order guarantees shorter suffixes are linked first
+		self.fail = [0] * self.num_states
+		self.dict_link = [0] * self.num_states
+		for state in range(1, self.num_states):
+			if parent[state] != 0:
+				fail_state = self.fail[parent[state]]
+				while True:
+					next_state = self.transitions.get(fail_state * self.num_symbols + symbol[state])
+					if next_state is not None:
+						self.fail[state] = next_state
+						break
+					if fail_state == 0:
+						break
+					fail_state = self.fail[fail_state]
+			fail_state = self.fail[state]
+			if self.clean_name[fail_state] is not None:
+				self.dict_link[state] = fail_state
+			else:
+				self.dict_link[state] = self.dict_link[fail_state]
+
+	def longest_matches(self, sentence):
+		"""Returns, per position, the state of the longest keyword starting
+		there (0 if none)."""
+		transitions = self.transitions
+		fail = self.fail
+		depth = self.depth
+		clean_name = self.clean_name
+		dict_link = self.dict_link
+		symbol_ids = self.symbol_ids
+		num_symbols = self.num_symbols
+
+		best_state = [0] * len(sentence)
+		state = 0
+		for position, char in enumerate(sentence):
+			symbol = symbol_ids.get(char)
+			if symbol is None:
+				state = 0
+				continue
+			while True:
+				next_state = transitions.get(state * num_symbols + symbol)
+				if next_state is not None:
+					state = next_state
+					break
+				if state == 0:
+					break
+				state = fail[state]
+
+			match_state = state if clean_name[state] is not None else dict_link[state]
+			while match_state:
+				start = position - depth[match_state] + 1
+				if depth[match_state] > depth[best_state[start]]:
+					best_state[start] = match_state
+				match_state = dict_link[match_state]
+		return best_state
+
+	def extract(self, sentence):
+		"""Returns [(clean_name, start, end)] leftmost-longest matches."""
+		best_state = self.longest_matches(sentence)
+		keywords_extracted = []
+		idx = 0
+		sentence_len = len(sentence)
+		while idx < sentence_len:
+			state = best_state[idx]
+			if state:
+				keywords_extracted.append((self.clean_name[state], idx, idx + self.depth[state]))
+				idx += self.depth[state]
+			else:
+				idx += 1
+		return keywords_extracted
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+"""Length-bucketed batching of unpadded features for inference and eval.
+
+Examples are sorted by length, cut into batches that never cross a bucket
+and padded only to their bucket boundary instead of max_seq_length, so a
+batch of short queries pays short attention cost. Results are put back in
+input order by `bucketed_predict`.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+
+def parse_bucket_boundaries(bucket_boundaries, max_seq_length):
+	"""Sorted inclusive boundaries, the last one being max_seq_length.
+
+	`bucket_boundaries` is a list of ints or a comma separated string such
+	as "16,32,64"; boundaries above max_seq_length are dropped.
+	"""
+	if not bucket_boundaries:
+		return [max_seq_length]
+	if isinstance(bucket_boundaries, str):
+		bucket_boundaries = [int(boundary) for boundary in bucket_boundaries.split(",")
+								if boundary.strip()]
+	boundaries = sorted(set([int(boundary) for boundary in bucket_boundaries
+								if 0 < int(boundary) < max_seq_length]))
+	return boundaries + [max_seq_length]
+
+
+def bucket_length(length, boundaries):
+	"""Smallest boundary >= length."""
+	index = np.searchsorted(boundaries, length, side="left")
+	return boundaries[min(index, len(boundaries) - 1)]
+
+
+def pad_to_length(features_lst, length, pad_id=0):
+	"""Stacks unpadded feature dicts, padding list valued features to `length`."""
+	batch = {}
+	for key in features_lst[0]:
+		values = [features[key] for features in features_lst]
+		if isinstance(values[0], (list, tuple, np.ndarray)):
+			padded = np.full((len(values), length), pad_id, dtype=np.int32)
+			for index, value in enumerate(values):
+				padded[index, :len(value)] = value[:length]
+			batch[key] = padded
+		else:
+			batch[key] = np.array(values).astype(np.int32)
+	return batch
+
+
+def bucketed_batches(features_lst, boundaries, batch_size,
+					pad_id=0, length_key="input_ids"):
+	"""Yields (indices, padded batch) with every batch inside one bucket.
+
+	`indices` are the positions of the batch rows in features_lst.
+	"""
+	lengths = np.array([len(features[length_key]) for features in features_lst])
+	order = np.argsort(lengths, kind="mergesort")
+	buckets = np.array([bucket_length(length, boundaries) for length in lengths[order]])
+	start = 0
+	while start < len(order):
+		end = min(start + batch_size, len(order))
+		# close the batch at the first row of the next bucket
+		end = start + int(np.sum(buckets[start:end] == buckets[start]))
+		indices = order[start:end]
+		yield indices, pad_to_length([features_lst[index] for index in indices],
+									int(buckets[start]), pad_id)
+		start = end
+
+
+def bucketed_predict(predict_fn, features_lst, boundaries, batch_size,
+					pad_id=0, length_key="input_ids"):
+	"""Runs predict_fn per bucketed batch and returns per-example dicts in
+	the order of features_lst.
+
+	predict_fn takes a padded batch and returns a dict of arrays whose first
+	dimension is the batch.
+	"""
+	output = [None] * len(features_lst)
+	for indices, batch in bucketed_batches(features_lst, boundaries, batch_size,
+										pad_id, length_key):
+		predictions = predict_fn(batch)
+		for row, index in enumerate(indices):
+			output[index] = {key:predictions[key][row] for key in predictions}
+	return output
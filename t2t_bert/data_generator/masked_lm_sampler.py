@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+"""Batched masked-LM sampling over padded id matrices.
+
+Vectorized counterpart of create_masked_lm_predictions(_wwm/_piece): the
+same candidate rules, whole-word grouping, greedy budget and 80/10/10
+replacement, but applied to a [batch, max_seq_length] id matrix at once.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+
+def pad_id_batch(id_lists, max_seq_length, pad_id=0):
+	"""Stacks variable-length id lists into a padded int32 matrix."""
+	input_ids = np.full((len(id_lists), max_seq_length), pad_id, dtype=np.int32)
+	lengths = np.zeros(len(id_lists), dtype=np.int32)
+	for row, ids in enumerate(id_lists):
+		ids = ids[:max_seq_length]
+		input_ids[row, :len(ids)] = ids
+		lengths[row] = len(ids)
+	return input_ids, lengths
+
+
+class MaskedLmSampler(object):
+	"""Masks many instances at once with numpy.
+
+	Args:
+		vocab_size: number of ids, random replacements are uniform over them.
+		mask_id: id of [MASK].
+		special_ids: ids never masked, e.g. [CLS], [SEP] and [PAD].
+		continuation_ids: ids of "##" pieces, joined to the previous word
+			when do_whole_word_mask is set.
+		exclude_ids: further ids never masked, e.g. punctuation.
+	"""
+
+	def __init__(self, vocab_size, mask_id, special_ids,
+				continuation_ids=None,
+				exclude_ids=None,
+				masked_lm_prob=0.15,
+				max_predictions_per_seq=20,
+				do_whole_word_mask=False,
+				seed=None):
+		self.vocab_size = vocab_size
+		self.mask_id = mask_id
+		self.masked_lm_prob = masked_lm_prob
+		self.max_predictions_per_seq = max_predictions_per_seq
+		self.do_whole_word_mask = do_whole_word_mask
+		self.rng = np.random.RandomState(seed)
+
+		self.non_candidate = np.zeros(vocab_size, dtype=np.bool_)
+		self.non_candidate[list(special_ids)] = True
+		if exclude_ids:
+			self.non_candidate[list(exclude_ids)] = True
+		self.is_continuation = np.zeros(vocab_size, dtype=np.bool_)
+		if continuation_ids:
+			self.is_continuation[list(continuation_ids)] = True
+
+	@classmethod
+	def from_vocab(cls, vocab, masked_lm_prob=0.15, max_predictions_per_seq=20,
+				do_whole_word_mask=False, exclude_fn=None, seed=None,
+				special_tokens=("[CLS]", "[SEP]", "[PAD]"), mask_token="[MASK]"):
+		"""Builds the lookup tables once from a token -> id vocab."""
+		special_ids = [vocab[token] for token in special_tokens if token in vocab]
+		continuation_ids = [index for token, index in vocab.items()
+								if token.startswith("##")]
+		exclude_ids = []
+		if exclude_fn:
+			exclude_ids = [index for token, index in vocab.items() if exclude_fn(token)]
+		return cls(len(vocab), vocab[mask_token], special_ids,
+					continuation_ids=continuation_ids,
+					exclude_ids=exclude_ids,
+					masked_lm_prob=masked_lm_prob,
+					max_predictions_per_seq=max_predictions_per_seq,
+					do_whole_word_mask=do_whole_word_mask,
+					seed=seed)
+
+	def _word_starts(self, input_ids, candidate):
+		if not self.do_whole_word_mask:
+			return candidate
+		# a "##" piece joins the previous word, unless it is the first candidate
+		continuation = self.is_continuation[input_ids] & candidate
+		started_before = (np.cumsum(candidate, axis=1) - candidate) > 0
+		return candidate & ~(continuation & started_before)
+
+	def _select_words(self, word_size, order, num_to_predict):
+		"""Greedy pass over words in `order`: take a word if it still fits.
+
+		Every round rejects words larger than the remaining budget and takes
+		the longest prefix of undecided words that fits, which decides at
+		least one word per row, until every row is done.
+		"""
+		rows = np.arange(word_size.shape[0])[:, None]
+		size = word_size[rows, order]
+		undecided = size > 0
+		taken = np.zeros_like(undecided)
+		remaining = num_to_predict.astype(np.int64).copy()
+		while True:
+			undecided &= size <= remaining[:, None]
+			if not undecided.any():
+				break
+			cum_size = np.cumsum(np.where(undecided, size, 0), axis=1)
+			take = undecided & (cum_size <= remaining[:, None])
+			taken |= take
+			undecided &= ~take
+			remaining -= np.where(take, size, 0).sum(axis=1)
+			# words after the first misfit are re-checked next round
+		selected = np.zeros_like(taken)
+		selected[rows, order] = taken
+		return selected
+
+	def mask_batch(self, input_ids, lengths):
+		"""Masks a padded batch.
+
+		Args:
+			input_ids: int [batch_size, max_seq_length] ids.
+			lengths: int [batch_size] number of real tokens per row.
+
+		Returns:
+			dict with masked "input_ids" [batch_size, max_seq_length] and
+			"masked_lm_positions", "masked_lm_ids", "masked_lm_weights"
+			[batch_size, max_predictions_per_seq], sorted by position and
+			zero padded.
+		"""
+		input_ids = np.asarray(input_ids, dtype=np.int32)
+		lengths = np.asarray(lengths, dtype=np.int32)
+		batch_size, seq_length = input_ids.shape
+		positions = np.arange(seq_length)[None, :]
+		rows = np.arange(batch_size)[:, None]
+
+		candidate = (positions < lengths[:, None]) & ~self.non_candidate[input_ids]
+		word_start = self._word_starts(input_ids, candidate)
+
+		# word index of every candidate token, words numbered per row
+		word_index = np.cumsum(word_start, axis=1) - 1
+		word_index = np.where(candidate, word_index, seq_length)
+		word_size = np.zeros((batch_size, seq_length + 1), dtype=np.int64)
+		np.add.at(word_size, (np.broadcast_to(rows, word_index.shape), word_index), 1)
+		word_size = word_size[:, :seq_length]
+
+		# random order of words (the shuffle), empty slots last
+		priority = np.where(word_size > 0,
+							self.rng.random_sample(word_size.shape), 2.0)
+		order = np.argsort(priority, axis=1)
+
+		num_to_predict = np.minimum(self.max_predictions_per_seq,
+						np.maximum(1, np.round(lengths * self.masked_lm_prob).astype(np.int64)))
+		selected_words = self._select_words(word_size, order, num_to_predict)
+		selected = candidate & selected_words[rows, np.minimum(word_index, seq_length - 1)]
+
+		# 80% [MASK], 10% keep, 10% random id
+		masked_ids = input_ids.copy()
+		draw = self.rng.random_sample(input_ids.shape)
+		keep = self.rng.random_sample(input_ids.shape) < 0.5
+		random_ids = self.rng.randint(0, self.vocab_size, size=input_ids.shape)
+		replacement = np.where(draw < 0.8, self.mask_id,
+							np.where(keep, input_ids, random_ids))
+		masked_ids[selected] = replacement[selected]
+
+		num_predictions = self.max_predictions_per_seq
+		sort_key = np.where(selected, positions, seq_length + positions)
+		masked_lm_positions = np.argsort(sort_key, axis=1, kind="mergesort")
+		if seq_length < num_predictions:
+			masked_lm_positions = np.pad(masked_lm_positions,
+						((0, 0), (0, num_predictions - seq_length)), "constant")
+		masked_lm_positions = masked_lm_positions[:, :num_predictions]
+		count = selected.sum(axis=1)
+		valid = np.arange(num_predictions)[None, :] < count[:, None]
+		masked_lm_ids = np.where(valid, input_ids[rows, masked_lm_positions], 0)
+		masked_lm_positions = np.where(valid, masked_lm_positions, 0)
+
+		return {
+			"input_ids":masked_ids,
+			"masked_lm_positions":masked_lm_positions.astype(np.int32),
+			"masked_lm_ids":masked_lm_ids.astype(np.int32),
+			"masked_lm_weights":valid.astype(np.float32)
+		}
@@ -4,7 +4,7 @@ import json
 class RuleDetector(object):
 	def __init__(self, config={}):
 		self.config = config
-		self.keyword_detector = flash_text.KeywordProcessor()
+		self.keyword_detector = flash_text.KeywordProcessor(backend="aho_corasick")
 
 	def load(self, tokenizer):
 		with open(self.config["keyword_path"], "r") as frobj:
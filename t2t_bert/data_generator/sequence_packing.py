@@ -0,0 +1,123 @@
+import tensorflow as tf
+
+"""
+Packing of short examples into full max_seq_length rows.
+
+Decoded, padded examples are trimmed to their input_mask length and packed
+with utils/tensor2tensor generator_utils.pack_dataset, several examples per
+row. A packed row has
+	input_ids, segment_ids, ...  [max_seq_length] concatenated tokens
+	input_mask                   [max_seq_length] 1 for tokens of any example
+	segmentation_ids             [max_seq_length] 1-based example id, 0 is padding
+	position_ids                 [max_seq_length] positions restarting per example
+	example_positions            [max_examples_per_row] row offset of every [CLS]
+	example_weights              [max_examples_per_row] 1.0 for real examples
+and per-example labels such as label_ids of shape [max_examples_per_row].
+Masked lm positions are moved to row offsets and cut to
+max_predictions_per_row, masked_lm_weights marks the kept ones. The
+default keeps every target, a smaller max_predictions_per_row drops the
+targets of the last examples of a row.
+
+bert_modules.create_attention_mask_from_input_mask turns segmentation_ids
+into a block diagonal mask, embedding_postprocessor takes position_ids and
+the bert pooler gathers example_positions, so an example sees exactly what
+it would see alone in a padded row. Examples beyond max_examples_per_row
+in a row keep their tokens but get no label. Losses of per-example labels,
+such as the classifier and next sentence losses, must be weighted with
+example_weights, empty slots point at the first [CLS] of the row.
+"""
+
+def _pack_dataset(dataset, length, keys):
+	from utils.tensor2tensor.data_generators import generator_utils
+	return generator_utils.pack_dataset(dataset, length, keys=keys)
+
+def pack_dataset(dataset, max_seq_length, seq_keys, example_keys=(),
+				max_examples_per_row=None, max_predictions_per_row=None,
+				length_key="input_mask"):
+	"""Packs an unbatched dataset of decoded examples.
+
+	seq_keys are [max_seq_length] token features, the first one must be
+	non zero for every token (input_ids). example_keys are int scalars or
+	[1] features such as label_ids or next_sentence_labels. masked lm
+	features are packed when the examples have masked_lm_positions.
+	"""
+	max_examples_per_row = max_examples_per_row or max_seq_length // 2
+	shapes = tf.compat.v1.data.get_output_shapes(dataset)
+	with_masked_lm = "masked_lm_positions" in shapes
+	if with_masked_lm and not max_predictions_per_row:
+		# room for every target of every example, a row has max_seq_length tokens
+		max_predictions_per_row = min(max_seq_length,
+					shapes["masked_lm_positions"][0].value * max_examples_per_row)
+
+	def trim(example):
+		length = tf.reduce_sum(tf.cast(example[length_key], tf.int32))
+		output = {}
+		for key in seq_keys:
+			output[key] = tf.cast(example[key][:length], tf.int32)
+		# ids are shifted by one, pack_dataset takes 0 as padding
+		for key in example_keys:
+			output[key] = tf.reshape(tf.cast(example[key], tf.int32), [1]) + 1
+		if with_masked_lm:
+			# a leading 1 keeps examples without predictions in the segmentation
+			num_predictions = tf.reduce_sum(tf.cast(example["masked_lm_weights"] > 0, tf.int32))
+			for key in ["masked_lm_positions", "masked_lm_ids"]:
+				output[key] = tf.concat([[1], tf.cast(example[key][:num_predictions], tf.int32) + 2],
+										axis=0)
+		return output
+
+	packed_keys = list(seq_keys) + list(example_keys)
+	if with_masked_lm:
+		packed_keys += ["masked_lm_positions", "masked_lm_ids"]
+	dataset = _pack_dataset(dataset.map(trim), max_seq_length, packed_keys)
+
+	def finalize(packed):
+		token_key = seq_keys[0]
+		segmentation_ids = packed[token_key + "_segmentation"]
+		is_token = tf.cast(segmentation_ids > 0, tf.int32)
+		def example_starts_of(example_ids):
+			# row offset of 1-based example ids, the tokens of lower ids
+			return tf.reduce_sum(
+					tf.cast(tf.logical_and(segmentation_ids[None, :] > 0,
+										segmentation_ids[None, :] < example_ids[:, None]), tf.int32),
+					axis=1)
+
+		example_ids = tf.range(1, max_examples_per_row + 1)
+		example_starts = example_starts_of(example_ids)
+		num_examples = tf.reduce_max(segmentation_ids)
+		example_mask = tf.cast(example_ids <= num_examples, tf.int32)
+
+		features = {
+			"input_mask":is_token,
+			"segmentation_ids":segmentation_ids,
+			"position_ids":packed[token_key + "_position"],
+			"example_positions":example_starts * example_mask,
+			"example_weights":tf.cast(example_mask, tf.float32)
+		}
+		for key in seq_keys:
+			features[key] = packed[key]
+		for key in example_keys:
+			features[key] = tf.maximum(packed[key][:max_examples_per_row] - 1, 0)
+		if with_masked_lm:
+			# drop the leading 1s, then pad or cut to max_predictions_per_row
+			keep = tf.where(packed["masked_lm_positions"] > 1)[:, 0]
+			num_predictions = tf.minimum(tf.shape(keep)[0], max_predictions_per_row)
+			keep = keep[:num_predictions]
+			padding = [[0, max_predictions_per_row - num_predictions]]
+			prediction_ids = tf.gather(packed["masked_lm_positions_segmentation"], keep)
+			positions = tf.gather(packed["masked_lm_positions"], keep) - 2 + \
+							example_starts_of(prediction_ids)
+			features["masked_lm_positions"] = tf.pad(positions, padding)
+			features["masked_lm_ids"] = tf.pad(tf.gather(packed["masked_lm_ids"], keep) - 2, padding)
+			features["masked_lm_weights"] = tf.pad(tf.ones([num_predictions], tf.float32), padding)
+			for key in ["masked_lm_positions", "masked_lm_ids", "masked_lm_weights"]:
+				features[key].set_shape([max_predictions_per_row])
+		return features
+
+	return dataset.map(finalize)
+
+def gather_example_outputs(sequence_output, example_positions):
+	"""[batch_size * max_examples_per_row, hidden] outputs at example_positions
+	of a [batch_size, seq_length, hidden] tensor."""
+	return tf.reshape(
+			tf.batch_gather(sequence_output, example_positions),
+			[-1, sequence_output.shape[-1].value])
@@ -2,6 +2,9 @@ import tensorflow as tf
 import numpy as np
 import copy
 import collections
+from data_generator import length_bucketing
+from data_generator import compact_pretrain_record
+from data_generator import sequence_packing
 
 """
 writer = tf.python_io.TFRecordWriter('%s.tfrecord' %'test')
@@ -60,17 +63,85 @@ def train_input_fn(input_file, _parse_fn, name_to_features,
 	dataset = dataset.shuffle(buffer_size=params.get("buffer_size", 1024),
 							seed=np.random.randint(0,1e10,1)[0],
 							reshuffle_each_iteration=True)
-	dataset = dataset.batch(params.get("batch_size", 32))
+	if params.get("pack_sequences", False):
+		dataset = pack_sequences(dataset, name_to_features,
+						params.get("max_examples_per_row", None),
+						params.get("bucket_length_key", "input_mask"))
+		dataset = dataset.batch(params.get("batch_size", 32), drop_remainder=True)
+	else:
+		dataset = dataset.batch(params.get("batch_size", 32))
 	dataset = dataset.repeat(params.get("epoch", 100))
 	iterator = dataset.make_one_shot_iterator()
 	features = iterator.get_next()
 	return features
 
+def bucket_by_length(dataset, name_to_features, bucket_boundaries,
+		batch_size, length_key="input_mask"):
+	"""Strips the padding of sequence features and batches by length.
+
+	Sequence features are the ones shaped like `length_key`, the length of
+	an example is the sum of its `length_key` mask. Every batch holds one
+	bucket of bucket_boundaries (inclusive upper lengths) and is padded to
+	its longest example. Batch order differs from the record order.
+	bucket_boundaries is a list or comma separated string, see
+	length_bucketing.parse_bucket_boundaries.
+	"""
+	seq_shape = name_to_features[length_key].shape
+	bucket_boundaries = length_bucketing.parse_bucket_boundaries(
+							bucket_boundaries, seq_shape[0])
+	seq_keys = [key for key in name_to_features 
+					if name_to_features[key].shape == seq_shape]
+
+	def trim(example):
+		length = tf.reduce_sum(tf.cast(example[length_key], tf.int32))
+		for key in seq_keys:
+			example[key] = example[key][:length]
+		return example
+
+	def element_length_func(example):
+		return tf.shape(example[length_key])[0]
+
+	dataset = dataset.map(trim)
+	return dataset.apply(tf.data.experimental.bucket_by_sequence_length(
+						element_length_func,
+						[boundary+1 for boundary in bucket_boundaries[:-1]],
+						[batch_size] * len(bucket_boundaries)))
+
+def pack_sequences(dataset, name_to_features, max_examples_per_row=None,
+		length_key="input_mask", max_predictions_per_row=None):
+	"""Packs several examples per max_seq_length row, see sequence_packing.
+
+	Sequence features are the ones shaped like `length_key`, int features of
+	shape [] or [1] are per-example labels. Rows come in packing order, not
+	record order.
+	"""
+	seq_shape = name_to_features[length_key].shape
+	masked_lm_keys = ["masked_lm_positions", "masked_lm_ids", "masked_lm_weights"]
+	# input_ids first, its segmentation marks the tokens of every example
+	seq_keys = ["input_ids"] + [key for key in sorted(name_to_features)
+					if key not in ["input_ids", length_key]
+					and name_to_features[key].shape == seq_shape]
+	example_keys = [key for key in sorted(name_to_features)
+					if key not in masked_lm_keys
+					and name_to_features[key].dtype == tf.int64
+					and list(name_to_features[key].shape) in [[], [1]]]
+	return sequence_packing.pack_dataset(dataset, seq_shape[0], seq_keys,
+						example_keys=example_keys,
+						max_examples_per_row=max_examples_per_row,
+						max_predictions_per_row=max_predictions_per_row,
+						length_key=length_key)
+
 def eval_input_fn(input_file, _parse_fn, name_to_features,
 		params):
 	dataset = tf.data.TFRecordDataset(input_file, buffer_size=params.get("buffer_size", 100))
 	dataset = dataset.map(lambda x:_parse_fn(x, name_to_features))
-	dataset = dataset.batch(params.get("batch_size", 32))
+	if params.get("bucket_boundaries", None):
+		dataset = bucket_by_length(dataset, name_to_features,
+						params["bucket_boundaries"],
+						params.get("batch_size", 32),
+						params.get("bucket_length_key", "input_mask"))
+	else:
+		dataset = dataset.batch(params.get("batch_size", 32))
 	dataset = dataset.repeat(1)
 	iterator = dataset.make_one_shot_iterator()
 	features = iterator.get_next()
@@ -130,7 +201,24 @@ def input_fn_builder(input_files,
 					 max_predictions_per_seq,
 					 is_training,
 					 num_cpu_threads=4, **kargs):
-	"""Creates an `input_fn` closure to be passed to TPUEstimator."""
+	"""Creates an `input_fn` closure to be passed to TPUEstimator.
+
+	kargs record_format "compact" reads compact_pretrain_record files,
+	compression_type "GZIP" or "ZLIB" reads compressed files, pack_sequences
+	packs several examples per row (see pack_sequences).
+	"""
+	record_format = kargs.get("record_format", "padded")
+	compression_type = kargs.get("compression_type", "")
+	pack = kargs.get("pack_sequences", False)
+
+	def record_dataset(input_file):
+		return tf.data.TFRecordDataset(input_file, compression_type=compression_type)
+
+	def decode_record(record, name_to_features):
+		if record_format == "compact":
+			return compact_pretrain_record.decode_compact_record(record,
+							max_seq_length, max_predictions_per_seq)
+		return _decode_record(record, name_to_features)
 
 	def input_fn(params):
 		"""The actual input function."""
@@ -166,12 +254,12 @@ def input_fn_builder(input_files,
 			# even more randomness to the training pipeline.
 			d = d.apply(
 					tf.contrib.data.parallel_interleave(
-							tf.data.TFRecordDataset,
+							record_dataset,
 							sloppy=is_training,
 							cycle_length=cycle_length))
 			d = d.shuffle(buffer_size=100)
 		else:
-			d = tf.data.TFRecordDataset(input_files)
+			d = record_dataset(input_files)
 			# Since we evaluate for a fixed number of steps we don't want to encounter
 			# out-of-range exceptions.
 			d = d.repeat()
@@ -180,9 +268,17 @@ def input_fn_builder(input_files,
 		# size dimensions. For eval, we assume we are evaluating on the CPU or GPU
 		# and we *don't* want to drop the remainder, otherwise we wont cover
 		# every sample.
+		if pack:
+			d = d.map(lambda record: decode_record(record, name_to_features),
+						num_parallel_calls=num_cpu_threads)
+			d = pack_sequences(d, name_to_features,
+						kargs.get("max_examples_per_row", None),
+						max_predictions_per_row=kargs.get("max_predictions_per_row", None))
+			return d.batch(batch_size, drop_remainder=True)
+
 		d = d.apply(
 				tf.contrib.data.map_and_batch(
-						lambda record: _decode_record(record, name_to_features),
+						lambda record: decode_record(record, name_to_features),
 						batch_size=batch_size,
 						num_parallel_batches=num_cpu_threads,
 						drop_remainder=True))
@@ -195,7 +291,24 @@ def electra_input_fn_builder(input_files,
 					 max_predictions_per_seq,
 					 is_training,
 					 num_cpu_threads=4, **kargs):
-	"""Creates an `input_fn` closure to be passed to TPUEstimator."""
+	"""Creates an `input_fn` closure to be passed to TPUEstimator.
+
+	kargs record_format "compact" reads compact_pretrain_record files,
+	compression_type "GZIP" or "ZLIB" reads compressed files, pack_sequences
+	packs several examples per row (see pack_sequences).
+	"""
+	record_format = kargs.get("record_format", "padded")
+	compression_type = kargs.get("compression_type", "")
+	pack = kargs.get("pack_sequences", False)
+
+	def record_dataset(input_file):
+		return tf.data.TFRecordDataset(input_file, compression_type=compression_type)
+
+	def decode_record(record, name_to_features):
+		if record_format == "compact":
+			return compact_pretrain_record.decode_compact_record(record,
+							max_seq_length, max_predictions_per_seq, with_ori_ids=True)
+		return _decode_record(record, name_to_features)
 
 	def input_fn(params):
 		"""The actual input function."""
@@ -233,12 +346,12 @@ def electra_input_fn_builder(input_files,
 			# even more randomness to the training pipeline.
 			d = d.apply(
 					tf.contrib.data.parallel_interleave(
-							tf.data.TFRecordDataset,
+							record_dataset,
 							sloppy=is_training,
 							cycle_length=cycle_length))
 			d = d.shuffle(buffer_size=100)
 		else:
-			d = tf.data.TFRecordDataset(input_files)
+			d = record_dataset(input_files)
 			# Since we evaluate for a fixed number of steps we don't want to encounter
 			# out-of-range exceptions.
 			d = d.repeat()
@@ -247,9 +360,17 @@ def electra_input_fn_builder(input_files,
 		# size dimensions. For eval, we assume we are evaluating on the CPU or GPU
 		# and we *don't* want to drop the remainder, otherwise we wont cover
 		# every sample.
+		if pack:
+			d = d.map(lambda record: decode_record(record, name_to_features),
+						num_parallel_calls=num_cpu_threads)
+			d = pack_sequences(d, name_to_features,
+						kargs.get("max_examples_per_row", None),
+						max_predictions_per_row=kargs.get("max_predictions_per_row", None))
+			return d.batch(batch_size, drop_remainder=True)
+
 		d = d.apply(
 				tf.contrib.data.map_and_batch(
-						lambda record: _decode_record(record, name_to_features),
+						lambda record: decode_record(record, name_to_features),
 						batch_size=batch_size,
 						num_parallel_batches=num_cpu_threads,
 						drop_remainder=True))
@@ -347,12 +347,17 @@ def whitespace_tokenize(text):
 
 class FullTokenizer(object):
 	"""Runs end-to-end tokenziation."""
-	def __init__(self, vocab_file, do_lower_case=True, do_whole_word_mask=False):
+	def __init__(self, vocab_file, do_lower_case=True, do_whole_word_mask=False,
+				use_trie=True, cache_size=100000):
 		self.vocab = load_vocab(vocab_file)
 		self.inv_vocab = {v: k for k, v in self.vocab.items()}
 		self.basic_tokenizer = BasicTokenizer(do_lower_case=do_lower_case, 
 												do_whole_word_mask=do_whole_word_mask)
-		self.wordpiece_tokenizer = WordpieceTokenizer(vocab=self.vocab)
+		if use_trie:
+			self.wordpiece_tokenizer = TrieWordpieceTokenizer(vocab=self.vocab,
+												cache_size=cache_size)
+		else:
+			self.wordpiece_tokenizer = WordpieceTokenizer(vocab=self.vocab)
 
 	def tokenize(self, text):
 		split_tokens = []
@@ -362,6 +367,20 @@ class FullTokenizer(object):
 
 		return split_tokens
 
+	def tokenize_to_ids(self, text):
+		"""Tokenizes `text` straight to ids, same as
+		convert_tokens_to_ids(tokenize(text))."""
+		if not isinstance(self.wordpiece_tokenizer, TrieWordpieceTokenizer):
+			return self.convert_tokens_to_ids(self.tokenize(text))
+		input_ids = []
+		for token in self.basic_tokenizer.tokenize(text):
+			input_ids.extend(self.wordpiece_tokenizer.tokenize_to_ids(token))
+		return input_ids
+
+	def tokenize_batch(self, texts):
+		"""Tokenizes a list of texts and returns one id list per text."""
+		return [self.tokenize_to_ids(text) for text in texts]
+
 	def convert_tokens_to_ids(self, tokens, max_length=None):
 		return convert_tokens_to_ids(self.vocab, tokens)
 
@@ -391,16 +410,105 @@ class FullTokenizer(object):
 class BasicTokenizer(object):
 	"""Runs basic tokenization (punctuation splitting, lower casing, etc.)."""
 
-	def __init__(self, do_lower_case=True, do_whole_word_mask=False):
+	def __init__(self, do_lower_case=True, do_whole_word_mask=False,
+				use_fast_path=True):
 		"""Constructs a BasicTokenizer.
 		Args:
 			do_lower_case: Whether to lower case the input.
+			use_fast_path: Whether to normalize and split in a single pass over
+				the precomputed codepoint tables.
 		"""
 		self.do_lower_case = do_lower_case
 		self.do_whole_word_mask = do_whole_word_mask
+		self.use_fast_path = use_fast_path
 
 	def tokenize(self, text):
 		"""Tokenizes a piece of text."""
+		if self.use_fast_path:
+			return self._tokenize_fast(text)
+		return self._tokenize_slow(text)
+
+	def _tokenize_fast(self, text):
+		"""Single-pass equivalent of _tokenize_slow.
+
+		Every codepoint is classified through _CHAR_CLASS and lower cased
+		through _CHAR_LOWER. A whitespace-delimited segment containing a char
+		without a precomputed lower form (anything NFD would change) is
+		re-run through the slow per-token path.
+		"""
+		text = convert_to_unicode(text)
+		char_lower = _CHAR_LOWER if self.do_lower_case else None
+		split_chinese = not self.do_whole_word_mask
+
+		output = []
+		word = []
+		segment = []
+		segment_start = 0
+		is_slow = False
+		for char in text:
+			cp = ord(char)
+			if cp < _CHAR_TABLE_SIZE:
+				char_class = _CHAR_CLASS[cp]
+			else:
+				char_class = _classify_char(char)
+
+			if char_class == _CHAR_DROP:
+				continue
+
+			if char_class == _CHAR_SPACE or (char_class == _CHAR_CHINESE and split_chinese):
+				if is_slow:
+					del output[segment_start:]
+					output.extend(self._split_token_slow("".join(segment)))
+				elif word:
+					output.append("".join(word))
+				word = []
+				segment = []
+				is_slow = False
+				if char_class == _CHAR_CHINESE:
+					if char_lower is None:
+						output.append(char)
+					elif cp < _CHAR_TABLE_SIZE and char_lower[cp] is not None:
+						output.append(char_lower[cp])
+					else:
+						output.extend(self._split_token_slow(char))
+				segment_start = len(output)
+				continue
+
+			segment.append(char)
+			if is_slow:
+				continue
+			if char_lower is None:
+				mapped = char
+			else:
+				mapped = char_lower[cp] if cp < _CHAR_TABLE_SIZE else None
+				if mapped is None:
+					is_slow = True
+					continue
+
+			if char_class == _CHAR_PUNCTUATION:
+				if word:
+					output.append("".join(word))
+					word = []
+				output.append(mapped)
+			else:
+				word.append(mapped)
+
+		if is_slow:
+			del output[segment_start:]
+			output.extend(self._split_token_slow("".join(segment)))
+		elif word:
+			output.append("".join(word))
+		return output
+
+	def _split_token_slow(self, token):
+		"""Lower cases, strips accents and splits one whitespace token."""
+		if self.do_lower_case:
+			token = token.lower()
+			token = self._run_strip_accents(token)
+		return whitespace_tokenize(" ".join(self._run_split_on_punc(token)))
+
+	def _tokenize_slow(self, text):
+		"""Tokenizes a piece of text, one normalization pass at a time."""
 		text = convert_to_unicode(text)
 		text = self._clean_text(text)
 
@@ -561,6 +669,110 @@ class WordpieceTokenizer(object):
 				output_tokens.extend(sub_tokens)
 		return output_tokens
 
+class _LRUCache(object):
+	"""Bounded word -> value memo, evicting the least recently used word."""
+
+	def __init__(self, capacity):
+		self.capacity = capacity
+		self.data = collections.OrderedDict()
+
+	def get(self, key):
+		value = self.data.pop(key, None)
+		if value is not None:
+			self.data[key] = value
+		return value
+
+	def put(self, key, value):
+		if self.capacity <= 0:
+			return
+		self.data.pop(key, None)
+		self.data[key] = value
+		if len(self.data) > self.capacity:
+			self.data.popitem(last=False)
+
+	def __len__(self):
+		return len(self.data)
+
+
+class TrieWordpieceTokenizer(WordpieceTokenizer):
+	"""WordPiece tokenization over a vocab prefix trie.
+
+	Produces exactly the same pieces as WordpieceTokenizer, but finds the
+	longest match of each piece with a single left-to-right walk instead of
+	probing the vocab with every shrinking substring. Results are memoized
+	per word in a bounded LRU cache.
+	"""
+
+	def __init__(self, vocab, unk_token="[UNK]", max_input_chars_per_word=200,
+				cache_size=100000):
+		super(TrieWordpieceTokenizer, self).__init__(vocab, unk_token,
+									max_input_chars_per_word)
+		# word-start pieces are matched verbatim against every vocab entry,
+		# continuation pieces against the "##"-stripped entries
+		self.start_trie = {}
+		self.cont_trie = {}
+		for piece in vocab:
+			self._add_piece(self.start_trie, piece, piece)
+			if piece.startswith("##") and len(piece) > 2:
+				self._add_piece(self.cont_trie, piece[2:], piece)
+		self.cache = _LRUCache(cache_size)
+
+	def _add_piece(self, trie, chars, piece):
+		node = trie
+		for char in chars:
+			node = node.setdefault(char, {})
+		# None never collides with a one-char key
+		node[None] = piece
+
+	def _match(self, token):
+		"""Greedy longest-match-first split of a single word."""
+		if len(token) > self.max_input_chars_per_word:
+			return [self.unk_token]
+
+		sub_tokens = []
+		start = 0
+		trie = self.start_trie
+		while start < len(token):
+			node = trie
+			cur_substr = None
+			end = start
+			for i in range(start, len(token)):
+				node = node.get(token[i])
+				if node is None:
+					break
+				if None in node:
+					cur_substr = node[None]
+					end = i + 1
+			if cur_substr is None:
+				return [self.unk_token]
+			sub_tokens.append(cur_substr)
+			start = end
+			trie = self.cont_trie
+		return sub_tokens
+
+	def _lookup(self, token):
+		entry = self.cache.get(token)
+		if entry is None:
+			sub_tokens = self._match(token)
+			entry = (sub_tokens, convert_by_vocab(self.vocab, sub_tokens))
+			self.cache.put(token, entry)
+		return entry
+
+	def tokenize(self, text):
+		text = convert_to_unicode(text)
+		output_tokens = []
+		for token in whitespace_tokenize(text):
+			output_tokens.extend(self._lookup(token)[0])
+		return output_tokens
+
+	def tokenize_to_ids(self, text):
+		"""Same as convert_by_vocab(vocab, tokenize(text)), using the memo."""
+		text = convert_to_unicode(text)
+		output_ids = []
+		for token in whitespace_tokenize(text):
+			output_ids.extend(self._lookup(token)[1])
+		return output_ids
+
 def _is_chinese_char(cp):
 	"""Checks whether CP is the codepoint of a CJK character."""
 	# This defines a "chinese character" as anything in the CJK Unicode block:
@@ -621,3 +833,63 @@ def _is_punctuation(char):
 	if cat.startswith("P"):
 		return True
 	return False
+
+
+_CHAR_DROP = 0
+_CHAR_SPACE = 1
+_CHAR_CHINESE = 2
+_CHAR_PUNCTUATION = 3
+_CHAR_OTHER = 4
+
+# codepoints below this are classified through the import-time tables,
+# the rest (supplementary planes) on the fly
+_CHAR_TABLE_SIZE = 0x10000
+
+
+def _classify_char(char):
+	"""Maps a char to the BasicTokenizer pass that acts on it."""
+	cp = ord(char)
+	if cp == 0 or cp == 0xfffd or _is_control(char):
+		return _CHAR_DROP
+	# str.split also breaks on a few non-Zs chars like U+2028
+	if _is_whitespace(char) or char.isspace():
+		return _CHAR_SPACE
+	if _is_chinese_char(cp):
+		return _CHAR_CHINESE
+	if _is_punctuation(char):
+		return _CHAR_PUNCTUATION
+	return _CHAR_OTHER
+
+
+def _lower_char(char, char_class):
+	"""Returns the lower cased, accent-stripped form of `char`, or None when
+	it is only correct to compute in the context of the whole token."""
+	if char_class in (_CHAR_DROP, _CHAR_SPACE):
+		return None
+	# capital sigma lower cases differently at the end of a word
+	if char == u"\u03a3":
+		return None
+	lower = char.lower()
+	if len(lower) != 1:
+		return None
+	if (unicodedata.normalize("NFD", lower) != lower or
+		unicodedata.combining(lower) or
+		unicodedata.category(lower) == "Mn"):
+		return None
+	if _classify_char(lower) != char_class:
+		return None
+	return lower
+
+
+def _build_char_tables(table_size):
+	char_class = []
+	char_lower = []
+	for cp in range(table_size):
+		char = six.unichr(cp)
+		cls = _classify_char(char)
+		char_class.append(cls)
+		char_lower.append(_lower_char(char, cls))
+	return char_class, char_lower
+
+
+_CHAR_CLASS, _CHAR_LOWER = _build_char_tables(_CHAR_TABLE_SIZE)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmark trie WordpieceTokenizer against the original implementation."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys,os
+import time
+
+father_path = os.path.join(os.getcwd())
+print(father_path, "==father path==")
+
+def find_bert(father_path):
+	if father_path.split("/")[-1] == "BERT":
+		return father_path
+
+	output_path = ""
+	for fi in os.listdir(father_path):
+		if fi == "BERT":
+			output_path = os.path.join(father_path, fi)
+			break
+		else:
+			if os.path.isdir(os.path.join(father_path, fi)):
+				find_bert(os.path.join(father_path, fi))
+			else:
+				continue
+	return output_path
+
+bert_path = find_bert(father_path)
+t2t_bert_path = os.path.join(bert_path, "t2t_bert")
+sys.path.extend([bert_path, t2t_bert_path])
+
+from data_generator import tokenization
+import tensorflow as tf
+
+flags = tf.flags
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string("input_file", None,
+					"Input raw text file (or comma-separated list of files).")
+
+flags.DEFINE_string("vocab_file", None,
+					"The vocabulary file that the BERT model was trained on.")
+
+flags.DEFINE_bool(
+		"do_lower_case", True,
+		"Whether to lower case the input text. Should be True for uncased "
+		"models and False for cased models.")
+
+flags.DEFINE_integer("max_lines", 100000,
+					"Maximum number of lines read from the input files.")
+
+flags.DEFINE_integer("cache_size", 100000,
+					"Capacity of the per-word memo of the trie tokenizer.")
+
+flags.DEFINE_integer("batch_size", 256,
+					"Number of lines per tokenize_batch call.")
+
+def read_lines(input_files, max_lines):
+	lines = []
+	for input_file in input_files:
+		with tf.gfile.GFile(input_file, "r") as reader:
+			for line in reader:
+				line = line.strip()
+				if not line:
+					continue
+				lines.append(line)
+				if len(lines) >= max_lines:
+					return lines
+	return lines
+
+def main(_):
+	tf.logging.set_verbosity(tf.logging.INFO)
+
+	input_files = []
+	for input_pattern in FLAGS.input_file.split(","):
+		input_files.extend(tf.gfile.Glob(input_pattern))
+	lines = read_lines(input_files, FLAGS.max_lines)
+	total_chars = sum([len(line) for line in lines])
+	tf.logging.info("** benchmark lines %d chars %d **", len(lines), total_chars)
+
+	base_tokenizer = tokenization.FullTokenizer(
+			vocab_file=FLAGS.vocab_file,
+			do_lower_case=FLAGS.do_lower_case,
+			use_trie=False)
+	trie_tokenizer = tokenization.FullTokenizer(
+			vocab_file=FLAGS.vocab_file,
+			do_lower_case=FLAGS.do_lower_case,
+			use_trie=True,
+			cache_size=FLAGS.cache_size)
+
+	start = time.time()
+	base_ids = [base_tokenizer.convert_tokens_to_ids(base_tokenizer.tokenize(line))
+					for line in lines]
+	base_time = time.time() - start
+
+	start = time.time()
+	trie_ids = []
+	for index in range(0, len(lines), FLAGS.batch_size):
+		trie_ids.extend(trie_tokenizer.tokenize_batch(lines[index:index+FLAGS.batch_size]))
+	trie_time = time.time() - start
+
+	mismatch = 0
+	for line, base, trie in zip(lines, base_ids, trie_ids):
+		if base != trie:
+			mismatch += 1
+			if mismatch <= 10:
+				tf.logging.info("mismatch: %s", tokenization.printable_text(line))
+
+	tf.logging.info("** baseline: %.3fs, %.1f lines/s **", base_time, len(lines) / base_time)
+	tf.logging.info("** trie+memo: %.3fs, %.1f lines/s **", trie_time, len(lines) / trie_time)
+	tf.logging.info("** speedup %.2fx, memo size %d, mismatched lines %d **",
+					base_time / trie_time,
+					len(trie_tokenizer.wordpiece_tokenizer.cache),
+					mismatch)
+
+if __name__ == "__main__":
+	flags.mark_flag_as_required("input_file")
+	flags.mark_flag_as_required("vocab_file")
+	tf.app.run()
@@ -409,6 +409,16 @@ flags.DEFINE_string(
 	"if apply distillation"
 	)
 
+flags.DEFINE_bool(
+	"pack_sequences", False,
+	"pack several short training examples per max_length row"
+	)
+
+flags.DEFINE_integer(
+	"max_examples_per_row", 0,
+	"labels kept per packed row, 0 is max_length // 2"
+	)
+
 def main(_):
 
 	print(FLAGS)
@@ -545,7 +555,9 @@ def main(_):
 			attention_type=FLAGS.attention_type,
 			ues_token_type=FLAGS.ues_token_type,
 			seq_type=FLAGS.seq_type,
-			mask_type=FLAGS.mask_type)
+			mask_type=FLAGS.mask_type,
+			pack_sequences=FLAGS.pack_sequences,
+			max_examples_per_row=FLAGS.max_examples_per_row or None)
 			# use_tpu=FLAGS.use_tpu)
 
 if __name__ == "__main__":
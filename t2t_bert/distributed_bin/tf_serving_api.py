@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 
-import requests
 import json
 import tensorflow as tf
 import sys,os
@@ -32,6 +31,7 @@ print(sys.path)
 
 from distributed_single_sentence_classification import tf_serving_data_prepare as single_sent_data_prepare
 from distributed_pair_sentence_classification import tf_serving_data_prepare as pair_sent_data_prepare
+from utils.export_model import tf_serving_client
 
 flags = tf.flags
 
@@ -143,33 +143,46 @@ flags.DEFINE_integer(
 	"The config json file corresponding to the pre-trained BERT model. "
 	"This specifies the model architecture.")
 
+flags.DEFINE_integer(
+	"chunk_size", 64,
+	"number of instances per predict request")
+
+flags.DEFINE_integer(
+	"max_in_flight", 4,
+	"max number of concurrent predict requests")
+
+flags.DEFINE_integer(
+	"max_retries", 3,
+	"retries of a failed predict request")
+
+flags.DEFINE_integer(
+	"timeout", 30,
+	"seconds before a predict request times out")
+
 def main(_):
 
+	vocab_path = os.path.join(FLAGS.buckets, FLAGS.vocab)
+	corpus_path = os.path.join(FLAGS.buckets, FLAGS.input_data)
+	output_path = os.path.join(FLAGS.buckets, FLAGS.output_path)
+	print(corpus_path, vocab_path)
+
 	if FLAGS.task_type == "pair_sentence_classification":
-		vocab_path = os.path.join(FLAGS.buckets, FLAGS.vocab)
-		corpus_path = os.path.join(FLAGS.buckets, FLAGS.input_data)
-		print(corpus_path, vocab_path)
-		feed_dict = pair_sent_data_prepare.get_feeddict(FLAGS, vocab_path, corpus_path)
-		output_path = os.path.join(FLAGS.buckets, FLAGS.output_path)
+		instances = pair_sent_data_prepare.get_instance_generator(FLAGS, vocab_path, corpus_path)
 	elif FLAGS.task_type == "single_sentence_classification":
-		vocab_path = os.path.join(FLAGS.buckets, FLAGS.vocab)
-		corpus_path = os.path.join(FLAGS.buckets, FLAGS.input_data)
-		print(corpus_path, vocab_path)
-		feed_dict = single_sent_data_prepare.get_feeddict(FLAGS, vocab_path, corpus_path)
-		output_path = os.path.join(FLAGS.buckets, FLAGS.output_path)
-
-	results = requests.post("http://%s:%s/v1/models/%s/versions/%s:predict" % (FLAGS.url, 
-															FLAGS.port, FLAGS.model_name, 
-															FLAGS.versions), 
-															json=feed_dict)
-	try:
-		with tf.gfile.Open(output_path, "w") as fwobj:
-			pred_lst = results.content.decode()
-			json.dump(pred_lst, fwobj)
-		print(results.content.decode())
-	except:
-		predict_info = []
-		print(results.content.decode())
+		instances = single_sent_data_prepare.get_instance_generator(FLAGS, vocab_path, corpus_path)
+
+	client = tf_serving_client.TFServingClient(
+				tf_serving_client.predict_url(FLAGS.url, FLAGS.port, 
+											FLAGS.model_name, FLAGS.versions),
+				signature_name=FLAGS.signature_name,
+				chunk_size=FLAGS.chunk_size,
+				max_in_flight=FLAGS.max_in_flight,
+				max_retries=FLAGS.max_retries,
+				timeout=FLAGS.timeout)
+
+	with tf.gfile.Open(output_path, "w") as fwobj:
+		rows, rows_per_sec = client.score(instances, fwobj)
+	print("==scored {} rows, {:.1f} rows/s, output {}==".format(rows, rows_per_sec, output_path))
 
 if __name__ == "__main__":
 	tf.app.run()
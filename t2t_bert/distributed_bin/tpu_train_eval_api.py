@@ -390,6 +390,16 @@ flags.DEFINE_string(
 	"if apply distillation"
 	)
 
+flags.DEFINE_string(
+	"record_format", "padded",
+	"padded or compact pretraining records"
+	)
+
+flags.DEFINE_string(
+	"compression_type", "",
+	"empty, GZIP or ZLIB compressed pretraining records"
+	)
+
 import random
 def main(_):
 
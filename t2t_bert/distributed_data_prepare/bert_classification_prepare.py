@@ -33,6 +33,7 @@ from data_generator import tokenization
 import json
 
 from example import feature_writer, write_to_tfrecords
+from example import sharded_tfrecord_writer
 from example import classifier_processor
 from data_generator import vocab_filter
 
@@ -145,6 +146,24 @@ flags.DEFINE_string(
 	"if apply rule detector"
 	)
 
+flags.DEFINE_integer(
+	"num_shards", 0,
+	"fasttext data only, > 0 streams every file into num_shards tfrecords "
+	"with a resumable manifest, result files are then output prefixes. "
+	"Examples are shuffled within chunk_size lines only, run "
+	"shuffle_tfrecords.py on inputs grouped by label"
+	)
+
+flags.DEFINE_integer(
+	"num_workers", 4,
+	"processes converting examples when num_shards > 0"
+	)
+
+flags.DEFINE_integer(
+	"chunk_size", 10000,
+	"lines per chunk when num_shards > 0"
+	)
+
 def main(_):
 
 	# vocab_path = os.path.join(FLAGS.buckets, FLAGS.vocab_file)
@@ -170,6 +189,23 @@ def main(_):
 
 	classifier_data_api.get_labels(FLAGS.label_id)
 
+	if FLAGS.num_shards > 0 and FLAGS.data_type in ["fasttext_product", "fasttext"]:
+		for input_file, output_prefix in [(train_file, train_result_file),
+										(dev_file, dev_result_file),
+										(test_file, test_result_file)]:
+			manifest = sharded_tfrecord_writer.write_sharded_classifier_tfrecords(
+											[input_file],
+											output_prefix,
+											classifier_data_api,
+											tokenizer,
+											classifier_data_api.label2id,
+											FLAGS.max_length,
+											num_shards=FLAGS.num_shards,
+											num_workers=FLAGS.num_workers,
+											chunk_size=FLAGS.chunk_size)
+			tf.logging.info("** %s: %d records **", output_prefix, manifest["num_records"])
+		return
+
 	train_examples = classifier_data_api.get_train_examples(train_file,
 										is_shuffle=True)
 	dev_examples = classifier_data_api.get_train_examples(dev_file,
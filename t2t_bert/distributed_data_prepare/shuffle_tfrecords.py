@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import sys,os
+
+father_path = os.path.join(os.getcwd())
+print(father_path, "==father path==")
+
+def find_bert(father_path):
+	if father_path.split("/")[-1] == "BERT":
+		return father_path
+
+	output_path = ""
+	for fi in os.listdir(father_path):
+		if fi == "BERT":
+			output_path = os.path.join(father_path, fi)
+			break
+		else:
+			if os.path.isdir(os.path.join(father_path, fi)):
+				find_bert(os.path.join(father_path, fi))
+			else:
+				continue
+	return output_path
+
+bert_path = find_bert(father_path)
+t2t_bert_path = os.path.join(bert_path, "t2t_bert")
+sys.path.extend([bert_path, t2t_bert_path])
+
+import tensorflow as tf
+
+from example import tfrecord_shuffle
+
+"""
+Shuffles a TFRecord corpus of any size into evenly sized shards with a two
+pass external shuffle, see example/tfrecord_shuffle.py. Shuffled shards
+mix across the whole corpus, unlike the shuffle buffer of the input_fn.
+"""
+
+flags = tf.flags
+
+FLAGS = flags.FLAGS
+
+tf.logging.set_verbosity(tf.logging.INFO)
+
+flags.DEFINE_string("buckets", "", "oss buckets")
+
+flags.DEFINE_string(
+	"input_file", None,
+	"input TFRecord files, a glob or comma separated")
+
+flags.DEFINE_string(
+	"output_prefix", None,
+	"output shards are output_prefix-00000-of-NNNNN.tfrecord, a local path")
+
+flags.DEFINE_integer(
+	"num_shards", 8,
+	"number of output shards")
+
+flags.DEFINE_integer(
+	"num_buckets", 0,
+	"number of scatter groups, 0 derives it from max_bucket_mb")
+
+flags.DEFINE_integer(
+	"max_bucket_mb", 256,
+	"max uncompressed bucket size, one bucket is held in memory per worker")
+
+flags.DEFINE_integer(
+	"max_open_files", 256,
+	"max open temporary files per worker")
+
+flags.DEFINE_integer(
+	"num_workers", 4,
+	"number of worker processes")
+
+flags.DEFINE_integer(
+	"seed", 12345,
+	"random seed")
+
+flags.DEFINE_string(
+	"compression_type", "",
+	"compression of the input files, GZIP or ZLIB")
+
+def main(_):
+	input_files = []
+	for pattern in FLAGS.input_file.split(","):
+		input_files.extend(sorted(tf.gfile.Glob(os.path.join(FLAGS.buckets, pattern))))
+
+	tfrecord_shuffle.shuffle_tfrecords(input_files, FLAGS.output_prefix,
+							num_shards=FLAGS.num_shards,
+							num_buckets=FLAGS.num_buckets or None,
+							max_bucket_bytes=FLAGS.max_bucket_mb << 20,
+							num_workers=FLAGS.num_workers,
+							seed=FLAGS.seed,
+							compression_type=FLAGS.compression_type,
+							max_open_files=FLAGS.max_open_files)
+
+if __name__ == "__main__":
+	tf.app.run()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+import sys,os,json
+
+father_path = os.path.join(os.getcwd())
+print(father_path, "==father path==")
+
+def find_bert(father_path):
+	if father_path.split("/")[-1] == "BERT":
+		return father_path
+
+	output_path = ""
+	for fi in os.listdir(father_path):
+		if fi == "BERT":
+			output_path = os.path.join(father_path, fi)
+			break
+		else:
+			if os.path.isdir(os.path.join(father_path, fi)):
+				find_bert(os.path.join(father_path, fi))
+			else:
+				continue
+	return output_path
+
+bert_path = find_bert(father_path)
+t2t_bert_path = os.path.join(bert_path, "t2t_bert")
+sys.path.extend([bert_path, t2t_bert_path])
+
+import time
+import numpy as np
+import tensorflow as tf
+
+from app.infer import InferAPI
+from example import classifier_processor
+from data_generator import distillation_cache
+from data_generator import length_bucketing
+
+"""
+Runs the teacher once over fasttext style "__label__x text" files and
+writes its top-k logits into a distillation cache keyed by the text hash.
+Pass the cache path as supervised/unsupervised_distillation_file of
+classification_distillation_data_prepare.py to build student data.
+"""
+
+flags = tf.flags
+
+FLAGS = flags.FLAGS
+
+tf.logging.set_verbosity(tf.logging.INFO)
+
+flags.DEFINE_string("buckets", "", "oss buckets")
+
+flags.DEFINE_string(
+	"input_file", None,
+	"comma separated fasttext style files to score with the teacher")
+
+flags.DEFINE_string(
+	"cache_path", None,
+	"output distillation cache, a local path prefix")
+
+flags.DEFINE_string(
+	"reuse_cache_path", "",
+	"existing cache, texts found in it are copied without running the teacher")
+
+flags.DEFINE_string(
+	"label_id", None,
+	"label2id/id2label json of the teacher")
+
+flags.DEFINE_string(
+	"vocab_file", None,
+	"teacher vocab")
+
+flags.DEFINE_string(
+	"config_file", None,
+	"teacher bert config")
+
+flags.DEFINE_string(
+	"init_checkpoint", None,
+	"teacher checkpoint")
+
+flags.DEFINE_string(
+	"model_dir", "",
+	"teacher model dir, its latest checkpoint wins over init_checkpoint")
+
+flags.DEFINE_integer(
+	"max_length", 128,
+	"teacher max sequence length")
+
+flags.DEFINE_integer(
+	"batch_size", 64,
+	"teacher inference batch size")
+
+flags.DEFINE_string(
+	"bucket_boundaries", "16,32,64",
+	"length buckets of teacher inference")
+
+flags.DEFINE_integer(
+	"top_k", 0,
+	"number of logits kept per example, 0 keeps all classes")
+
+flags.DEFINE_integer(
+	"chunk_size", 10000,
+	"texts tokenized and scored per chunk")
+
+def main(_):
+
+	label_id = os.path.join(FLAGS.buckets, FLAGS.label_id)
+	api = InferAPI({
+		"label2id":label_id,
+		"init_checkpoint":os.path.join(FLAGS.buckets, FLAGS.init_checkpoint),
+		"bert_config":os.path.join(FLAGS.buckets, FLAGS.config_file),
+		"bert_vocab":os.path.join(FLAGS.buckets, FLAGS.vocab_file),
+		"model_dir":os.path.join(FLAGS.buckets, FLAGS.model_dir) if FLAGS.model_dir else "",
+		"max_length":FLAGS.max_length,
+		"batch_size":FLAGS.batch_size,
+		"bucket_boundaries":FLAGS.bucket_boundaries,
+		"predict_mode":"session"
+		})
+	api.load_label_dict()
+	api.init_model()
+	boundaries = length_bucketing.parse_bucket_boundaries(FLAGS.bucket_boundaries, FLAGS.max_length)
+
+	# parse lines exactly like the student data prepare, so keys match
+	processor = classifier_processor.FasttextDistillationProcessor()
+	processor.get_labels(label_id)
+
+	reuse_cache = None
+	if FLAGS.reuse_cache_path and distillation_cache.DistillationCache.exists(FLAGS.reuse_cache_path):
+		reuse_cache = distillation_cache.DistillationCache(FLAGS.reuse_cache_path)
+
+	writer = distillation_cache.DistillationCacheWriter(FLAGS.cache_path,
+											api.num_classes,
+											top_k=FLAGS.top_k or None)
+
+	def score(texts):
+		features_lst = [api.get_single_features(text) for text in texts]
+		predictions = length_bucketing.bucketed_predict(api.predict, features_lst,
+											boundaries, FLAGS.batch_size)
+		writer.add_batch(texts, np.stack([item["logits"] for item in predictions], axis=0))
+
+	start = time.time()
+	num_scored, num_reused = 0, 0
+	seen = set()
+	for input_file in FLAGS.input_file.split(","):
+		lines = processor._read_data(os.path.join(FLAGS.buckets, input_file))
+		texts = []
+		for example in processor._create_examples(lines):
+			key = distillation_cache.text_hash(example.text_a)
+			if key in seen:
+				continue
+			seen.add(key)
+			top_k = reuse_cache.get_top_k(example.text_a) if reuse_cache else None
+			if top_k is not None and top_k[0].shape[0] == writer.top_k:
+				writer.add_top_k([key], top_k[0][None, :], top_k[1][None, :])
+				num_reused += 1
+				continue
+			texts.append(example.text_a)
+			if len(texts) == FLAGS.chunk_size:
+				score(texts)
+				num_scored += len(texts)
+				texts = []
+				tf.logging.info("** scored %d examples, %.1f examples/s **",
+								num_scored, num_scored / (time.time() - start))
+		if texts:
+			score(texts)
+			num_scored += len(texts)
+	writer.close()
+	tf.logging.info("** cache %s: %d scored by the teacher, %d reused **",
+					FLAGS.cache_path, num_scored, num_reused)
+
+if __name__ == "__main__":
+	tf.app.run()
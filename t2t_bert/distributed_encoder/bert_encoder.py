@@ -71,6 +71,16 @@ def bert_encoder(model_config, features, labels,
 	else:
 		tf.logging.info(" not use token type ")
 
+	# packed rows of data_generator.sequence_packing
+	packed_features = {}
+	if not target and "segmentation_ids" in features:
+		packed_features = {
+			"position_ids":features["position_ids"],
+			"segmentation_ids":features["segmentation_ids"],
+			"example_positions":features["example_positions"]
+		}
+		tf.logging.info(" using packed sequences ")
+
 	model = bert.Bert(model_config)
 	model.build_embedder(input_ids, 
 						segment_ids,
@@ -83,7 +93,8 @@ def bert_encoder(model_config, features, labels,
 						stop_gradient=kargs.get("stop_gradient", False),
 						reuse_mask=kargs.get("reuse_mask", True),
 						embedding_mixup=kargs.get("embedding_mixup", None),
-						emb_adv_pos=kargs.get('emb_adv_pos', "emb_adv_post"))
+						emb_adv_pos=kargs.get('emb_adv_pos', "emb_adv_post"),
+						position_ids=packed_features.get("position_ids", None))
 	model.build_encoder(input_ids,
 						input_mask,
 						hidden_dropout_prob, 
@@ -93,8 +104,10 @@ def bert_encoder(model_config, features, labels,
 						reuse_mask=kargs.get("reuse_mask", True),
 						structural_attentions=model_config.get("structural_attentions", "none"),
 						is_training=is_training,
-						embedding_mixup_v1=kargs.get("embedding_mixup_v1", None))
-	model.build_pooler(reuse=reuse)
+						embedding_mixup_v1=kargs.get("embedding_mixup_v1", None),
+						segmentation_ids=packed_features.get("segmentation_ids", None))
+	model.build_pooler(reuse=reuse,
+						example_positions=packed_features.get("example_positions", None))
 
 	return model
 
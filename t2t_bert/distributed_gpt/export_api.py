@@ -214,6 +214,26 @@ flags.DEFINE_string(
 	"if apply distillation"
 	)
 
+flags.DEFINE_string(
+	"predict_type", "sample_sequence",
+	"sample_sequence or beam_search"
+	)
+
+flags.DEFINE_integer(
+	"beam_size", 4,
+	"number of beams of beam_search"
+	)
+
+flags.DEFINE_float(
+	"length_penalty", 0.0,
+	"alpha of the beam_search length penalty"
+	)
+
+flags.DEFINE_bool(
+	"stochastic_beam_search", False,
+	"sample beams with gumbel top-k instead of keeping the best ones"
+	)
+
 def main(_):
 
 	print(FLAGS)
@@ -221,7 +241,7 @@ def main(_):
 
 	init_checkpoint = os.path.join(FLAGS.buckets, FLAGS.init_checkpoint)
 	checkpoint_dir = os.path.join(FLAGS.buckets, FLAGS.model_output)
-	export_dir = os.path.join(FLAGS.buckets, FLAGS.export_dir, "sample_sequence")
+	export_dir = os.path.join(FLAGS.buckets, FLAGS.export_dir, FLAGS.predict_type)
 
 	print(init_checkpoint, checkpoint_dir, export_dir)
 
@@ -230,7 +250,10 @@ def main(_):
 						checkpoint_dir,
 						export_dir,
 						input_target=FLAGS.input_target,
-						predict_type='sample_sequence')
+						predict_type=FLAGS.predict_type,
+						beam_size=FLAGS.beam_size,
+						length_penalty=FLAGS.length_penalty,
+						stochastic_beam_search=FLAGS.stochastic_beam_search)
 
 if __name__ == "__main__":
 	tf.app.run()
\ No newline at end of file
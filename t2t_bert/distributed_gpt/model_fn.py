@@ -4,6 +4,7 @@ from distributed_encoder.gpt_encoder import gpt_encoder
 from model_io import model_io
 from optimizer import distributed_optimizer as optimizer
 from model.gpt import sample
+from model.gpt import beam_search
 from model.gpt import gpt_utils
 
 def train_metric(input_ids, predicted_logits, **kargs):
@@ -170,6 +171,37 @@ def model_fn_builder(
 
 				return estimator_spec
 
+			elif kargs.get('predict_type', 'sample_sequence') == 'beam_search':
+				results = beam_search.beam_search(
+							gpt_encoder, hparams=model_config, 
+							length=kargs.get('max_length', 64), 
+							context=features['input_ids'],
+							beam_size=kargs.get('beam_size', 4),
+							end_token=kargs.get('end_token_id', 102),
+							alpha=kargs.get('length_penalty', 0.0),
+							temperature=kargs.get('sample_temp', 1.0),
+							stochastic=kargs.get('stochastic_beam_search', False))
+
+				estimator_spec = tf.estimator.EstimatorSpec(
+									mode=mode,
+									predictions={
+												'token':results['tokens'],
+												"scores":results['scores'],
+												"lengths":results['lengths']
+									},
+									export_outputs={
+										"output":tf.estimator.export.PredictOutput(
+													{
+														'token':results['tokens'],
+														"scores":results['scores'],
+														"lengths":results['lengths']
+													}
+												)
+									}
+						)
+
+				return estimator_spec
+
 			elif kargs.get('predict_type', 'sample_sequence') == 'infer_inputs':
 				sequence_mask = tf.to_float(tf.not_equal(features['input_ids'][:, 1:], 
 													kargs.get('[PAD]', 0)))
@@ -143,26 +143,21 @@ def get_pair_single_features(FLAGS,
 
 	return feature_dict
 
-def get_feeddict(FLAGS, vocab_path,
+def get_instance_generator(FLAGS, vocab_path,
 				corpus_path):
+	"""Yields the serving features of every json corpus line, one at a time."""
 
 	tokenizer_api = get_tokenizer(FLAGS, vocab_path)
 
-	with open(corpus_path, "r") as frobj:
-
-		query_dict_lst = []
+	with tf.gfile.Open(corpus_path, "r") as frobj:
 		for line in frobj:
-			query_dict_lst.append(json.loads(line))
-
-		instances = []
-		for item in query_dict_lst:
+			item = json.loads(line)
 			query = item["query"]
 			candidate = item["candidate"]
-			print(query, candidate)
 			if FLAGS.model_type == "bert":
 				feature_dict = get_bert_pair_single_features(
 								FLAGS, 
-								tokenizer, 
+								tokenizer_api, 
 								query, 
 								candidate, 
 								FLAGS.max_seq_length)
@@ -173,8 +168,12 @@ def get_feeddict(FLAGS, vocab_path,
 								query, 
 								candidate, 
 								FLAGS.max_seq_length)
-			print(feature_dict)
-			instances.append(feature_dict)
+			yield feature_dict
+
+def get_feeddict(FLAGS, vocab_path,
+				corpus_path):
+
+	instances = list(get_instance_generator(FLAGS, vocab_path, corpus_path))
 
 	feed_dict = {
 		"instances":instances,
@@ -182,9 +181,3 @@ def get_feeddict(FLAGS, vocab_path,
 	}
 
 	return feed_dict
-
-
-
-
-
-
@@ -80,6 +80,11 @@ def model_fn_builder(
 							mode, target, reuse=model_reuse, **kargs)
 
 		label_ids = features["label_ids"]
+		# packed rows hold max_examples_per_row labels, pooled output is per example
+		example_weights = features.get("example_weights", None)
+		if example_weights is not None:
+			label_ids = tf.reshape(label_ids, [-1])
+			example_weights = tf.reshape(example_weights, [-1])
 
 		if mode == tf.estimator.ModeKeys.TRAIN:
 			dropout_prob = model_config.get("dropout_prob", 0.1)
@@ -101,6 +106,8 @@ def model_fn_builder(
 											num_labels,
 											label_ids,
 											dropout_prob)
+			if example_weights is not None:
+				loss = tf.reduce_sum(per_example_loss * example_weights) / (tf.reduce_sum(example_weights) + 1e-10)
 
 		if not kargs.get('use_tpu'):
 			tf.summary.scalar("classifier_loss", loss)
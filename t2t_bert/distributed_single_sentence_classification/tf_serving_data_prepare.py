@@ -68,10 +68,10 @@ def get_bert_single_features(FLAGS,
 		input_mask.append(0)
 		segment_ids.append(0)
 
-	feature_dict = {"input_ids":input_ids_a,
-			"input_mask":input_mask_a,
-			"segment_ids":segment_ids_a,
-			"label_ids":[0]}
+	feature_dict = {"input_ids":input_ids,
+			"input_mask":input_mask,
+			"segment_ids":segment_ids,
+			"label_ids":0}
 
 	return feature_dict
 
@@ -122,24 +122,19 @@ def get_bert_like_single_features(FLAGS,
 
 	return feature_dict
 
-def get_feeddict(FLAGS, vocab_path,
+def get_instance_generator(FLAGS, vocab_path,
 				corpus_path):
+	"""Yields the serving features of every corpus line, one at a time."""
 
 	tokenizer_api = get_tokenizer(FLAGS, vocab_path)
 
-	with open(corpus_path, "r") as frobj:
-
-		query_lst = []
+	with tf.gfile.Open(corpus_path, "r") as frobj:
 		for line in frobj:
-			query_lst.append(line.strip())
-
-		instances = []
-		for query in query_lst:
-			print(query)
+			query = line.strip()
 			if FLAGS.model_type == "bert":
 				feature_dict = get_bert_single_features(
 								FLAGS, 
-								tokenizer, 
+								tokenizer_api, 
 								query, 
 								FLAGS.max_seq_length)
 			elif FLAGS.model_type == "single_sentence_classification":
@@ -154,8 +149,12 @@ def get_feeddict(FLAGS, vocab_path,
 								tokenizer_api, 
 								query, 
 								FLAGS.max_seq_length)
-			print(feature_dict)
-			instances.append(feature_dict)
+			yield feature_dict
+
+def get_feeddict(FLAGS, vocab_path,
+				corpus_path):
+
+	instances = list(get_instance_generator(FLAGS, vocab_path, corpus_path))
 
 	feed_dict = {
 		"instances":instances,
@@ -163,5 +162,3 @@ def get_feeddict(FLAGS, vocab_path,
 	}
 
 	return feed_dict
-
-
@@ -5,6 +5,7 @@ from optimizer import distributed_optimizer as optimizer
 from data_generator import distributed_tf_data_utils as tf_data_utils
 from data_generator import tf_pretrain_data_utils
 from data_generator import tf_data_utils_confusion_set
+from example import sharded_tfrecord_writer
 
 
 # try:
@@ -86,17 +87,25 @@ def train_eval_fn(FLAGS,
 		# config.model = FLAGS.model_type
 
 		config = model_config_parser(FLAGS)
+
+		# a sharded writer manifest gives the shards and the exact record count
+		total_train_size = FLAGS.train_size
+		if sharded_tfrecord_writer.is_manifest(train_file):
+			manifest = sharded_tfrecord_writer.read_manifest(train_file)
+			total_train_size = manifest["num_records"]
+			train_file = sharded_tfrecord_writer.shard_paths(train_file, manifest)
+			print("==train size from manifest==", total_train_size)
 		
 		if FLAGS.if_shard == "0":
-			train_size = FLAGS.train_size
+			train_size = total_train_size
 			epoch = int(FLAGS.epoch / worker_count)
 		elif FLAGS.if_shard == "1":
 			print("==number of gpus==", kargs.get('num_gpus', 1))
-			train_size = int(FLAGS.train_size/worker_count/kargs.get('num_gpus', 1))
+			train_size = int(total_train_size/worker_count/kargs.get('num_gpus', 1))
 			# train_size = int(FLAGS.train_size)
 			epoch = FLAGS.epoch
 		else:
-			train_size = int(FLAGS.train_size/worker_count)
+			train_size = int(total_train_size/worker_count)
 			epoch = FLAGS.epoch
 
 		init_lr = config.init_lr
@@ -236,6 +245,8 @@ def train_eval_fn(FLAGS,
 		params = Bunch({})
 		params.epoch = FLAGS.epoch
 		params.batch_size = FLAGS.batch_size
+		params.pack_sequences = kargs.get("pack_sequences", False)
+		params.max_examples_per_row = kargs.get("max_examples_per_row", None)
 
 		if kargs.get("run_config", None):
 			if kargs.get("parse_type", "parse_single") == "parse_single":
@@ -84,7 +84,8 @@ def classifier_model_fn_builder(
 		  predictions={
 			'pred_label':pred_label,
 			"label_ids":label_ids,
-			"max_prob":max_prob
+			"max_prob":max_prob,
+			"logits":logits
 
 		  })
 		return output_spec
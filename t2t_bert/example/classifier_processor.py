@@ -7,6 +7,7 @@ from data_generator import data_distillation_feature_classifier
 from data_generator import data_structure_distillation
 from data_generator import data_feature_mrc
 from data_generator import data_adv_adaptation
+from data_generator import distillation_cache
 import csv
 import json
 import collections
@@ -538,6 +539,10 @@ class FasttextDistillationProcessor(data_processor.DataProcessor):
 		self.id2label = label["id2label"]
 
 	def _read_distillation(self, input_file):
+		# a teacher cache built by teacher_distillation_cache.py is matched
+		# by text, a json "prob" list by line position
+		if distillation_cache.DistillationCache.exists(input_file):
+			return distillation_cache.DistillationCache(input_file)
 		import json
 		with tf.gfile.Open(input_file, "r") as f:
 			return json.load(f)["prob"]
@@ -579,6 +584,7 @@ class FasttextDistillationProcessor(data_processor.DataProcessor):
 
 	def _create_unsupervised_distillation_examples(self, lines, distillation_prob , LABEL_SPLITTER="__label__"):
 		re_pattern = u"({}{})".format(LABEL_SPLITTER, "\d+")
+		is_cache = isinstance(distillation_prob, distillation_cache.DistillationCache)
 
 		examples = []
 		cnt = 0
@@ -595,23 +601,32 @@ class FasttextDistillationProcessor(data_processor.DataProcessor):
 
 			text_a = tokenization.convert_to_unicode(text_a)
 			input_labels = [label.strip() for label in input_labels if label.strip() in list(self.label2id.keys())]
+			if is_cache:
+				label_probs = distillation_prob.get_probs(text_a)
+				if label_probs is None:
+					print("==missing teacher logits==", line, i)
+					continue
+			else:
+				label_probs = distillation_prob[cnt]
 			
 			examples.append(data_distillation_feature_classifier.InputExample(
 					guid=guid,
 					text_a=text_a,
 					text_b=None,
 					label=input_labels,
-					label_probs=distillation_prob[cnt],
+					label_probs=label_probs,
 					label_ratio=0.0,
 					distillation_ratio=1.0
 				))
 			cnt += 1
-		assert cnt == len(distillation_prob)
+		if not is_cache:
+			assert cnt == len(distillation_prob)
 
 		return examples
 
 	def _create_supervised_distillation_examples(self, lines, distillation_prob , LABEL_SPLITTER="__label__"):
 		re_pattern = u"({}{})".format(LABEL_SPLITTER, "\d+")
+		is_cache = isinstance(distillation_prob, distillation_cache.DistillationCache)
 
 		examples = []
 
@@ -629,18 +644,26 @@ class FasttextDistillationProcessor(data_processor.DataProcessor):
 
 			text_a = tokenization.convert_to_unicode(text_a)
 			input_labels = [label.strip() for label in input_labels if label.strip() in list(self.label2id.keys())]
+			if is_cache:
+				label_probs = distillation_prob.get_probs(text_a)
+				if label_probs is None:
+					print("==missing teacher logits==", line, i)
+					continue
+			else:
+				label_probs = distillation_prob[cnt]
 			
 			examples.append(data_distillation_feature_classifier.InputExample(
 					guid=guid,
 					text_a=text_a,
 					text_b=None,
 					label=input_labels,
-					label_probs=distillation_prob[cnt],
+					label_probs=label_probs,
 					label_ratio=1.0,
 					distillation_ratio=1.0
 				))
 			cnt += 1
-		assert cnt == len(distillation_prob)
+		if not is_cache:
+			assert cnt == len(distillation_prob)
 		return examples
 
 	def get_train_examples(self, train_file, is_shuffle):
@@ -36,6 +36,20 @@ class SpanFeatureWriter(FeatureWriter):
 		tf_example = tf.train.Example(features=tf.train.Features(feature=features))
 		self._writer.write(tf_example.SerializeToString())
 
+def serialize_classifier_feature(feature):
+	"""A classifier InputFeature as a serialized tf.train.Example."""
+	features = collections.OrderedDict()
+	features["input_ids"] = tf_data_utils.create_int_feature(feature.input_ids)
+	features["input_mask"] = tf_data_utils.create_int_feature(feature.input_mask)
+	features["segment_ids"] = tf_data_utils.create_int_feature(feature.segment_ids)
+	features["label_ids"] = tf_data_utils.create_int_feature([feature.label_ids])
+	try:
+		features["qas_id"] = tf_data_utils.create_int_feature([feature.guid])
+		tf_example = tf.train.Example(features=tf.train.Features(feature=features))
+	except:
+		tf_example = tf.train.Example(features=tf.train.Features(feature=features))
+	return tf_example.SerializeToString()
+
 class ClassifierFeatureWriter(FeatureWriter):
 	def __init__(self, filename, is_training):
 		super(ClassifierFeatureWriter, self).__init__(filename, is_training)
@@ -43,19 +57,7 @@ class ClassifierFeatureWriter(FeatureWriter):
 	def process_feature(self, feature):
 		"""Write a InputFeature to the TFRecordWriter as a tf.train.Example."""
 		self.num_features += 1
-
-		features = collections.OrderedDict()
-		features["input_ids"] = tf_data_utils.create_int_feature(feature.input_ids)
-		features["input_mask"] = tf_data_utils.create_int_feature(feature.input_mask)
-		features["segment_ids"] = tf_data_utils.create_int_feature(feature.segment_ids)
-		features["label_ids"] = tf_data_utils.create_int_feature([feature.label_ids])
-		try:
-			features["qas_id"] = tf_data_utils.create_int_feature([feature.guid])
-			tf_example = tf.train.Example(features=tf.train.Features(feature=features))
-			self._writer.write(tf_example.SerializeToString())
-		except:
-			tf_example = tf.train.Example(features=tf.train.Features(feature=features))
-			self._writer.write(tf_example.SerializeToString())
+		self._writer.write(serialize_classifier_feature(feature))
 
 class MultitaskFeatureWriter(FeatureWriter):
 	def __init__(self, filename, is_training):
@@ -0,0 +1,184 @@
+import json
+import os
+import shutil
+import collections
+import six
+import numpy as np
+import tensorflow as tf
+from concurrent.futures import ProcessPoolExecutor
+
+from example.feature_writer import serialize_classifier_feature
+from example.write_to_tfrecords import convert_classifier_example_to_feature
+
+"""
+Parallel, resumable conversion of classification text files to sharded
+TFRecords.
+
+Input lines are streamed in chunks of chunk_size lines, chunk i goes to
+shard i % num_shards. Worker processes parse, tokenize and serialize a
+chunk into a temporary TFRecord file, the parent appends finished chunks
+to their shard in input order (TFRecord files concatenate) and rewrites
+output_prefix + ".manifest.json" after every chunk:
+	{"chunks_done": ..., "num_records": ..., "shards": [
+		{"path": "train-00000-of-00004.tfrecord", "records": ..., "bytes": ...}, ...]}
+A restarted job truncates every shard to its recorded byte offset and
+continues after chunks_done. With shuffle, the examples of a chunk are
+shuffled with seed + chunk index, so a resumed job writes the same
+records. Chunks are not mixed with each other: for inputs grouped by
+label in runs longer than a chunk, shuffle the shards with
+example/tfrecord_shuffle.shuffle_tfrecords. Shard paths are relative to the manifest, so
+pass the manifest as train_file to get the shards and the record count.
+Output must be on a local or mounted file system.
+"""
+
+MANIFEST_SUFFIX = ".manifest.json"
+
+_worker = {}
+
+def _init_worker(processor, tokenizer, label_dict, max_seq_length, tmp_dir,
+				shuffle, seed):
+	_worker.update({
+		"processor":processor,
+		"tokenizer":tokenizer,
+		"label_dict":label_dict,
+		"max_seq_length":max_seq_length,
+		"tmp_dir":tmp_dir,
+		"shuffle":shuffle,
+		"seed":seed
+	})
+
+def _convert_chunk(chunk_index, line_offset, lines):
+	examples = _worker["processor"]._create_examples(lines)
+	if _worker["shuffle"]:
+		order = np.random.RandomState(_worker["seed"] + chunk_index).permutation(len(examples))
+		examples = [examples[index] for index in order]
+	tmp_file = os.path.join(_worker["tmp_dir"], "chunk-{}.tfrecord".format(chunk_index))
+	writer = tf.python_io.TFRecordWriter(tmp_file)
+	num_records = 0
+	for example in examples:
+		# guids are line numbers of the whole input, not of the chunk
+		example.guid = line_offset + example.guid
+		feature = convert_classifier_example_to_feature(example.guid, example,
+												_worker["label_dict"],
+												_worker["max_seq_length"],
+												_worker["tokenizer"])
+		if feature is None:
+			continue
+		writer.write(serialize_classifier_feature(feature))
+		num_records += 1
+	writer.close()
+	return tmp_file, num_records
+
+def is_manifest(input_file):
+	return isinstance(input_file, six.string_types) and input_file.endswith(MANIFEST_SUFFIX)
+
+def read_manifest(manifest_file):
+	with tf.gfile.Open(manifest_file, "r") as frobj:
+		return json.load(frobj)
+
+def shard_paths(manifest_file, manifest=None):
+	manifest = manifest or read_manifest(manifest_file)
+	manifest_dir = os.path.dirname(manifest_file)
+	return [os.path.join(manifest_dir, shard["path"]) for shard in manifest["shards"]]
+
+def _write_manifest(manifest_file, manifest):
+	with open(manifest_file + ".tmp", "w") as fwobj:
+		json.dump(manifest, fwobj)
+	os.rename(manifest_file + ".tmp", manifest_file)
+
+def _chunk_iterator(input_files, chunk_size, skip_chunks):
+	chunk_index, line_offset, lines = 0, 0, []
+	for input_file in input_files:
+		with tf.gfile.Open(input_file, "r") as frobj:
+			for line in frobj:
+				lines.append(line.strip())
+				if len(lines) == chunk_size:
+					if chunk_index >= skip_chunks:
+						yield chunk_index, line_offset, lines
+					chunk_index += 1
+					line_offset += len(lines)
+					lines = []
+	if lines and chunk_index >= skip_chunks:
+		yield chunk_index, line_offset, lines
+
+def write_sharded_classifier_tfrecords(input_files, output_prefix,
+									processor, tokenizer, label_dict,
+									max_seq_length, num_shards=8,
+									num_workers=4, chunk_size=10000,
+									shuffle=True, seed=12345):
+	"""Returns the manifest, input_files is a list of fasttext style files
+	parsed with processor._create_examples."""
+	output_dir = os.path.dirname(output_prefix) or "."
+	if not os.path.exists(output_dir):
+		os.makedirs(output_dir)
+	manifest_file = output_prefix + MANIFEST_SUFFIX
+	tmp_dir = output_prefix + ".tmp"
+	if not os.path.exists(tmp_dir):
+		os.makedirs(tmp_dir)
+
+	if os.path.exists(manifest_file):
+		manifest = read_manifest(manifest_file)
+		assert manifest["num_shards"] == num_shards and manifest["chunk_size"] == chunk_size \
+			and manifest.get("shuffle") == shuffle and manifest.get("seed") == seed, \
+			"resume with the num_shards, chunk_size, shuffle and seed of {}".format(manifest_file)
+		tf.logging.info("** resume %s after %d chunks, %d records **",
+						manifest_file, manifest["chunks_done"], manifest["num_records"])
+	else:
+		manifest = {
+			"input_files":input_files,
+			"num_shards":num_shards,
+			"chunk_size":chunk_size,
+			"shuffle":shuffle,
+			"seed":seed,
+			"chunks_done":0,
+			"num_records":0,
+			"shards":[{"path":"{}-{:05d}-of-{:05d}.tfrecord".format(
+									os.path.basename(output_prefix), index, num_shards),
+						"records":0, "bytes":0} for index in range(num_shards)]
+		}
+
+	# drop whatever a killed job wrote after its last manifest
+	shard_writers = []
+	for shard, path in zip(manifest["shards"], shard_paths(manifest_file, manifest)):
+		fwobj = open(path, "ab")
+		fwobj.truncate(shard["bytes"])
+		fwobj.seek(shard["bytes"])
+		shard_writers.append(fwobj)
+
+	def commit(chunk_index, tmp_file, num_records):
+		shard = manifest["shards"][chunk_index % num_shards]
+		fwobj = shard_writers[chunk_index % num_shards]
+		with open(tmp_file, "rb") as frobj:
+			shutil.copyfileobj(frobj, fwobj)
+		fwobj.flush()
+		os.fsync(fwobj.fileno())
+		os.remove(tmp_file)
+		shard["records"] += num_records
+		shard["bytes"] = fwobj.tell()
+		manifest["num_records"] += num_records
+		manifest["chunks_done"] = chunk_index + 1
+		_write_manifest(manifest_file, manifest)
+		tf.logging.info("** chunk %d done, %d records **", chunk_index, manifest["num_records"])
+
+	chunks = _chunk_iterator(input_files, chunk_size, manifest["chunks_done"])
+	with ProcessPoolExecutor(max_workers=num_workers,
+							initializer=_init_worker,
+							initargs=(processor, tokenizer, label_dict,
+									max_seq_length, tmp_dir,
+									shuffle, seed)) as executor:
+		# bounded window of in-flight chunks, committed in input order
+		pending = collections.deque()
+		for chunk_index, line_offset, lines in chunks:
+			pending.append((chunk_index, executor.submit(_convert_chunk, chunk_index,
+														line_offset, lines)))
+			if len(pending) >= 2 * num_workers:
+				chunk_index, future = pending.popleft()
+				commit(chunk_index, *future.result())
+		while pending:
+			chunk_index, future = pending.popleft()
+			commit(chunk_index, *future.result())
+
+	for fwobj in shard_writers:
+		fwobj.close()
+	shutil.rmtree(tmp_dir, ignore_errors=True)
+	return manifest
@@ -0,0 +1,196 @@
+import os
+import shutil
+import numpy as np
+import tensorflow as tf
+from concurrent.futures import ProcessPoolExecutor
+
+"""
+Two pass external shuffle of TFRecord files under bounded memory.
+
+scatter: every input file is streamed by a worker that sends each record
+	to a random group, one temporary file per (group, input file). There
+	are at most max_open_files groups, the open writers of a worker.
+split: the exact uncompressed size of every group is known after
+	scatter. A group larger than max_bucket_bytes is streamed once more
+	and its records are sent to random buckets of at most about
+	max_bucket_bytes, a smaller group is one bucket.
+gather: every bucket is loaded, shuffled in memory and cut into pieces
+	of the output shards it covers. Buckets laid end to end are the
+	shuffled corpus, record i of it goes to shard i * num_shards // total,
+	so shards differ by at most one record.
+Pieces are concatenated into shards (TFRecord files concatenate). Peak
+memory of a worker is one bucket, about max_bucket_bytes of uncompressed
+records whatever the input compression. Groups are sized at half of
+max_bucket_bytes from the input file sizes, so uncompressed corpora of up
+to max_open_files * max_bucket_bytes / 2 bytes skip the split pass.
+Output must be on a local or mounted file system.
+"""
+
+def _record_options(compression_type):
+	if not compression_type:
+		return None
+	return tf.python_io.TFRecordOptions(
+				getattr(tf.python_io.TFRecordCompressionType, compression_type.upper()))
+
+def _group_path(tmp_dir, group, file_index):
+	return os.path.join(tmp_dir, "group-{:05d}-part-{:05d}.tfrecord".format(group, file_index))
+
+def _bucket_path(tmp_dir, group, split):
+	return os.path.join(tmp_dir, "group-{:05d}-bucket-{:05d}.tfrecord".format(group, split))
+
+def _piece_path(tmp_dir, shard, bucket):
+	return os.path.join(tmp_dir, "shard-{:05d}-piece-{:05d}.tfrecord".format(shard, bucket))
+
+def _scatter_records(records, num_outputs, path_fn, rng):
+	"""Writes every record to a random output, returns per-output record
+	and byte counts."""
+	writers = [None] * num_outputs
+	counts = np.zeros(num_outputs, dtype=np.int64)
+	num_bytes = np.zeros(num_outputs, dtype=np.int64)
+	# outputs drawn in blocks, one rng call per block of records
+	outputs, position = rng.randint(num_outputs, size=4096), 0
+	for record in records:
+		if position == len(outputs):
+			outputs, position = rng.randint(num_outputs, size=4096), 0
+		output = outputs[position]
+		position += 1
+		if writers[output] is None:
+			writers[output] = tf.python_io.TFRecordWriter(path_fn(output))
+		writers[output].write(record)
+		counts[output] += 1
+		num_bytes[output] += len(record)
+	for writer in writers:
+		if writer is not None:
+			writer.close()
+	return counts, num_bytes
+
+def _scatter(file_index, input_file, tmp_dir, num_groups, seed, compression_type):
+	"""Random group of every record of input_file, returns per-group counts
+	and uncompressed bytes."""
+	rng = np.random.RandomState(seed + file_index)
+	records = tf.python_io.tf_record_iterator(input_file, _record_options(compression_type))
+	return _scatter_records(records, num_groups,
+						lambda group: _group_path(tmp_dir, group, file_index), rng)
+
+def _read_and_remove(paths):
+	for path in paths:
+		for record in tf.python_io.tf_record_iterator(path):
+			yield record
+		os.remove(path)
+
+def _split(group, parts, tmp_dir, num_splits, seed):
+	"""Random bucket of the group of every record, returns per-bucket counts."""
+	rng = np.random.RandomState(seed + 7919 * (group + 1))
+	records = _read_and_remove([_group_path(tmp_dir, group, file_index) for file_index in parts])
+	counts, _ = _scatter_records(records, num_splits,
+						lambda split: _bucket_path(tmp_dir, group, split), rng)
+	return counts
+
+def _gather(bucket, paths, tmp_dir, offset, total, num_shards, seed):
+	"""Shuffles the records of one bucket, stored in paths, and writes them
+	as pieces of the shards covering [offset, offset + len(bucket))."""
+	records = list(_read_and_remove(paths))
+	rng = np.random.RandomState(seed + 1000003 * (bucket + 1))
+	order = rng.permutation(len(records))
+
+	shards = (offset + np.arange(len(records))) * num_shards // total
+	writer, current_shard = None, None
+	for index, shard in zip(order, shards):
+		if shard != current_shard:
+			if writer is not None:
+				writer.close()
+			writer, current_shard = tf.python_io.TFRecordWriter(_piece_path(tmp_dir, shard, bucket)), shard
+		writer.write(records[index])
+	if writer is not None:
+		writer.close()
+	return sorted(set(shards.tolist()))
+
+def _concat(shard, buckets, tmp_dir, output_path):
+	with open(output_path, "wb") as fwobj:
+		for bucket in buckets:
+			path = _piece_path(tmp_dir, shard, bucket)
+			with open(path, "rb") as frobj:
+				shutil.copyfileobj(frobj, fwobj)
+			os.remove(path)
+	return output_path
+
+def shuffle_tfrecords(input_files, output_prefix, num_shards=8, num_buckets=None,
+					max_bucket_bytes=256<<20, num_workers=4, seed=12345,
+					compression_type="", max_open_files=256):
+	"""Shuffles the records of input_files into num_shards uncompressed
+	shards output_prefix-00000-of-00008.tfrecord, ... and returns their paths.
+	num_buckets, the number of scatter groups, defaults to twice the input
+	size over max_bucket_bytes and is capped at max_open_files."""
+	output_dir = os.path.dirname(output_prefix) or "."
+	if not os.path.exists(output_dir):
+		os.makedirs(output_dir)
+	tmp_dir = output_prefix + ".shuffle_tmp"
+	if os.path.exists(tmp_dir):
+		shutil.rmtree(tmp_dir)
+	os.makedirs(tmp_dir)
+
+	if not num_buckets:
+		total_bytes = sum(tf.gfile.Stat(input_file).length for input_file in input_files)
+		# half full groups rarely go over max_bucket_bytes and need a split
+		num_buckets = max(num_shards, int(np.ceil(2.0 * total_bytes / max_bucket_bytes)))
+	num_groups = min(num_buckets, max_open_files)
+	tf.logging.info("** shuffle %d files with %d groups into %d shards **",
+					len(input_files), num_groups, num_shards)
+
+	with ProcessPoolExecutor(max_workers=num_workers) as executor:
+		futures = [executor.submit(_scatter, file_index, input_file, tmp_dir,
+									num_groups, seed, compression_type)
+					for file_index, input_file in enumerate(input_files)]
+		results = [future.result() for future in futures]
+		counts = np.stack([result[0] for result in results], axis=0)
+		group_bytes = np.sum([result[1] for result in results], axis=0)
+		total = int(np.sum(counts))
+		tf.logging.info("** scattered %d records, %d bytes **", total, int(np.sum(group_bytes)))
+		if total == 0:
+			shutil.rmtree(tmp_dir, ignore_errors=True)
+			return []
+
+		# (paths, record count) of every bucket, in group order
+		buckets = []
+		split_futures = []
+		for group in range(num_groups):
+			parts = np.where(counts[:, group] > 0)[0].tolist()
+			if not parts:
+				continue
+			num_splits = int(np.ceil(float(group_bytes[group]) / max_bucket_bytes))
+			if num_splits <= 1:
+				buckets.append(([_group_path(tmp_dir, group, file_index) for file_index in parts],
+								int(np.sum(counts[:, group]))))
+				continue
+			if num_splits > max_open_files:
+				raise ValueError("group {} of {} bytes needs {} buckets, more than "
+								"max_open_files {}".format(group, group_bytes[group],
+								num_splits, max_open_files))
+			split_futures.append((len(buckets), group, executor.submit(_split, group, parts,
+										tmp_dir, num_splits, seed)))
+			buckets.append(None)
+		for position, group, future in reversed(split_futures):
+			split_counts = future.result()
+			buckets[position:position + 1] = [([_bucket_path(tmp_dir, group, split)], int(count))
+									for split, count in enumerate(split_counts) if count > 0]
+		tf.logging.info("** %d buckets, %d groups split **", len(buckets), len(split_futures))
+
+		bucket_sizes = np.array([count for _, count in buckets], dtype=np.int64)
+		offsets = np.concatenate([[0], np.cumsum(bucket_sizes)[:-1]])
+		futures = [executor.submit(_gather, bucket, paths, tmp_dir,
+									int(offsets[bucket]), total, num_shards, seed)
+					for bucket, (paths, _) in enumerate(buckets)]
+		shard_buckets = [[] for _ in range(num_shards)]
+		for bucket, future in enumerate(futures):
+			for shard in future.result():
+				shard_buckets[shard].append(bucket)
+
+		output_paths = ["{}-{:05d}-of-{:05d}.tfrecord".format(output_prefix, shard, num_shards)
+						for shard in range(num_shards)]
+		futures = [executor.submit(_concat, shard, shard_buckets[shard], tmp_dir, output_paths[shard])
+					for shard in range(num_shards)]
+		output_paths = [future.result() for future in futures]
+
+	shutil.rmtree(tmp_dir, ignore_errors=True)
+	tf.logging.info("** wrote %d records into %d shards **", total, num_shards)
+	return output_paths
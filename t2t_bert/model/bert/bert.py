@@ -4,6 +4,7 @@ from utils.bert import bert_utils
 from utils.bert import bert_modules
 from utils.bert import hard_attention_modules
 from utils.bert import conv_bert_modules
+from data_generator import sequence_packing
 import copy 
 
 class Bert(object):
@@ -134,7 +135,8 @@ class Bert(object):
 						max_position_embeddings=self.config.max_position_embeddings,
 						dropout_prob=hidden_dropout_prob,
 						token_type_ratio=self.config.get("token_type_ratio", 1.0),
-						dropout_name=dropout_name)
+						dropout_name=dropout_name,
+						position_ids=kargs.get("position_ids", None))
 
 		if embedding_seq_adv is not None and kargs.get("emb_adv_pos", "emb_adv_post") == "emb_adv_post":
 			if not kargs.get("stop_gradient", False):
@@ -170,8 +172,10 @@ class Bert(object):
 				else:
 					tmp_input_ids = input_ids
 				
+				# packed rows attend within their examples only
 				attention_mask = bert_modules.create_attention_mask_from_input_mask(
-						tmp_input_ids, input_mask)
+						tmp_input_ids, input_mask,
+						segmentation_ids=kargs.get("segmentation_ids", None))
 
 				seq_type = kargs.get('seq_type', "None")
 
@@ -281,7 +285,13 @@ class Bert(object):
 			with tf.variable_scope("pooler"):
 				# We "pool" the model by simply taking the hidden state corresponding
 				# to the first token. We assume that this has been pre-trained
-				first_token_tensor = tf.squeeze(self.sequence_output[:, 0:1, :], axis=1)
+				example_positions = kargs.get("example_positions", None)
+				if example_positions is not None:
+					# packed rows, [batch_size * max_examples_per_row, hidden_size]
+					first_token_tensor = sequence_packing.gather_example_outputs(
+							self.sequence_output, example_positions)
+				else:
+					first_token_tensor = tf.squeeze(self.sequence_output[:, 0:1, :], axis=1)
 				self.pooled_output = tf.layers.dense(
 						first_token_tensor,
 						self.config.hidden_size,
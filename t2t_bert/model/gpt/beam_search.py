@@ -1,4 +1,45 @@
 import tensorflow as tf
 import numpy as np
+from utils.bert.bert_utils import get_shape_list
+from utils.sampling_utils import beam_search_utils
 
+def beam_search(encoder_decoder, hparams, 
+				length, context,
+				beam_size=4,
+				end_token=None,
+				alpha=0.0,
+				temperature=1,
+				stochastic=False):
+	"""Beam search continuation of context [B, T] for up to length tokens.
 
+	The whole context is fed in one step, after that every step feeds the
+	batch*beam selected tokens against the reordered past.
+	"""
+	batch_size = get_shape_list(context, expected_rank=2)[0]
+
+	def step(tokens, past=None):
+		features = {}
+		features['input_ids'] = tokens
+		features['past'] = past
+		
+		inference_model = encoder_decoder(hparams, features, 
+										[], tf.estimator.ModeKeys.PREDICT, 
+										"", reuse=tf.AUTO_REUSE)
+
+		logits = inference_model.get_sequence_output_logits()[:, :, :hparams.n_vocab]
+		presents = inference_model.get_present()
+		return logits, presents
+
+	with tf.name_scope('beam_search'):
+		context_logits, context_presents = step(context)
+		results = beam_search_utils.beam_search(step,
+								context_logits[:, -1, :],
+								context_presents,
+								batch_size,
+								beam_size,
+								length,
+								end_token,
+								alpha=alpha,
+								temperature=temperature,
+								stochastic=stochastic)
+		return results
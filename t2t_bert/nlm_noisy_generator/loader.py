@@ -91,51 +91,57 @@ def sample_index(ps_cumsum):
   return bisect.bisect(ps_cumsum, np.random.random() * ps_cumsum[-1])
 
 
+def sample_indices(ps_cumsum, size):
+  # vectorized sample_index, bisect.bisect is searchsorted side="right"
+  return np.searchsorted(ps_cumsum, np.random.random(size) * ps_cumsum[-1],
+                         side="right")
+
+
+def token_noise_probs(loader, flags, gamma):
+  """Noising probability of every token id, indexed like loader.id_to_token."""
+  vocab_size = len(loader.id_to_token)
+  if not flags.absolute_discounting:
+    return np.full(vocab_size, gamma)
+  continuations = loader.continuations
+  probs = np.zeros(vocab_size)
+  for token_id in xrange(vocab_size):
+    token = loader.id_to_token[token_id]
+    context = (token,)
+    total = continuations["total"].get(context, 0)
+    # tokens never seen as a bigram context (e.g. <_>) are not noised
+    if total == 0:
+      continue
+    if flags.ngram_scheme != "mbgkn":
+      probs[token_id] = (gamma / total) * continuations["distinct"][context]
+    else:
+      probs[token_id] = gamma * (loader.D1 * loader.N1_lookup[token] +
+                                 loader.D2 * loader.N2_lookup[token] +
+                                 loader.D3p * loader.N3p_lookup[token]) / float(total)
+  return probs
+
+
 def noise_batch(x, y, flags, loader, gamma=0.0, wmat=None):
   if gamma == 0.0:
     return x, y
-  continuations = loader.continuations
   x_, y_ = np.array(x), np.array(y)
-  for row in xrange(x.shape[0]):
-    for col in xrange(x.shape[1]):
-      if flags.absolute_discounting:
-        #if col < 1:
-        if False:
-          p = 0
-        else:
-          context = list()
-          #context.append(loader.id_to_token[x[row, col-1]])
-          context.append(loader.id_to_token[x[row, col]])
-          # Can also compute D = n1/(n1+n2) as described in Chen & Goodman
-          total, distinct = continuations["total"][tuple(context)],\
-              continuations["distinct"][tuple(context)]
-          if flags.ngram_scheme != "mbgkn":
-            p = (gamma / total) * distinct
-          else:
-            p = gamma * (loader.D1 * loader.N1_lookup[context[0]] +
-                         loader.D2 * loader.N2_lookup[context[0]] +
-                         loader.D3p * loader.N3p_lookup[context[0]]) / float(total)
-      else:
-        p = gamma
-      draw = np.random.binomial(1, p)
-      if draw:
-        if flags.scheme == "blank":
-          x_[row, col] = loader.token_to_id['<_>']
-        elif flags.scheme == "ngram":
-          if flags.ngram_scheme == "unigram":
-            freqs_cumsum = loader.frequencies_cumsum
-          elif "kn" in flags.ngram_scheme:
-            pass
-          else:
-            assert False
-
-          if "kn" not in flags.ngram_scheme:
-            x_[row, col] = sample_index(freqs_cumsum)
-          else:
-            x_[row, col] = sample_index(loader.hist_freqs_cumsum)
-            y_[row, col] = sample_index(loader.hist_freqs_cumsum)
-        else:
-          raise
+  # one uniform draw per position, u < p is binomial(1, p)
+  probs = loader.get_noise_probs(flags, gamma)[x]
+  draw = np.random.random(x.shape) < probs
+  num_draws = np.sum(draw)
+  if num_draws == 0:
+    return x_, y_
+  if flags.scheme == "blank":
+    x_[draw] = loader.token_to_id['<_>']
+  elif flags.scheme == "ngram":
+    if flags.ngram_scheme == "unigram":
+      x_[draw] = sample_indices(loader.frequencies_cumsum, num_draws)
+    elif "kn" in flags.ngram_scheme:
+      x_[draw] = sample_indices(loader.hist_freqs_cumsum, num_draws)
+      y_[draw] = sample_indices(loader.hist_freqs_cumsum, num_draws)
+    else:
+      assert False
+  else:
+    raise ValueError("unknown noise scheme %s" % flags.scheme)
   return x_, y_
 
 
@@ -162,11 +168,19 @@ class TextLoader(object):
     self.hist_freqs = hist_freqs
     self.hist_freqs_cumsum = np.cumsum(hist_freqs)
     self.continuations = build_continuations(self.bg_counts)
+    self.noise_probs = {}
     bgs = nltk.bigrams(train_tokens)
     if level == "word":
       self.D1, self.D2, self.D3p, self.N1_lookup, self.N2_lookup, self.N3p_lookup = estimate_modkn_discounts(
           bgs)
 
+  def get_noise_probs(self, flags, gamma):
+    # noise probabilities only depend on the scheme and gamma, cache them
+    key = (flags.absolute_discounting, flags.ngram_scheme, gamma)
+    if key not in self.noise_probs:
+      self.noise_probs[key] = token_noise_probs(self, flags, gamma)
+    return self.noise_probs[key]
+
   def get_num_batches(self, split):
     return (self.split_data[split].shape[1] - 1) // self.unroll
 
@@ -7,6 +7,8 @@ from optimizer import adam_weight_decay_utils
 from optimizer import adam_weight_decay_exclude_utils
 from optimizer import pai_soar_optimizer_utils
 from optimizer import radam_utils
+from optimizer import grad_stats
+from optimizer import grad_accumulation
 
 import collections
 import copy
@@ -190,50 +192,64 @@ class Optimizer(object):
 			for grad, var in grads_and_vars:
 				if grad is not None:
 					valid_vars.append(var)
-					print(grad, var, tf.is_nan(grad), '====nan grad====')
 				else:
 					print(var.name, "=====none grad======", grad_name)
 
 			grads = [grad for grad, _ in grads_and_vars if grad is not None] # allreduce from sum to mean
 			# grads_and_vars = zip(valid_grads, valid_vars)
-			grad_clip = self.config.get("grad_clip", "global_norm")
 			use_norm = tf.global_norm(grads)
-			tf.summary.scalar(grad_name+'/total_grad_norm', use_norm)
-			for grad, var in grads_and_vars:
-				if grad is not None:
-					var_grad_norm = tf.global_norm([grad])
-					tf.summary.scalar(grad_name+"/"+var.name, var_grad_norm)
-				# tf.summary.histogram(var.name, var)
-				# tf.summary.histogram("grad/"+var.name, grad)
-
-			tf.logging.info(" gradient clip method {}".format(grad_clip))
+			if not kargs.get('use_tpu'):
+				tf.summary.scalar(grad_name+'/total_grad_norm', use_norm)
+
+			# per variable norms every grad_stats_steps steps, non finite check every step
+			grad_stats_op = None
+			grad_stats_steps = self.config.get("grad_stats_steps", 100)
+			if grad_stats_steps and not kargs.get('use_tpu'):
+				grad_stats_op = grad_stats.gradient_statistics(grads, valid_vars, use_norm,
+										every_n_steps=grad_stats_steps,
+										name=grad_name)
+
+			scale_grads = self.clip_grads(grads, **kargs)
+
+			if grad_stats_op is not None:
+				with tf.control_dependencies([grad_stats_op]):
+					scale_grads = [tf.IndexedSlices(tf.identity(grad.values), grad.indices, grad.dense_shape)
+									if isinstance(grad, tf.IndexedSlices) else tf.identity(grad)
+									for grad in scale_grads]
 			
-			if grad_clip == "global_norm":
-				clip_norm = self.config.get("clip_norm", 1.0)
-				if self.config.get("strategy", "") in ['MirroredStrategy', 'CollectiveAllReduceStrategy']:
-					use_norm = tf.global_norm(grads)
+			grads_and_vars = zip(scale_grads, valid_vars)
+
+		return grads_and_vars
+
+	def clip_grads(self, grads, grad_name="grad_norm", **kargs):
+		gpu_count = self.config.get('gpu_count', 1)
+		grad_clip = self.config.get("grad_clip", "global_norm")
+		tf.logging.info(" gradient clip method {}".format(grad_clip))
+
+		if grad_clip == "global_norm":
+			clip_norm = self.config.get("clip_norm", 1.0)
+			if self.config.get("strategy", "") in ['MirroredStrategy', 'CollectiveAllReduceStrategy']:
+				use_norm = tf.global_norm(grads)
 
-					[scale_grads, _] = tf.clip_by_global_norm(grads, 
-										clip_norm=clip_norm,
-										use_norm=use_norm*tf.sqrt(gpu_count*1.0))
+				[scale_grads, _] = tf.clip_by_global_norm(grads, 
+									clip_norm=clip_norm,
+									use_norm=use_norm*tf.sqrt(gpu_count*1.0))
 
+				if kargs.get("add_summary", True):
 					tf.summary.scalar(grad_name+'/grad_scale', use_norm*tf.sqrt(gpu_count*1.0))
-				else:
-					[scale_grads, _] = tf.clip_by_global_norm(grads, 
-										clip_norm=clip_norm)
-			elif grad_clip == "norm":
-				clip_norm = self.config.get("clip_norm", 1.0)
-				scale_grads = [tf.clip_by_norm(grad, clip_norm) for grad in grads]
-			elif grad_clip == "value":
-				clip_min_value = self.config.get("clip_min_value", -1.0)
-				clip_max_value = self.config.get("clip_max_value", 1.0)
-				scale_grads = [tf.clip_by_value(grad, clip_norm) for grad in grads]
 			else:
-				scale_grads = grads
-			
-			grads_and_vars = zip(scale_grads, valid_vars)
-
-		return grads_and_vars
+				[scale_grads, _] = tf.clip_by_global_norm(grads, 
+									clip_norm=clip_norm)
+		elif grad_clip == "norm":
+			clip_norm = self.config.get("clip_norm", 1.0)
+			scale_grads = [tf.clip_by_norm(grad, clip_norm) for grad in grads]
+		elif grad_clip == "value":
+			clip_min_value = self.config.get("clip_min_value", -1.0)
+			clip_max_value = self.config.get("clip_max_value", 1.0)
+			scale_grads = [tf.clip_by_value(grad, clip_norm) for grad in grads]
+		else:
+			scale_grads = grads
+		return scale_grads
 
 	def optimizer_op(self, learning_rate,
 							**kargs):
@@ -243,7 +259,7 @@ class Optimizer(object):
 		tf.logging.info(" optimization method {}".format(opt_type))
 		if opt_type not in ["adam_decay", "adam", "adam_weight_decay", 
 					"adam_weight_decay_exclude", "pai_soar_adam_decay", "lamb",
-					"adafactor", "sgd"]:
+					"adafactor", "sgd", "radam"]:
 			raise NotImplementedError()
 		if opt_type == "adam_decay":
 			print("==apply bert adam weight decay==")
@@ -303,7 +319,7 @@ class Optimizer(object):
 										epsilon=self.config.get("epsilon", 1e-6))
 		elif opt_type == 'lamb':
 			print("==apply lamb==")
-			opt = optimizer_utils.LAMBOptimizer(
+			opt = optimizer_utils.LAMBOptimizer_v2(
 								learning_rate,
 								 weight_decay_rate=self.config.get("opt_decay_rate", 0.01),
 								 beta_1=self.config.get("beta_1", 0.9),
@@ -356,11 +372,14 @@ class Optimizer(object):
 		# self.learning_rate = learning_rate / np.sqrt(self.config.get('gpu_count', 1) / 2)
 		# self.learning_rate = learning_rate * np.sqrt(self.config.get('gpu_count', 1)) * 2
 		self.single_node_learning = learning_rate
+		# optimizer without distributed wrapper, used by gradient accumulation
+		self.local_opt = None
 		
 		# add uber horvod distributed optimizer
 		if hvd and self.config["opt_type"] == "hvd":
 			print("==optimizer hvd size=={}".format(self.config.get("worker_count", hvd.size())))
 			opt = self.optimizer_op(self.learning_rate*self.config.get("worker_count", hvd.size()), **kargs)
+			self.local_opt = opt
 			self.opt = hvd.DistributedOptimizer(opt)
 			self.distributed_hooks = [hvd.BroadcastGlobalVariablesHook(0)]
 		# add pai soar distributed optimizer
@@ -384,11 +403,17 @@ class Optimizer(object):
 			print("==initialization of single node optimizer==")
 			self.opt = self.optimizer_op(self.learning_rate, **kargs)
 			self.distributed_hooks = []
+		if self.local_opt is None:
+			self.local_opt = self.opt
 
 	def get_train_op(self, loss, tvars, init_lr, num_train_steps, **kargs):
 		
 		self.get_opt(init_lr, num_train_steps)
 
+		num_accumulation_steps = self.config.get("num_accumulation_steps", 1)
+		if num_accumulation_steps > 1:
+			return self.accumulation_train_op(loss, tvars, num_accumulation_steps, **kargs)
+
 		grads_and_vars = self.grad_clip_fn(self.opt, loss, tvars, **kargs)
 
 		train_op = self.opt.apply_gradients(
@@ -399,6 +424,53 @@ class Optimizer(object):
 		train_op = train_op
 		return train_op
 
+	def accumulation_train_op(self, loss, tvars, num_accumulation_steps, **kargs):
+		opt_type = self.config.get("opt_type", "pai_soar")
+		if opt_type in ["pai_soar", "ps_sync"]:
+			raise NotImplementedError("gradient accumulation is not supported with {}".format(opt_type))
+		# replica local accumulators can not be applied in a cond, a cross replica merge is needed
+		strategy = self.config.get("strategy", "")
+		if strategy in ['MirroredStrategy', 'CollectiveAllReduceStrategy']:
+			raise NotImplementedError("gradient accumulation is not supported with {}".format(strategy))
+		tf.logging.info(" gradient accumulation of {} steps".format(num_accumulation_steps))
+		grad_name = kargs.get('grad_name', "grad_norm")
+
+		grads_and_vars = self.local_opt.compute_gradients(loss, tvars)
+		grads_and_vars = [(grad, var) for grad, var in grads_and_vars if grad is not None]
+		grads = [grad for grad, _ in grads_and_vars]
+		valid_vars = [var for _, var in grads_and_vars]
+
+		# statistics of the micro step gradients, summaries can not be created in the apply cond
+		grad_stats_steps = self.config.get("grad_stats_steps", 100)
+		if not kargs.get('use_tpu'):
+			use_norm = tf.global_norm(grads)
+			tf.summary.scalar(grad_name+'/total_grad_norm', use_norm)
+			if grad_stats_steps:
+				grad_stats_op = grad_stats.gradient_statistics(grads, valid_vars, use_norm,
+										every_n_steps=grad_stats_steps,
+										name=grad_name)
+				with tf.control_dependencies([grad_stats_op]):
+					grads = [tf.IndexedSlices(tf.identity(grad.values), grad.indices, grad.dense_shape)
+								if isinstance(grad, tf.IndexedSlices) else tf.identity(grad)
+								for grad in grads]
+
+		clip_kargs = dict(kargs)
+		clip_kargs["add_summary"] = False
+		def clip_fn(grads):
+			return self.clip_grads(grads, **clip_kargs)
+
+		allreduce_fn = None
+		if hvd and opt_type == "hvd":
+			def allreduce_fn(grads):
+				return [hvd.allreduce(grad) for grad in grads]
+
+		return grad_accumulation.accumulation_train_op(self.local_opt,
+										list(zip(grads, valid_vars)),
+										num_accumulation_steps,
+										self.global_step,
+										clip_fn=clip_fn,
+										allreduce_fn=allreduce_fn)
+
 	def get_group_train_op(self, loss_dict, tvars_dict, init_lr_dict,
 							optimizer_type_dict,
 							num_train_steps, **kargs):
@@ -0,0 +1,69 @@
+import tensorflow as tf
+
+"""
+Gradient accumulation.
+
+Every run adds the micro-step gradients to non trainable accumulators, one
+per variable, and increments the global step. Every
+num_accumulation_steps-th run averages the accumulators, reduces them
+across workers (allreduce_fn, e.g. horovod), clips them (clip_fn), applies
+them with the wrapped optimizer and zeroes the accumulators, so workers
+synchronize once per num_accumulation_steps micro steps. The global step
+and learning rate schedules count micro steps, optimizer internal steps
+(lamb, radam bias corrections) count applied updates.
+Distribution strategies are not supported, apply_gradients would need a
+cross replica merge inside the tf.cond.
+"""
+
+def _accumulate(accumulator, grad):
+	if isinstance(grad, tf.IndexedSlices):
+		return tf.scatter_add(accumulator, grad.indices, grad.values)
+	return tf.assign_add(accumulator, grad)
+
+def accumulation_train_op(opt, grads_and_vars, num_accumulation_steps,
+						global_step, clip_fn=None, allreduce_fn=None,
+						name="gradient_accumulation"):
+	"""Train op of accumulated gradients.
+
+	Args:
+		opt: optimizer applying the accumulated gradients, its apply_gradients
+			is called without global_step.
+		grads_and_vars: unreduced, unclipped micro-step gradients.
+		clip_fn: list of gradients -> list of clipped gradients.
+		allreduce_fn: list of gradients -> list of averaged gradients of all
+			workers.
+	"""
+	grads_and_vars = [(grad, var) for grad, var in grads_and_vars if grad is not None]
+	tvars = [var for _, var in grads_and_vars]
+
+	accumulators = []
+	with tf.variable_scope(name, reuse=tf.AUTO_REUSE):
+		for var in tvars:
+			accumulators.append(tf.get_variable(
+					var.op.name + "/accum",
+					shape=var.shape.as_list(),
+					dtype=var.dtype.base_dtype,
+					initializer=tf.zeros_initializer(),
+					trainable=False))
+
+	accumulate_ops = [_accumulate(accumulator, grad)
+						for accumulator, (grad, _) in zip(accumulators, grads_and_vars)]
+	with tf.control_dependencies(accumulate_ops):
+		is_apply_step = tf.equal(tf.mod(global_step + 1, num_accumulation_steps), 0)
+
+	def apply_fn():
+		grads = [accumulator.read_value() / num_accumulation_steps
+					for accumulator in accumulators]
+		if allreduce_fn is not None:
+			grads = allreduce_fn(grads)
+		if clip_fn is not None:
+			grads = clip_fn(grads)
+		apply_op = opt.apply_gradients(list(zip(grads, tvars)))
+		with tf.control_dependencies([apply_op]):
+			reset_ops = [tf.assign(accumulator, tf.zeros_like(accumulator))
+							for accumulator in accumulators]
+		return tf.group(*reset_ops)
+
+	train_op = tf.cond(is_apply_step, apply_fn, tf.no_op)
+	with tf.control_dependencies([train_op]):
+		return tf.group(global_step.assign_add(1))
@@ -0,0 +1,74 @@
+import re
+import collections
+import tensorflow as tf
+
+"""
+Sampled gradient statistics.
+
+Per-variable gradient norms are computed inside a tf.cond that only runs
+every every_n_steps global steps and are stored in a non trainable
+variable, summaries read that variable as one histogram per layer group.
+The global norm, already needed for clipping, is checked every step and
+the names of the variables with non finite gradients are printed only
+when it is not finite. On other steps the cost is a few scalar ops.
+"""
+
+_LAYER_PATTERN = re.compile(r"(layer_\d+|layer_shared|embeddings)")
+
+def layer_group(var_name):
+	"""layer_3, embeddings, ... of a variable name, or its first two scopes."""
+	match = _LAYER_PATTERN.search(var_name)
+	if match:
+		return match.group(1)
+	return "/".join(var_name.split(":")[0].split("/")[:2])
+
+def _values(grad):
+	if isinstance(grad, tf.IndexedSlices):
+		return grad.values
+	return grad
+
+def gradient_statistics(grads, tvars, global_norm, every_n_steps=100,
+						name="grad_norm", add_summary=True):
+	"""Op to run with every training step, grads are the unclipped
+	gradients of tvars and global_norm their tf.global_norm."""
+	global_step = tf.train.get_or_create_global_step()
+	var_names = [var.name for var in tvars]
+
+	# a local variable, so checkpoints are unchanged
+	variable_kargs = {}
+	if hasattr(tf, "VariableAggregation"):
+		variable_kargs["aggregation"] = tf.VariableAggregation.ONLY_FIRST_REPLICA
+	with tf.variable_scope(name + "_stats", reuse=tf.AUTO_REUSE):
+		grad_norms = tf.get_variable("grad_norms", shape=[len(grads)],
+									dtype=tf.float32,
+									initializer=tf.zeros_initializer(),
+									trainable=False,
+									collections=[tf.GraphKeys.LOCAL_VARIABLES],
+									**variable_kargs)
+
+	def sample_norms():
+		norms = tf.stack([tf.norm(tf.cast(_values(grad), tf.float32)) for grad in grads])
+		return tf.assign(grad_norms, norms).op
+
+	sample_op = tf.cond(tf.equal(tf.mod(global_step, every_n_steps), 0),
+						sample_norms, tf.no_op)
+
+	def report_non_finite():
+		is_finite = tf.stack([tf.reduce_all(tf.is_finite(_values(grad))) for grad in grads])
+		bad_names = tf.boolean_mask(tf.constant(var_names), tf.logical_not(is_finite))
+		print_op = tf.Print(global_step, [global_step, bad_names],
+							message="non finite gradients at step: ",
+							summarize=len(var_names))
+		return print_op.op
+
+	detect_op = tf.cond(tf.is_finite(global_norm), tf.no_op, report_non_finite)
+
+	if add_summary:
+		groups = collections.OrderedDict()
+		for index, var_name in enumerate(var_names):
+			groups.setdefault(layer_group(var_name), []).append(index)
+		for group, indices in groups.items():
+			tf.summary.histogram(name + "/" + group, tf.gather(grad_norms, indices))
+		tf.summary.scalar(name + "/non_finite", 1.0 - tf.cast(tf.is_finite(global_norm), tf.float32))
+
+	return tf.group(sample_op, detect_op)
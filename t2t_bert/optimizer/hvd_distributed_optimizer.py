@@ -12,6 +12,8 @@ import tensorflow as tf
 
 from optimizer import optimizer_utils
 from optimizer import adam_weight_decay_utils
+from optimizer import radam_utils
+from optimizer import grad_accumulation
 import horovod.tensorflow as hvd
 
 class Optimizer(object):
@@ -87,6 +89,9 @@ class Optimizer(object):
 	def grad_clip_fn(self, opt, loss, tvars, **kargs):
 		grads_and_vars = opt.compute_gradients(loss, tvars)
 		grads = [grad for grad, _ in grads_and_vars]
+		return self.clip_grads(grads)
+
+	def clip_grads(self, grads):
 		grad_clip = self.config.get("grad_clip", "global_norm")
 		tf.logging.info(" gradient clip method {}".format(grad_clip))
 		if grad_clip == "global_norm":
@@ -108,7 +113,7 @@ class Optimizer(object):
 							**kargs):
 		opt_type = self.config.get("train_op", "adam_decay")
 		tf.logging.info(" optimization method {}".format(opt_type))
-		if opt_type not in ["adam_decay", "adam"]:
+		if opt_type not in ["adam_decay", "adam", "adam_weight_decay", "lamb", "radam"]:
 			raise NotImplementedError()
 		if opt_type == "adam_decay":
 			opt = optimizer_utils.AdamWeightDecayOptimizer(
@@ -130,6 +135,19 @@ class Optimizer(object):
 										beta1=self.config.get("beta_1", 0.9),
 										beta2=self.config.get("beta_2", 0.999),
 										epsilon=self.config.get("epsilon", 1e-8))
+		elif opt_type == "lamb":
+			opt = optimizer_utils.LAMBOptimizer_v2(learning_rate,
+						weight_decay_rate=self.config.get("opt_decay_rate", 0.01),
+						beta_1=self.config.get("beta_1", 0.9),
+						beta_2=self.config.get("beta_2", 0.999),
+						epsilon=self.config.get("epsilon", 1e-6),
+						exclude_from_weight_decay=["LayerNorm", "layer_norm", "bias"])
+		elif opt_type == "radam":
+			opt = radam_utils.RAdamOptimizer(learning_rate,
+						weight_decay=self.config.get("opt_decay_rate", 0.0),
+						beta1=self.config.get("beta_1", 0.9),
+						beta2=self.config.get("beta_2", 0.999),
+						epsilon=self.config.get("epsilon", 1e-6))
 		return opt
 
 	def get_opt(self, init_lr, 
@@ -160,6 +178,17 @@ class Optimizer(object):
 
 		# add uber horvod distributed optimizer
 		self.opt = hvd.DistributedOptimizer(opt)
+
+		num_accumulation_steps = self.config.get("num_accumulation_steps", 1)
+		if num_accumulation_steps > 1:
+			# one allreduce of the accumulated gradients per update
+			grads_and_vars = opt.compute_gradients(loss, tvars)
+			return grad_accumulation.accumulation_train_op(opt, grads_and_vars,
+									num_accumulation_steps,
+									self.global_step,
+									clip_fn=self.clip_grads,
+									allreduce_fn=lambda grads:[hvd.allreduce(grad) for grad in grads])
+
 		grads = self.grad_clip_fn(self.opt, loss, tvars, **kargs)
 
 		# self.grad_summaries_merged = optimizer_utils.add_grad_summaries(
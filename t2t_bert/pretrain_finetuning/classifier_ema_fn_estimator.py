@@ -99,6 +99,7 @@ def classifier_model_fn_builder(
 		nsp_log_prob) = pretrain.get_next_sentence_output(model_config,
 										model.get_pooled_output(),
 										features['next_sentence_labels'],
+										example_weights=features.get('example_weights', None),
 										reuse=model_reuse)
 
 		masked_lm_positions = features["masked_lm_positions"]
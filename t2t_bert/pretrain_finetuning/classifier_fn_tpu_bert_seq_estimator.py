@@ -274,7 +274,8 @@ def classifier_model_fn_builder(
 										swap_memory=True,
 										seq_type=kargs.get("seq_type", "seq2seq"),
 										mask_type=kargs.get("mask_type", "seq2seq"),
-										attention_type=kargs.get('attention_type', 'normal_attention')
+										attention_type=kargs.get('attention_type', 'normal_attention'),
+										cache_type=kargs.get('cache_type', 'einsum')
 										)
 				# stop_gradient output:
 				# samples, mask_sequence, presents, logits, final
@@ -303,6 +304,44 @@ def classifier_model_fn_builder(
 
 				return estimator_spec
 
+			elif kargs.get('predict_type', 'sample_sequence') == 'beam_search':
+				results = bert_seq_sample_utils.beam_search_sequence(model_api,
+										model_config, 
+										mode, 
+										features,
+										target="", 
+										start_token=kargs.get("start_token_id", 101), 
+										context=features.get("context", None), 
+										beam_size=kargs.get("beam_size", 4),
+										end_token=kargs.get("end_token_id", 102),
+										alpha=kargs.get("length_penalty", 0.0),
+										temperature=kargs.get("sample_temp", 1.0), 
+										stochastic=kargs.get("stochastic_beam_search", False),
+										seq_type=kargs.get("seq_type", "seq2seq"),
+										mask_type=kargs.get("mask_type", "seq2seq"),
+										attention_type=kargs.get('attention_type', 'normal_attention')
+										)
+
+				estimator_spec = tf.estimator.EstimatorSpec(
+									mode=mode,
+									predictions={
+												'token':results['samples'],
+												"scores":results['scores'],
+												"mask_sequence":results['mask_sequence']
+									},
+									export_outputs={
+										"output":tf.estimator.export.PredictOutput(
+													{
+														'token':results['samples'],
+														"scores":results['scores'],
+														"mask_sequence":results['mask_sequence']
+													}
+												)
+									}
+						)
+
+				return estimator_spec
+
 			elif kargs.get('predict_type', 'sample_sequence') == 'infer_inputs':
 
 				sequence_mask = tf.to_float(tf.not_equal(features['input_ids'][:, 1:], 
@@ -53,6 +53,7 @@ def model_fn_builder(
 		 nsp_log_prob) = pretrain.get_next_sentence_output(model_config,
 										model.get_pooled_output(),
 										features['next_sentence_labels'],
+										example_weights=features.get('example_weights', None),
 										reuse=tf.AUTO_REUSE)
 
 		if model_config.model_type == 'bert':
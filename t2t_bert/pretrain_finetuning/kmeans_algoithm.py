@@ -1,54 +1,186 @@
 import numpy as np
-from numpy.linalg import norm
+from scipy import sparse
+from concurrent.futures import ThreadPoolExecutor
 
 
 class Kmeans:
-    '''Implementing Kmeans algorithm.'''
+    '''Implementing Kmeans algorithm.
 
-    def __init__(self, n_clusters, max_iter=100, random_state=123):
+    Distances use ||x||^2 - 2x.c + ||c||^2, so every chunk of X costs one
+    matrix product instead of an N x D temporary per cluster. X may be a
+    np.memmap: it is only read chunk_size rows at a time, and chunks are
+    spread over n_jobs threads (numpy releases the GIL in the products).
+
+    init: "random" or "k-means++".
+    batch_size: if set, fit runs mini-batch k-means on batch_size sampled
+        rows per iteration instead of full passes over X.
+    '''
+
+    def __init__(self, n_clusters, max_iter=100, random_state=123,
+                 init="random", batch_size=None, chunk_size=65536,
+                 n_jobs=1, tol=0.0, init_size=None):
         self.n_clusters = n_clusters
         self.max_iter = max_iter
         self.random_state = random_state
+        self.init = init
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.n_jobs = n_jobs
+        self.tol = tol
+        self.init_size = init_size
+
+    def _chunks(self, n):
+        return [(start, min(start + self.chunk_size, n))
+                for start in range(0, n, self.chunk_size)]
+
+    def _map_chunks(self, fn, n):
+        chunks = self._chunks(n)
+        if self.n_jobs > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+                return list(executor.map(lambda chunk: fn(*chunk), chunks))
+        return [fn(start, end) for start, end in chunks]
+
+    def _distance(self, X, centroids, centroid_sq_norm=None):
+        X = np.asarray(X, dtype=centroids.dtype)
+        if centroid_sq_norm is None:
+            centroid_sq_norm = np.einsum("ij,ij->i", centroids, centroids)
+        distance = np.dot(X, centroids.T)
+        distance *= -2
+        distance += np.einsum("ij,ij->i", X, X)[:, None]
+        distance += centroid_sq_norm[None, :]
+        return np.maximum(distance, 0, out=distance)
+
+    def _cluster_sums(self, X, labels, dtype):
+        '''Per-cluster sums of the rows of X as a sparse one-hot product,
+        O(N x D) for any number of clusters unlike np.add.at.'''
+        n = len(labels)
+        # column i holds a single 1 in row labels[i]
+        one_hot = sparse.csc_matrix((np.ones(n, dtype=dtype), labels, np.arange(n + 1)),
+                                    shape=(self.n_clusters, n))
+        return np.asarray(one_hot.dot(np.asarray(X, dtype=dtype)))
+
+    def _assign(self, X, centroids):
+        '''Labels, squared distance to the closest centroid, per-cluster
+        sums and counts, in one chunked pass.'''
+        centroid_sq_norm = np.einsum("ij,ij->i", centroids, centroids)
+
+        def assign_chunk(start, end):
+            distance = self._distance(X[start:end], centroids, centroid_sq_norm)
+            labels = self.find_closest_cluster(distance)
+            min_distance = distance[np.arange(end - start), labels]
+            sums = self._cluster_sums(X[start:end], labels, centroids.dtype)
+            counts = np.bincount(labels, minlength=self.n_clusters)
+            return labels, min_distance, sums, counts
+
+        results = self._map_chunks(assign_chunk, X.shape[0])
+        labels = np.concatenate([result[0] for result in results])
+        min_distance = np.concatenate([result[1] for result in results])
+        sums = np.sum([result[2] for result in results], axis=0)
+        counts = np.sum([result[3] for result in results], axis=0)
+        return labels, min_distance, sums, counts
 
     def initializ_centroids(self, X):
-        np.random.RandomState(self.random_state)
-        random_idx = np.random.permutation(X.shape[0])
-        centroids = X[random_idx[:self.n_clusters]]
+        rng = np.random.RandomState(self.random_state)
+        if self.init == "k-means++":
+            return self._kmeans_plus_plus(X, rng)
+        random_idx = np.sort(rng.choice(X.shape[0], self.n_clusters, replace=False))
+        return np.array(X[random_idx], dtype=np.float64)
+
+    def _kmeans_plus_plus(self, X, rng):
+        '''D^2 sampling, on init_size sampled rows if set.'''
+        if self.init_size and self.init_size < X.shape[0]:
+            sample_idx = np.sort(rng.choice(X.shape[0], self.init_size, replace=False))
+            X = np.asarray(X[sample_idx])
+        centroids = np.zeros((self.n_clusters, X.shape[1]), dtype=np.float64)
+        centroids[0] = X[rng.randint(X.shape[0])]
+        min_distance = np.concatenate(self._map_chunks(
+            lambda start, end: self._distance(X[start:end], centroids[:1])[:, 0],
+            X.shape[0]))
+        for k in range(1, self.n_clusters):
+            total = min_distance.sum()
+            if total > 0:
+                index = np.searchsorted(np.cumsum(min_distance), rng.rand() * total)
+                index = min(index, X.shape[0] - 1)
+            else:
+                index = rng.randint(X.shape[0])
+            centroids[k] = X[index]
+            new_distance = np.concatenate(self._map_chunks(
+                lambda start, end: self._distance(X[start:end], centroids[k:k+1])[:, 0],
+                X.shape[0]))
+            np.minimum(min_distance, new_distance, out=min_distance)
         return centroids
 
     def compute_centroids(self, X, labels):
-        centroids = np.zeros((self.n_clusters, X.shape[1]))
-        for k in range(self.n_clusters):
-            centroids[k, :] = np.mean(X[labels == k, :], axis=0)
-        return centroids
+        centroids = self._cluster_sums(X, labels, np.float64)
+        counts = np.bincount(labels, minlength=self.n_clusters)
+        # empty clusters keep their previous centroid when there is one
+        empty = counts == 0
+        if np.any(empty) and getattr(self, "centroids", None) is not None:
+            centroids[empty] = self.centroids[empty]
+            counts[empty] = 1
+        return centroids / np.maximum(counts, 1)[:, None]
 
     def compute_distance(self, X, centroids):
-        distance = np.zeros((X.shape[0], self.n_clusters))
-        for k in range(self.n_clusters):
-            row_norm = norm(X - centroids[k, :], axis=1)
-            distance[:, k] = np.square(row_norm)
-        return distance
+        return np.concatenate(self._map_chunks(
+            lambda start, end: self._distance(X[start:end], centroids),
+            X.shape[0]))
 
     def find_closest_cluster(self, distance):
         return np.argmin(distance, axis=1)
 
     def compute_sse(self, X, labels, centroids):
-        distance = np.zeros(X.shape[0])
-        for k in range(self.n_clusters):
-            distance[labels == k] = norm(X[labels == k] - centroids[k], axis=1)
-        return np.sum(np.square(distance))
-    
+        def sse_chunk(start, end):
+            diff = np.asarray(X[start:end], dtype=centroids.dtype) - centroids[labels[start:end]]
+            return np.einsum("ij,ij->", diff, diff)
+        return np.sum(self._map_chunks(sse_chunk, X.shape[0]))
+
     def fit(self, X):
         self.centroids = self.initializ_centroids(X)
+        if self.batch_size:
+            self._fit_mini_batch(X)
+        else:
+            self._fit_full(X)
+        return self
+
+    def _fit_full(self, X):
         for i in range(self.max_iter):
             old_centroids = self.centroids
-            distance = self.compute_distance(X, old_centroids)
-            self.labels = self.find_closest_cluster(distance)
-            self.centroids = self.compute_centroids(X, self.labels)
-            if np.all(old_centroids == self.centroids):
+            self.labels, min_distance, sums, counts = self._assign(X, old_centroids)
+            empty = counts == 0
+            sums[empty] = old_centroids[empty]
+            counts[empty] = 1
+            self.centroids = sums / counts[:, None]
+            shift = np.sum(np.square(self.centroids - old_centroids), axis=1)
+            if np.max(shift) <= self.tol:
                 break
-        self.error = self.compute_sse(X, self.labels, self.centroids)
-    
+        self.n_iter = i + 1
+        self.labels, min_distance, _, _ = self._assign(X, self.centroids)
+        self.error = np.sum(min_distance)
+
+    def _fit_mini_batch(self, X):
+        '''Sculley's web-scale k-means: per-center learning rate 1 / count.'''
+        rng = np.random.RandomState(self.random_state + 1)
+        total_counts = np.zeros(self.n_clusters)
+        for i in range(self.max_iter):
+            old_centroids = self.centroids.copy()
+            batch_idx = np.sort(rng.choice(X.shape[0], min(self.batch_size, X.shape[0]),
+                                           replace=False))
+            batch = np.asarray(X[batch_idx], dtype=self.centroids.dtype)
+            distance = self._distance(batch, self.centroids)
+            labels = self.find_closest_cluster(distance)
+            sums = self._cluster_sums(batch, labels, self.centroids.dtype)
+            counts = np.bincount(labels, minlength=self.n_clusters)
+            updated = counts > 0
+            total_counts += counts
+            self.centroids[updated] += (sums[updated] - counts[updated][:, None] * self.centroids[updated]) \
+                / total_counts[updated][:, None]
+            shift = np.sum(np.square(self.centroids - old_centroids), axis=1)
+            if self.tol > 0 and np.max(shift) <= self.tol:
+                break
+        self.n_iter = i + 1
+        self.labels, min_distance, _, _ = self._assign(X, self.centroids)
+        self.error = np.sum(min_distance)
+
     def predict(self, X):
-        distance = self.compute_distance(X, old_centroids)
-        return self.find_closest_cluster(distance)
\ No newline at end of file
+        labels, _, _, _ = self._assign(X, self.centroids)
+        return labels
@@ -174,6 +174,12 @@ def train_eval_fn(FLAGS,
 			input_fn_builder = tf_data_utils.input_fn_builder
 			tf.logging.info("***** Running fixed sample input fn builder *****")
 
+		# only the tf_data_utils builders read compact or compressed records
+		record_kargs = {}
+		if FLAGS.record_format != "padded" or FLAGS.compression_type:
+			record_kargs = {"record_format":FLAGS.record_format,
+							"compression_type":FLAGS.compression_type}
+
 		if FLAGS.do_train:
 			tf.logging.info("***** Running training *****")
 			tf.logging.info("  Batch size = %d", FLAGS.batch_size)
@@ -186,7 +192,8 @@ def train_eval_fn(FLAGS,
 										truncate_seq=data_config.truncate_seq, 
 										use_bfloat16=data_config.use_bfloat16,
 										stride=data_config.stride,
-										input_type="normal")
+										input_type="normal",
+										**record_kargs)
 			estimator.train(input_fn=input_features, max_steps=num_train_steps)
 		else:
 			tf.logging.info("***** Running evaluation *****")
@@ -200,7 +207,8 @@ def train_eval_fn(FLAGS,
 							FLAGS=data_config,
 							truncate_seq=data_config.truncate_seq, 
 							use_bfloat16=data_config.use_bfloat16,
-							stride=data_config.stride)
+							stride=data_config.stride,
+							**record_kargs)
 			tf.logging.info("***** Begining Running evaluation *****")
 			result = estimator.evaluate(input_fn=eval_input_fn, steps=max_eval_steps)
 			output_eval_file = os.path.join(checkpoint_dir, "eval_results.txt")
@@ -1,3 +1,26 @@
 
 import numpy as np
-import tensorflow as tf
\ No newline at end of file
+import tensorflow as tf
+
+from task_module.contrastive_utils import moco_logits
+
+"""
+AdCo, https://arxiv.org/abs/2011.08435
+the negatives are a trainable memory bank updated to maximize the
+contrastive loss, create it with MoCoRingQueue(..., trainable=True) so the
+bank is a single [bank_size, dim] variable.
+"""
+
+def add_adco_contrastive_loss(query,
+							key,
+							memory_bank,
+							temperature=0.12,
+							weights=1.0):
+	"""Returns the loss, logits, labels and the grads_and_vars of the
+	memory bank, negated so that applying them ascends the loss. Keep
+	memory_bank.keys out of the var_list of the encoder optimizer."""
+	key = tf.stop_gradient(key)
+	logits, labels = moco_logits(query, key, memory_bank.keys, temperature)
+	loss = tf.losses.softmax_cross_entropy(labels, logits, weights=weights)
+	memory_grads = tf.gradients(loss, [memory_bank.keys])[0]
+	return loss, logits, labels, [(-memory_grads, memory_bank.keys)]
@@ -86,6 +86,65 @@ def add_contrastive_loss(hidden,
   return loss, logits_ab, labels
 
 
+def moco_logits(query, key, negatives, temperature=0.07):
+  """Logits of the positive key followed by the negatives.
+  Args:
+    query: query vector (`Tensor`) of shape (bsz, dim).
+    key: positive key vector of shape (bsz, dim).
+    negatives: negative keys of shape (num_negatives, dim).
+    temperature: a `floating` number for temperature scaling.
+  Returns:
+    The logits of shape (bsz, 1 + num_negatives).
+    The labels, the positive is always at index 0.
+  """
+  query = tf.math.l2_normalize(query, -1)
+  key = tf.math.l2_normalize(key, -1)
+  negatives = tf.math.l2_normalize(negatives, -1)
+  logits_pos = tf.reduce_sum(query * key, axis=-1, keepdims=True)
+  logits_neg = tf.matmul(query, negatives, transpose_b=True)
+  logits = tf.concat([logits_pos, logits_neg], axis=1) / temperature
+  labels = tf.one_hot(tf.zeros([tf.shape(query)[0]], dtype=tf.int32),
+                      tf.shape(logits)[1])
+  return logits, labels
+
+
+def add_moco_contrastive_loss(query,
+                              key,
+                              queue,
+                              temperature=0.07,
+                              tpu_context=None,
+                              gather_fn=None,
+                              weights=1.0):
+  """Compute MoCo loss with the keys of a `MoCoRingQueue` as negatives.
+  Args:
+    query: query encoder output (`Tensor`) of shape (bsz, dim).
+    key: momentum encoder output of shape (bsz, dim), no gradient is
+      propagated into it.
+    queue: a `utils.moco.moco_queue.MoCoRingQueue`.
+    temperature: a `floating` number for temperature scaling.
+    tpu_context: context information for tpu, keys of every replica are
+      enqueued.
+    gather_fn: concatenates keys across workers outside of tpu, e.g.
+      hvd.allgather.
+    weights: a weighting number or vector.
+  Returns:
+    A loss scalar.
+    The logits for contrastive prediction task.
+    The labels for contrastive prediction task.
+    The enqueue op, it only runs after the queue has been read, group it
+    with the train op.
+  """
+  key = tf.stop_gradient(key)
+  logits, labels = moco_logits(query, key, queue.keys, temperature)
+  loss = tf.losses.softmax_cross_entropy(labels, logits, weights=weights)
+
+  if tpu_context is not None:
+    gather_fn = lambda tensor: tpu_cross_replica_concat(tensor, tpu_context)
+  with tf.control_dependencies([logits]):
+    enqueue_op = queue.enqueue(tf.math.l2_normalize(key, -1), gather_fn=gather_fn)
+  return loss, logits, labels, enqueue_op
+
+
 def tpu_cross_replica_concat(tensor, tpu_context=None):
   """Reduce a concatenation of the `tensor` across TPU cores.
   Args:
@@ -276,7 +276,13 @@ def get_next_sentence_output(config, input_tensor, labels, reuse=None, **kargs):
 		labels = tf.reshape(labels, [-1])
 		one_hot_labels = tf.one_hot(labels, depth=2, dtype=tf.float32)
 		per_example_loss = -tf.reduce_sum(one_hot_labels * log_probs, axis=-1)
-		loss = tf.reduce_mean(per_example_loss)
+		# packed rows, empty example slots have zero weight
+		example_weights = kargs.get('example_weights', None)
+		if example_weights is not None:
+			example_weights = tf.cast(tf.reshape(example_weights, [-1]), tf.float32)
+			loss = tf.reduce_sum(per_example_loss * example_weights) / (tf.reduce_sum(example_weights) + 1e-10)
+		else:
+			loss = tf.reduce_mean(per_example_loss)
 		return (loss, per_example_loss, log_probs)
 
 def seq_mask_masked_lm_output(config, input_tensor, output_weights,
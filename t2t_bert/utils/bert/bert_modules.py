@@ -269,7 +269,8 @@ def embedding_postprocessor(input_tensor,
 														max_position_embeddings=512,
 														dropout_prob=0.1,
 														token_type_ratio=1.0,
-														dropout_name=None):
+														dropout_name=None,
+														position_ids=None):
 	"""Performs various post-processing on a word embedding tensor.
 
 	Args:
@@ -290,6 +291,8 @@ def embedding_postprocessor(input_tensor,
 			used with this model. This can be longer than the sequence length of
 			input_tensor, but cannot be shorter.
 		dropout_prob: float. Dropout probability applied to the final output tensor.
+		position_ids: (optional) int32 Tensor of shape [batch_size, seq_length],
+			positions restarting at 0 for every example of a packed row.
 
 	Returns:
 		float tensor with same shape as `input_tensor`.
@@ -352,6 +355,15 @@ def embedding_postprocessor(input_tensor,
 		# 																 [seq_length, -1]), 
 		# 												lambda:full_position_embeddings)
 
+		if position_ids is not None:
+			# packed rows, positions restart for every example
+			flat_pos_ids = tf.reshape(position_ids, [-1])
+			one_hot_pos_ids = tf.one_hot(flat_pos_ids, depth=max_position_embeddings)
+			position_embeddings = tf.matmul(one_hot_pos_ids, full_position_embeddings)
+			output += tf.reshape(position_embeddings, [batch_size, seq_length, width])
+			output = layer_norm_and_dropout(output, dropout_prob, dropout_name=dropout_name)
+			return output
+
 		flat_pos_ids = tf.range(seq_length, dtype=tf.int32)
 		one_hot_pos_ids = tf.one_hot(flat_pos_ids, depth=max_position_embeddings)
 		position_embeddings = tf.matmul(one_hot_pos_ids, full_position_embeddings)
@@ -503,16 +515,26 @@ def embedding_rule_type_postprocessor(input_tensor,
 	return output
 
 
-def create_attention_mask_from_input_mask(from_tensor, to_mask):
+def create_attention_mask_from_input_mask(from_tensor, to_mask, segmentation_ids=None):
 	"""Create 3D attention mask from a 2D tensor mask.
 
 	Args:
 		from_tensor: 2D or 3D Tensor of shape [batch_size, from_seq_length, ...].
 		to_mask: int32 Tensor of shape [batch_size, to_seq_length].
+		segmentation_ids: (optional) int32 Tensor of shape [batch_size, seq_length]
+			of packed rows, 1-based example ids and 0 for padding. Tokens only
+			attend to tokens of their own example.
 
 	Returns:
 		float Tensor of shape [batch_size, from_seq_length, to_seq_length].
 	"""
+	if segmentation_ids is not None:
+		# block diagonal mask, padding (id 0) is never attended to
+		mask = tf.equal(tf.expand_dims(segmentation_ids, axis=2),
+						tf.expand_dims(segmentation_ids, axis=1))
+		mask = tf.logical_and(mask, tf.expand_dims(tf.not_equal(segmentation_ids, 0), axis=1))
+		return tf.cast(mask, tf.float32)
+
 	from_shape = bert_utils.get_shape_list(from_tensor, expected_rank=[2, 3])
 	batch_size = from_shape[0]
 	from_seq_length = from_shape[1]
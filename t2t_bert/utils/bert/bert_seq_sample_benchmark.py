@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""Decoding tokens/sec of bert_seq sample_sequence on CPU, comparing the
+einsum merged cache with the incremental TensorArray cache."""
+
+import sys,os
+import time
+
+father_path = os.path.join(os.getcwd())
+print(father_path, "==father path==")
+
+def find_bert(father_path):
+	if father_path.split("/")[-1] == "BERT":
+		return father_path
+
+	output_path = ""
+	for fi in os.listdir(father_path):
+		if fi == "BERT":
+			output_path = os.path.join(father_path, fi)
+			break
+		else:
+			if os.path.isdir(os.path.join(father_path, fi)):
+				find_bert(os.path.join(father_path, fi))
+			else:
+				continue
+	return output_path
+
+bert_path = find_bert(father_path)
+t2t_bert_path = os.path.join(bert_path, "t2t_bert")
+sys.path.extend([bert_path, t2t_bert_path])
+
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+import numpy as np
+import tensorflow as tf
+from bunch import Bunch
+from distributed_encoder.bert_encoder import bert_seq_decoder
+from utils.bert import bert_seq_sample_utils
+
+flags = tf.flags
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_string("model_sizes", "tiny,base", "comma separated, tiny or base")
+
+flags.DEFINE_string("cache_types", "einsum,tensor_array", "comma separated cache types")
+
+flags.DEFINE_integer("batch_size", 8, "number of sequences decoded together")
+
+flags.DEFINE_integer("max_length", 128, "decoded sequence length")
+
+flags.DEFINE_integer("context_length", 8, "prompt length")
+
+flags.DEFINE_integer("num_runs", 5, "timed runs after one warm up run")
+
+model_sizes = {
+	"tiny":{"hidden_size":312, "num_hidden_layers":4,
+			"num_attention_heads":12, "intermediate_size":1248},
+	"base":{"hidden_size":768, "num_hidden_layers":12,
+			"num_attention_heads":12, "intermediate_size":3072}
+}
+
+def get_model_config(model_size):
+	model_config = Bunch({
+		"vocab_size":21128,
+		"hidden_act":"gelu",
+		"initializer_range":0.02,
+		"max_position_embeddings":512,
+		"type_vocab_size":2,
+		"hidden_dropout_prob":0.0,
+		"attention_probs_dropout_prob":0.0,
+		"use_one_hot_embeddings":False,
+		"scope":"bert"
+	})
+	model_config.update(model_sizes[model_size])
+	return model_config
+
+def benchmark(model_size, cache_type):
+	model_config = get_model_config(model_size)
+	graph = tf.Graph()
+	with graph.as_default():
+		features = {"input_ids":tf.zeros((FLAGS.batch_size, FLAGS.max_length), dtype=tf.int32)}
+		context = tf.random_uniform((FLAGS.batch_size, FLAGS.context_length),
+								minval=1000, maxval=model_config.vocab_size, dtype=tf.int32)
+		results = bert_seq_sample_utils.sample_sequence(bert_seq_decoder,
+									model_config,
+									tf.estimator.ModeKeys.PREDICT,
+									features,
+									context=context,
+									greedy_or_sample="greedy",
+									back_prop=False,
+									seq_type="seq2seq",
+									mask_type="left2right",
+									if_cache_decode=True,
+									cache_type=cache_type)
+		with tf.Session() as sess:
+			sess.run(tf.global_variables_initializer())
+			sess.run(results["samples"])
+			start = time.time()
+			for _ in range(FLAGS.num_runs):
+				sess.run(results["samples"])
+			elapsed = (time.time() - start) / FLAGS.num_runs
+
+	new_tokens = FLAGS.batch_size * (FLAGS.max_length - 1 - FLAGS.context_length)
+	tf.logging.info("** %s %s: %.3fs per batch, %.1f tokens/s **",
+					model_size, cache_type, elapsed, new_tokens / elapsed)
+
+def main(_):
+	tf.logging.set_verbosity(tf.logging.INFO)
+	for model_size in FLAGS.model_sizes.split(","):
+		for cache_type in FLAGS.cache_types.split(","):
+			benchmark(model_size, cache_type)
+
+if __name__ == "__main__":
+	tf.app.run()
@@ -1,6 +1,7 @@
 import tensorflow as tf
 import numpy as np
 from utils.bert import bert_utils
+from utils.sampling_utils import beam_search_utils
 
 def get_finised_pos(token_seq, finished_index, max_length): 
 	tmp_indices = tf.where(tf.equal(token_seq, int(finished_index)))
@@ -98,6 +99,23 @@ def sample_sequence(model_api,
 				attention_fixed_size=None,
 				**kargs):
 
+	if kargs.get("cache_type", "einsum") == "tensor_array":
+		return sample_sequence_incremental(model_api,
+				model_config, 
+				mode, 
+				features,
+				target=target, 
+				start_token=start_token, 
+				context=context, 
+				temperature=temperature, 
+				top_k=top_k,
+				end_token=end_token,
+				greedy_or_sample=greedy_or_sample,
+				back_prop=back_prop,
+				swap_memory=swap_memory,
+				attention_fixed_size=attention_fixed_size,
+				**kargs)
+
 	input_shape = bert_utils.get_shape_list(features["input_ids"], expected_rank=[2,3])
 	batch_size = input_shape[0]
 	seq_length = input_shape[1]
@@ -315,3 +333,262 @@ def sample_sequence(model_api,
 			"logits":logits,
 			"final":final
 		}
+
+def sample_next_tokens(next_logits, temperature, top_k, greedy_or_sample):
+	"""Returns sampled ids [B] and their log-probs [B] from logits [B, V]."""
+	next_logits = next_logits / tf.to_float(temperature)
+	next_logits = tf.nn.log_softmax(top_k_logits(next_logits, top_k), axis=-1)
+	if greedy_or_sample == "sample":
+		next_samples = tf.multinomial(next_logits, num_samples=1, output_dtype=tf.int32)
+		next_samples = tf.squeeze(next_samples, axis=-1)
+	else:
+		next_samples = tf.argmax(next_logits, axis=-1)
+	next_samples = tf.cast(next_samples, tf.int32)
+	next_sample_logits = tf.reduce_sum(next_logits * tf.one_hot(next_samples, 
+								tf.shape(next_logits)[-1]), axis=-1)
+	return next_samples, next_sample_logits
+
+def sample_sequence_incremental(model_api,
+				model_config, 
+				mode, 
+				features,
+				target="", 
+				start_token=101, 
+				context=None, 
+				temperature=1, 
+				top_k=0,
+				end_token=102,
+				greedy_or_sample="sample",
+				back_prop=True,
+				swap_memory=True,
+				attention_fixed_size=None,
+				**kargs):
+	"""sample_sequence with an append-only key/value cache.
+
+	The cache is a TensorArray with one [B, N_layer, 2, N, H] entry per
+	timestep: every step writes only its own timesteps and attention reads
+	only the filled prefix, instead of merging into a full
+	[B, N_layer, 2, N, T, H] tensor per step. The whole context runs in one
+	prefill step. Outputs match sample_sequence(cache_type="einsum"), except
+	that "presents" is zero past the last fed position.
+	"""
+
+	input_shape = bert_utils.get_shape_list(features["input_ids"], expected_rank=[2,3])
+	batch_size = input_shape[0]
+	seq_length = kargs.get('max_length', input_shape[1])
+	actual_length = seq_length
+
+	if context is None:
+		assert start_token is not None, 'Specify exactly one of start_token and context!'
+		context = tf.cast(tf.fill([batch_size, 1], start_token), tf.int32)
+	else:
+		context = tf.cast(context, tf.int32)
+	context_shape = bert_utils.get_shape_list(context, expected_rank=[2])
+	context_length = context_shape[1]
+
+	# model_api must return presents for the new timesteps
+	step_kargs = dict(kargs)
+	step_kargs["if_cache_decode"] = True
+
+	samples = tf.cast(tf.zeros((batch_size, actual_length)), tf.int32)
+	end_mask = tf.expand_dims(tf.one_hot(actual_length-1, actual_length), axis=(0))
+	samples += end_token*tf.cast(end_mask, tf.int32) # make sure last token is end token
+	start_mask = tf.one_hot(tf.range(0, context_length), actual_length)
+	samples += tf.cast(tf.einsum("ab,bc->ac", 
+									tf.cast(context, tf.float32), 
+									 tf.cast(start_mask, tf.float32)), tf.int32)
+	logits = tf.cast(tf.zeros((batch_size, actual_length)), tf.float32)
+
+	cache = tf.TensorArray(tf.float32, 
+						size=actual_length,
+						clear_after_read=False,
+						infer_shape=True)
+
+	def step(step, tokens, segment_ids, cache):
+		token_shape = bert_utils.get_shape_list(tokens, expected_rank=[2,3])
+
+		features = {}
+		features['input_ids'] = tokens
+		features['segment_ids'] = tf.cast(segment_ids, tf.int32)
+		features['input_mask'] = tf.cast(tf.ones((token_shape[0], step+token_shape[1])), tf.int32)
+		if isinstance(step, int) and step == 0:
+			features['past'] = None
+		else:
+			# [step, B, N_layer, 2, N, H] -> [B, N_layer, 2, N, step, H]
+			features['past'] = tf.transpose(cache.gather(tf.range(step)), [1, 2, 3, 4, 0, 5])
+
+		inference_model = model_api(model_config, features, [],
+							mode, target, reuse=tf.AUTO_REUSE,
+							**step_kargs)
+
+		# [B, N_layer, 2, N, F, H] -> [F, B, N_layer, 2, N, H]
+		next_presents = tf.transpose(inference_model.get_present(), [4, 0, 1, 2, 3, 5])
+		cache = cache.scatter(tf.range(step, step+token_shape[1]), next_presents)
+		return {
+			'logits': inference_model.get_sequence_output_logits(),
+			'cache': cache
+		}
+
+	def update(i, next_logits, samples, logits):
+		next_samples, next_sample_logits = sample_next_tokens(next_logits, 
+									temperature, top_k, greedy_or_sample)
+		# the end token slot is never overwritten
+		sample_mask = tf.expand_dims(tf.one_hot(i, actual_length), axis=(0))
+		sample_mask *= tf.cast(i < actual_length - 1, tf.float32)
+		samples += tf.cast(sample_mask, tf.int32) * tf.expand_dims(next_samples, axis=-1)
+		logits += sample_mask * tf.expand_dims(next_sample_logits, axis=-1)
+		return next_samples, samples, logits
+
+	if kargs.get("mask_type", "left2right") == 'seq2seq':
+		left_segment_ids = tf.ones_like(context[:, -1:])
+	else:
+		left_segment_ids = tf.zeros_like(context[:, -1:])
+
+	with tf.name_scope('sample_sequence'):
+		# prefill: the whole context in one step, the last context token
+		# keeps the segment id it gets in the decoding loop
+		context_segment_ids = tf.concat([tf.zeros_like(context[:, :-1]), left_segment_ids], axis=-1)
+		context_output = step(0, context, context_segment_ids, cache)
+		prev, samples, logits = update(context_length, 
+									context_output['logits'][:, -1, :],
+									samples, logits)
+
+		def body(i, cache, prev, samples, logits):
+			next_outputs = step(i-1, prev[:, tf.newaxis], left_segment_ids, cache)
+			prev, samples, logits = update(i, next_outputs['logits'][:, -1, :], samples, logits)
+			return [i+1, next_outputs['cache'], prev, samples, logits]
+
+		init_i = tf.cast(context_length+1, tf.int32)
+		final, cache, _, samples, logits = tf.while_loop(
+			cond=lambda i, _1, _2, _3, _4: i < seq_length-1,
+			body=body,
+			loop_vars=[init_i,
+				context_output['cache'],
+				prev,
+				samples,
+				logits
+			],
+			back_prop=back_prop,
+			swap_memory=swap_memory
+		)
+
+		# positions [0, final-1) were fed to the model
+		presents = tf.transpose(cache.gather(tf.range(final-1)), [1, 2, 3, 4, 0, 5])
+		presents = tf.pad(presents, [[0, 0], [0, 0], [0, 0], [0, 0], 
+								[0, actual_length-final+1], [0, 0]])
+
+		if kargs.get("mask_type", "left2right") == 'left2right': 
+			mask_sequence = get_finised_pos_v1(samples, end_token, actual_length)
+			samples *= tf.cast(mask_sequence, tf.int32)
+			logits *= tf.cast(mask_sequence, tf.float32)
+		else:
+			mask_sequence = tf.ones_like(samples)
+		
+		return {
+			"samples":samples,
+			"mask_sequence":mask_sequence,
+			"presents":presents,
+			"logits":logits,
+			"final":final
+		}
+
+def beam_search_sequence(model_api,
+				model_config, 
+				mode, 
+				features,
+				target="", 
+				start_token=101, 
+				context=None, 
+				beam_size=4,
+				end_token=102,
+				alpha=0.0,
+				temperature=1,
+				stochastic=False,
+				**kargs):
+	"""Beam search counterpart of sample_sequence for bert_seq models.
+
+	The context is prefilled in one step and the rest of max_length - 1
+	positions is decoded with beam_search_utils.beam_search, which stops
+	once every beam emitted end_token. Returns "samples" [B, beam, T] with
+	context, decoded tokens and a final end_token, "mask_sequence" up to
+	and including the first end_token after the context, and "scores" and
+	"log_probs" [B, beam].
+	"""
+	input_shape = bert_utils.get_shape_list(features["input_ids"], expected_rank=[2,3])
+	batch_size = input_shape[0]
+	seq_length = kargs.get('max_length', input_shape[1])
+
+	if context is None:
+		assert start_token is not None, 'Specify exactly one of start_token and context!'
+		context = tf.cast(tf.fill([batch_size, 1], start_token), tf.int32)
+	else:
+		context = tf.cast(context, tf.int32)
+	context_length = bert_utils.get_shape_list(context, expected_rank=[2])[1]
+
+	step_kargs = dict(kargs)
+	step_kargs["if_cache_decode"] = True
+
+	if kargs.get("mask_type", "left2right") == 'seq2seq':
+		left_segment_id = 1
+	else:
+		left_segment_id = 0
+
+	def step(tokens, past=None, segment_ids=None):
+		token_shape = bert_utils.get_shape_list(tokens, expected_rank=[2,3])
+		if past is None:
+			past_length = 0
+		else:
+			past_length = bert_utils.get_shape_list(past, expected_rank=[6])[-2]
+
+		features = {}
+		features['input_ids'] = tokens
+		if segment_ids is None:
+			segment_ids = left_segment_id * tf.ones_like(tokens)
+		features['segment_ids'] = tf.cast(segment_ids, tf.int32)
+		features['input_mask'] = tf.cast(tf.ones((token_shape[0], past_length+token_shape[1])), tf.int32)
+		features['past'] = past
+
+		inference_model = model_api(model_config, features, [],
+							mode, target, reuse=tf.AUTO_REUSE,
+							**step_kargs)
+		return inference_model.get_sequence_output_logits(), inference_model.get_present()
+
+	with tf.name_scope('beam_search_sequence'):
+		context_segment_ids = tf.concat([tf.zeros_like(context[:, :-1]), 
+							left_segment_id * tf.ones_like(context[:, -1:])], axis=-1)
+		context_logits, context_presents = step(context, segment_ids=context_segment_ids)
+
+		# the last position is kept for end_token
+		max_decode_length = seq_length - 1 - context_length
+		results = beam_search_utils.beam_search(step,
+								context_logits[:, -1, :],
+								context_presents,
+								batch_size,
+								beam_size,
+								max_decode_length,
+								end_token,
+								alpha=alpha,
+								temperature=temperature,
+								stochastic=stochastic,
+								back_prop=False,
+								swap_memory=kargs.get("swap_memory", True))
+
+		context = tf.tile(tf.expand_dims(context, axis=1), [1, beam_size, 1])
+		end_tokens = end_token * tf.ones_like(context[:, :, :1])
+		samples = tf.concat([context, results['tokens'], end_tokens], axis=-1)
+
+		if kargs.get("mask_type", "left2right") == 'left2right': 
+			# unfinished beams end at the appended end_token
+			lengths = results['lengths'] + 1 - tf.cast(results['finished'], tf.int32)
+			mask_sequence = tf.sequence_mask(context_length + lengths, 
+											maxlen=seq_length)
+			samples *= tf.cast(mask_sequence, tf.int32)
+		else:
+			mask_sequence = tf.ones_like(samples)
+
+		return {
+			"samples":samples,
+			"mask_sequence":mask_sequence,
+			"scores":results['scores'],
+			"log_probs":results['log_probs']
+		}
@@ -0,0 +1,58 @@
+import argparse
+import time
+import numpy as np
+from dpp_map import fast_map_dpp, lazy_map_dpp, batch_lazy_map_dpp
+
+"""
+fast_map_dpp on a dense kernel against the lazy kernel rows rerankers:
+	python dpp_benchmark.py --item_sizes 1000,10000 --max_length 50
+"""
+
+def random_candidates(batch_size, item_size, dim, rng):
+	embeddings = rng.randn(batch_size, item_size, dim)
+	embeddings /= np.linalg.norm(embeddings, axis=-1, keepdims=True)
+	scores = np.exp(rng.rand(batch_size, item_size))
+	return embeddings, scores
+
+def timed(fn, *args, **kargs):
+	start = time.time()
+	output = fn(*args, **kargs)
+	return output, (time.time() - start) * 1000.0
+
+def run(item_size, args, rng):
+	embeddings, scores = random_candidates(args.batch_size, item_size, args.dim, rng)
+	print("item_size: {} dim: {} max_length: {} queries: {}".format(
+			item_size, args.dim, args.max_length, args.batch_size))
+
+	if item_size <= args.max_dense_size:
+		def dense(embeddings, scores):
+			kernel_matrix = scores[:, None] * np.dot(embeddings, embeddings.T) * scores[None, :]
+			return fast_map_dpp(kernel_matrix, args.max_length)
+		dense_items, cost = timed(dense, embeddings[0], scores[0])
+		print("dense kernel + fast_map_dpp: {:.1f} ms per query".format(cost))
+
+	lazy_items, cost = timed(lazy_map_dpp, embeddings[0], scores[0], args.max_length)
+	print("lazy_map_dpp: {:.1f} ms per query".format(cost))
+	if item_size <= args.max_dense_size and list(dense_items) != list(lazy_items):
+		print("warning: lazy and dense selections differ")
+
+	_, cost = timed(lazy_map_dpp, embeddings[0], scores[0], args.max_length,
+					window_size=args.window_size)
+	print("lazy_map_dpp window {}: {:.1f} ms per query".format(args.window_size, cost))
+
+	_, cost = timed(batch_lazy_map_dpp, embeddings, scores, args.max_length)
+	print("batch_lazy_map_dpp: {:.1f} ms per query".format(cost / args.batch_size))
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--item_sizes", type=str, default="1000,10000")
+	parser.add_argument("--dim", type=int, default=64)
+	parser.add_argument("--max_length", type=int, default=50)
+	parser.add_argument("--window_size", type=int, default=10)
+	parser.add_argument("--batch_size", type=int, default=16)
+	parser.add_argument("--max_dense_size", type=int, default=10000)
+	args = parser.parse_args()
+
+	rng = np.random.RandomState(123)
+	for item_size in args.item_sizes.split(","):
+		run(int(item_size), args, rng)
@@ -68,3 +68,112 @@ def greedy_map_dpp(kernel_matrix, max_length):
 		kernel_matrix = numpy.linalg.inv(kernel_matrix[np.ix_(inc_ids, inc_ids)]) - np.eye(num_left)
 		
 	return selected_items
+
+
+def dpp_kernel_rows(embeddings, scores, items):
+	"""
+	rows L[items, :] of the kernel L = diag(q) * E * E^T * diag(q)
+	:param embeddings: 2-d array [item_size, dim], usually l2 normalized
+	:param scores: 1-d array [item_size], quality of each item
+	:param items: list of row ids
+	:return: 2-d array [len(items), item_size]
+	"""
+	return scores[items, None] * np.dot(embeddings[items], embeddings.T) * scores[None, :]
+
+def _condition_on_item(cis, di2s, k, item, row):
+	ci_optimal = cis[:k, item]
+	di_optimal = math.sqrt(di2s[item])
+	eis = (row - np.dot(ci_optimal, cis[:k, :])) / di_optimal
+	cis[k, :] = eis
+	di2s -= np.square(eis)
+
+def lazy_map_dpp(embeddings, scores, max_length, epsilon=1E-10, window_size=None):
+	"""
+	fast_map_dpp without the dense kernel: only the kernel rows of the
+	selected items are computed, O(max_length * item_size * dim) instead
+	of O(item_size^2 * dim) for building the kernel.
+	:param embeddings: 2-d array [item_size, dim]
+	:param scores: 1-d array [item_size], quality of each item
+	:param max_length: positive int
+	:param epsilon: small positive scalar
+	:param window_size: if set, diversity is only enforced against the
+		last window_size selected items, for lists longer than the rank
+		of the kernel. The Cholesky rows are rebuilt from the cached kernel
+		rows of the window whenever the oldest item leaves it.
+	:return: list
+	"""
+	embeddings = np.asarray(embeddings, dtype=np.float64)
+	scores = np.asarray(scores, dtype=np.float64)
+	item_size = embeddings.shape[0]
+	max_length = min(max_length, item_size)
+	window_size = min(window_size or max_length, max_length)
+
+	diag = np.square(scores) * np.einsum("ij,ij->i", embeddings, embeddings)
+	di2s = np.copy(diag)
+	cis = np.zeros((window_size, item_size))
+	available = np.ones(item_size, dtype=bool)
+	window_items, window_rows = [], []
+	selected_items = list()
+	selected_item = np.argmax(di2s)
+	while True:
+		selected_items.append(selected_item)
+		available[selected_item] = False
+		if len(selected_items) == max_length:
+			break
+		row = dpp_kernel_rows(embeddings, scores, [selected_item])[0]
+		if len(window_items) == window_size:
+			window_items.pop(0)
+			window_rows.pop(0)
+			di2s = np.copy(diag)
+			for k, (item, item_row) in enumerate(zip(window_items, window_rows)):
+				_condition_on_item(cis, di2s, k, item, item_row)
+		_condition_on_item(cis, di2s, len(window_items), selected_item, row)
+		window_items.append(selected_item)
+		window_rows.append(row)
+		candidates = np.where(available, di2s, -np.inf)
+		selected_item = np.argmax(candidates)
+		if candidates[selected_item] < epsilon:
+			break
+	return selected_items
+
+def batch_lazy_map_dpp(embeddings, scores, max_length, epsilon=1E-10):
+	"""
+	lazy_map_dpp over independent queries at once
+	:param embeddings: 3-d array [batch_size, item_size, dim]
+	:param scores: 2-d array [batch_size, item_size], queries with fewer
+		candidates are padded with score 0
+	:param max_length: positive int
+	:param epsilon: small positive scalar
+	:return: 2-d int array [batch_size, max_length] padded with -1
+	"""
+	embeddings = np.asarray(embeddings, dtype=np.float64)
+	scores = np.asarray(scores, dtype=np.float64)
+	batch_size, item_size = scores.shape
+	max_length = min(max_length, item_size)
+	batch_index = np.arange(batch_size)
+
+	di2s = np.square(scores) * np.einsum("bnd,bnd->bn", embeddings, embeddings)
+	cis = np.zeros((batch_size, max_length, item_size))
+	available = np.ones((batch_size, item_size), dtype=bool)
+	active = np.ones(batch_size, dtype=bool)
+	selected_items = -np.ones((batch_size, max_length), dtype=np.int64)
+	for k in range(max_length):
+		candidates = np.where(available, di2s, -np.inf)
+		selected_item = np.argmax(candidates, axis=1)
+		if k > 0:
+			active &= candidates[batch_index, selected_item] >= epsilon
+		if not np.any(active):
+			break
+		selected_items[active, k] = selected_item[active]
+		available[batch_index, selected_item] = False
+		if k == max_length - 1:
+			break
+		rows = np.matmul(embeddings, embeddings[batch_index, selected_item][:, :, None])[:, :, 0]
+		rows *= scores[batch_index, selected_item][:, None] * scores
+		ci_optimal = cis[batch_index, :k, selected_item]
+		di_optimal = np.sqrt(np.maximum(di2s[batch_index, selected_item], epsilon))
+		eis = (rows - np.matmul(ci_optimal[:, None, :], cis[:, :k, :])[:, 0, :]) / di_optimal[:, None]
+		eis[~active] = 0.0
+		cis[:, k, :] = eis
+		di2s -= np.square(eis)
+	return selected_items
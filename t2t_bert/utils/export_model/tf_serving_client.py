@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+"""Bulk scoring client for the TF-Serving REST predict API.
+
+Instances are streamed in chunks of `chunk_size`, up to `max_in_flight`
+chunks are posted concurrently over one pooled requests.Session and the
+predictions come back in input order, so they can be written as they
+arrive.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import json
+import time
+
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+
+def chunk_iterator(instances, chunk_size):
+	chunk = []
+	for instance in instances:
+		chunk.append(instance)
+		if len(chunk) == chunk_size:
+			yield chunk
+			chunk = []
+	if chunk:
+		yield chunk
+
+
+def predict_url(url, port, model_name, version=None):
+	if not url.startswith("http"):
+		url = "http://" + url
+	if port:
+		url = "%s:%s" % (url, port)
+	if version:
+		return "%s/v1/models/%s/versions/%s:predict" % (url, model_name, version)
+	return "%s/v1/models/%s:predict" % (url, model_name)
+
+
+class TFServingClient(object):
+	def __init__(self, url, signature_name=None,
+				chunk_size=64,
+				max_in_flight=4,
+				max_retries=3,
+				timeout=30,
+				backoff=0.5):
+		self.url = url
+		self.signature_name = signature_name
+		self.chunk_size = chunk_size
+		self.max_in_flight = max_in_flight
+		self.max_retries = max_retries
+		self.timeout = timeout
+		self.backoff = backoff
+
+		self.session = requests.Session()
+		adapter = requests.adapters.HTTPAdapter(pool_connections=max_in_flight,
+												pool_maxsize=max_in_flight)
+		self.session.mount("http://", adapter)
+		self.session.mount("https://", adapter)
+
+	def predict(self, instances):
+		"""Posts one chunk, retrying connection errors and 5xx responses."""
+		feed_dict = {"instances":instances}
+		if self.signature_name:
+			feed_dict["signature_name"] = self.signature_name
+		for attempt in range(self.max_retries + 1):
+			try:
+				response = self.session.post(self.url, json=feed_dict, timeout=self.timeout)
+				if response.status_code < 500:
+					response.raise_for_status()
+					predictions = response.json()["predictions"]
+					if len(predictions) != len(instances):
+						raise ValueError("got %d predictions for %d instances" % (
+											len(predictions), len(instances)))
+					return predictions
+				error = requests.HTTPError(response.text, response=response)
+			except (requests.ConnectionError, requests.Timeout) as e:
+				error = e
+			if attempt < self.max_retries:
+				time.sleep(self.backoff * (2 ** attempt))
+		raise error
+
+	def predict_stream(self, instances):
+		"""Yields (instance, prediction) in input order.
+
+		At most max_in_flight chunks are pending at once, so the corpus is
+		never held in memory.
+		"""
+		pending = collections.deque()
+		with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+			for chunk in chunk_iterator(instances, self.chunk_size):
+				if len(pending) == self.max_in_flight:
+					for item in self._pop(pending):
+						yield item
+				pending.append((chunk, executor.submit(self.predict, chunk)))
+			while pending:
+				for item in self._pop(pending):
+					yield item
+
+	def _pop(self, pending):
+		chunk, future = pending.popleft()
+		return zip(chunk, future.result())
+
+	def score(self, instances, fwobj, log_every=10000):
+		"""Writes one json prediction per line to fwobj and returns
+		(rows, rows per second)."""
+		start = time.time()
+		rows = 0
+		for _, prediction in self.predict_stream(instances):
+			fwobj.write(json.dumps(prediction, ensure_ascii=False) + "\n")
+			rows += 1
+			if log_every and rows % log_every == 0:
+				print("==scored {} rows, {:.1f} rows/s==".format(rows, rows / (time.time() - start)))
+		elapsed = max(time.time() - start, 1e-6)
+		return rows, rows / elapsed
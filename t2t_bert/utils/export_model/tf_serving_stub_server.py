@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""Local stand-in for the TF-Serving REST predict API.
+
+Answers every :predict request with one fake prediction per instance after
+`latency_ms`, enough to exercise tf_serving_client end to end:
+	python tf_serving_stub_server.py --port 8501 --latency_ms 20
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import time
+
+try:
+	from http.server import BaseHTTPRequestHandler, HTTPServer
+	from socketserver import ThreadingMixIn
+except ImportError:
+	from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+	from SocketServer import ThreadingMixIn
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+
+
+def handler_builder(latency_ms):
+
+	class PredictHandler(BaseHTTPRequestHandler):
+		protocol_version = "HTTP/1.1"
+
+		def do_POST(self):
+			body = self.rfile.read(int(self.headers["Content-Length"]))
+			instances = json.loads(body.decode("utf-8"))["instances"]
+			time.sleep(latency_ms / 1000.0)
+			response = json.dumps({"predictions":[
+						{"pred_label":0, "max_prob":1.0} for _ in instances]}).encode("utf-8")
+			self.send_response(200)
+			self.send_header("Content-Type", "application/json")
+			self.send_header("Content-Length", str(len(response)))
+			self.end_headers()
+			self.wfile.write(response)
+
+		def log_message(self, format, *args):
+			pass
+
+	return PredictHandler
+
+
+def serve(port, latency_ms):
+	server = ThreadingHTTPServer(("127.0.0.1", port), handler_builder(latency_ms))
+	print("==stub tf serving on port {}==".format(server.server_address[1]))
+	return server
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--port", type=int, default=8501)
+	parser.add_argument("--latency_ms", type=float, default=20)
+	args = parser.parse_args()
+	serve(args.port, args.latency_ms).serve_forever()
@@ -5,7 +5,8 @@ def update_model_via_ema(
 	model_trainable_params, 
 	ema_model_params, 
 	ema_model_trainable_params,
-	momentum, just_trainable_vars=False
+	momentum, just_trainable_vars=False,
+	name="ema_update"
 	):
 	iterable = (
 		zip(model_params, ema_model_params)
@@ -19,6 +20,7 @@ def update_model_via_ema(
 	return tf.group(*assignments, name=name)
 
 class MoCoQueue:
+	"""Eager only queue, see MoCoRingQueue for graph mode."""
 	def __init__(self, embedding_dim, max_queue_length):
 		self.embedding_dim = embedding_dim
 		# Put a single zeros key in there to start with, it will be pushed out eventually
@@ -29,4 +31,61 @@ class MoCoQueue:
 	def enqueue(self, new_keys):
 		self.keys = tf.concat([new_keys, self.keys], 0)
 		if self.keys.shape[0] > self.max_queue_length:
-			self.keys = self.keys[:self.max_queue_length]
\ No newline at end of file
+			self.keys = self.keys[:self.max_queue_length]
+
+class MoCoRingQueue(object):
+	"""Fixed size queue of keys for graph mode.
+
+	The keys live in a non-trainable [max_queue_length, embedding_dim]
+	variable, enqueue overwrites the oldest rows in place with
+	scatter_update and advances a pointer, so no step copies the queue.
+	The variables follow the caller's device placement unless device is
+	given, a host queue would be copied to the accelerator by every
+	moco_logits.
+	"""
+	def __init__(self, embedding_dim, max_queue_length,
+				name="moco_queue", trainable=False, device=None):
+		self.embedding_dim = embedding_dim
+		self.max_queue_length = max_queue_length
+		with tf.variable_scope(name):
+			# tf.device(None) would drop the enclosing device scope
+			if device:
+				with tf.device(device):
+					self._create_variables(trainable)
+			else:
+				self._create_variables(trainable)
+
+	def _create_variables(self, trainable):
+		# random unit keys until the queue has been filled once
+		self.keys = tf.get_variable(
+				name="keys",
+				shape=[self.max_queue_length, self.embedding_dim],
+				dtype=tf.float32,
+				trainable=trainable,
+				initializer=tf.initializers.random_normal())
+		self.pointer = tf.get_variable(
+				name="pointer",
+				shape=[],
+				dtype=tf.int32,
+				trainable=False,
+				initializer=tf.zeros_initializer())
+
+	def enqueue(self, new_keys, gather_fn=None):
+		"""Returns the enqueue op of new_keys [batch_size, embedding_dim].
+
+		gather_fn concatenates the keys of every worker, e.g. hvd.allgather
+		or tpu_cross_replica_concat, so all workers keep the same queue.
+		"""
+		new_keys = tf.stop_gradient(tf.cast(new_keys, self.keys.dtype))
+		if gather_fn is not None:
+			new_keys = gather_fn(new_keys)
+		# duplicate indices in one scatter_update are unordered, only the
+		# newest max_queue_length keys can survive anyway
+		new_keys = new_keys[-self.max_queue_length:]
+		batch_size = tf.shape(new_keys)[0]
+		indices = tf.mod(self.pointer + tf.range(batch_size), self.max_queue_length)
+		update_keys = tf.scatter_update(self.keys, indices, new_keys)
+		with tf.control_dependencies([update_keys]):
+			update_pointer = tf.assign(self.pointer,
+									tf.mod(self.pointer + batch_size, self.max_queue_length))
+		return tf.group(update_keys, update_pointer, name="enqueue")
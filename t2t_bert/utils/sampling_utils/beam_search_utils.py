@@ -0,0 +1,171 @@
+import tensorflow as tf
+from utils.bert import bert_utils
+
+"""
+Beam search and stochastic beam search over an incremental kv cache.
+
+The model is driven by
+	step_fn(tokens, past) -> (logits [batch*beam, n, vocab], presents)
+where presents are the cache rows of the n new tokens and are appended to
+past along `cache_axis`. Beams are kept flat as batch*beam rows, on every
+reorder the cache rows are gathered with the surviving beams. A finished
+beam only extends with end_token at no cost, and decoding stops as soon as
+every beam of every example has finished instead of running to the
+maximum length.
+
+stochastic beam search: https://arxiv.org/abs/1903.06059
+"""
+
+NEG_INF = -1e9
+
+def sample_gumbel(shape):
+	U = tf.random_uniform(shape, minval=0.00001, maxval=0.99998)
+	return -tf.log(-tf.log(U))
+
+def gumbel_with_maximum(phi, T):
+	"""Gumbels with locations phi [B, K, V] conditioned on their maximum
+	along the last axis being T [B, K]."""
+	g_phi = phi + sample_gumbel(bert_utils.get_shape_list(phi, expected_rank=3))
+	Z = tf.reduce_max(g_phi, axis=-1, keepdims=True)
+	T = tf.expand_dims(T, axis=-1)
+	u = T - g_phi + tf.log1p(-tf.exp(g_phi - Z))
+	return T - tf.nn.relu(u) - tf.log1p(tf.exp(-tf.abs(u)))
+
+def length_penalty(lengths, alpha):
+	"""GNMT length penalty ((5 + length) / 6) ** alpha."""
+	return tf.pow((5.0 + tf.cast(lengths, tf.float32)) / 6.0, alpha)
+
+def tile_beams(tensor, beam_size):
+	"""[B, ...] -> [B*beam_size, ...], the beams of one example adjacent."""
+	shape = bert_utils.get_shape_list(tensor)
+	tensor = tf.tile(tf.expand_dims(tensor, axis=1), [1, beam_size] + [1] * (len(shape) - 1))
+	return tf.reshape(tensor, [shape[0] * beam_size] + shape[1:])
+
+def beam_search(step_fn,
+				init_logits,
+				init_cache,
+				batch_size,
+				beam_size,
+				max_decode_length,
+				end_token,
+				alpha=0.0,
+				temperature=1.0,
+				stochastic=False,
+				cache_axis=-2,
+				back_prop=False,
+				swap_memory=True):
+	"""Decodes up to max_decode_length tokens for every example.
+
+	Args:
+		step_fn: see module docstring.
+		init_logits: [B, vocab] logits of the first token to decode,
+			usually the last position of a context prefill.
+		init_cache: [B, ...] cache of the prefill.
+		stochastic: sample beams without replacement with Gumbel top-k
+			instead of keeping the top scoring ones.
+
+	Returns:
+		dict with "tokens" [B, beam, max_decode_length] (end_token padded),
+		"lengths" [B, beam] including end_token, "log_probs" [B, beam],
+		"scores" [B, beam] the length normalized log probs, or the
+		perturbed log probs for stochastic beam search, beams sorted by
+		scores, and "finished" [B, beam].
+	"""
+	vocab_size = bert_utils.get_shape_list(init_logits, expected_rank=2)[-1]
+
+	# only the first beam is alive at the start, so the first step does
+	# not select the same token beam_size times
+	init_log_probs = tf.tile(tf.constant([[0.] + [NEG_INF] * (beam_size - 1)]), [batch_size, 1])
+	eos_only = tf.one_hot(end_token, vocab_size, on_value=0.0, off_value=NEG_INF)
+	batch_index = tf.tile(tf.expand_dims(tf.range(batch_size), axis=1), [1, beam_size])
+
+	def expand(log_probs, keys, finished, lengths, next_logits):
+		next_log_probs = tf.nn.log_softmax(next_logits / tf.to_float(temperature), axis=-1)
+		next_log_probs = tf.reshape(next_log_probs, [batch_size, beam_size, vocab_size])
+		finished_mask = tf.expand_dims(tf.cast(finished, tf.float32), axis=-1)
+		next_log_probs = next_log_probs * (1.0 - finished_mask) + eos_only * finished_mask
+
+		cand_log_probs = tf.expand_dims(log_probs, axis=-1) + next_log_probs
+		cand_lengths = lengths + 1 - tf.cast(finished, tf.int32)
+		if stochastic:
+			cand_keys = gumbel_with_maximum(cand_log_probs, keys)
+		else:
+			cand_keys = cand_log_probs / tf.expand_dims(length_penalty(cand_lengths, alpha), axis=-1)
+
+		keys, flat_index = tf.nn.top_k(tf.reshape(cand_keys, [batch_size, -1]), k=beam_size)
+		beam_index = flat_index // vocab_size
+		tokens = flat_index % vocab_size
+
+		log_probs = tf.gather_nd(tf.reshape(cand_log_probs, [batch_size, -1]),
+								tf.stack([batch_index, flat_index], axis=-1))
+		parent_index = tf.stack([batch_index, beam_index], axis=-1)
+		lengths = tf.gather_nd(cand_lengths, parent_index)
+		finished = tf.logical_or(tf.gather_nd(finished, parent_index),
+								tf.equal(tokens, end_token))
+		return log_probs, keys, finished, lengths, tokens, parent_index
+
+	def body(i, alive_seq, log_probs, keys, finished, lengths, next_logits, cache):
+		[log_probs,
+		keys,
+		finished,
+		lengths,
+		tokens,
+		parent_index] = expand(log_probs, keys, finished, lengths, next_logits)
+
+		alive_seq = tf.concat([tf.gather_nd(alive_seq, parent_index),
+								tf.expand_dims(tokens, axis=-1)], axis=-1)
+		cache_index = tf.reshape(batch_index * beam_size + parent_index[:, :, 1], [-1])
+		cache = tf.gather(cache, cache_index)
+
+		logits, presents = step_fn(tf.reshape(tokens, [batch_size * beam_size, 1]), cache)
+		cache = tf.concat([cache, presents], axis=cache_axis)
+		return [i+1, alive_seq, log_probs, keys, finished, lengths, logits[:, -1, :], cache]
+
+	def cond(i, alive_seq, log_probs, keys, finished, *args):
+		return tf.logical_and(i < max_decode_length,
+							tf.logical_not(tf.reduce_all(finished)))
+
+	init_cache = tile_beams(init_cache, beam_size)
+	cache_shape = init_cache.get_shape().as_list()
+	cache_shape[0] = None
+	cache_shape[cache_axis] = None
+	logits_shape = init_logits.get_shape().as_list()
+
+	_, alive_seq, log_probs, keys, finished, lengths, _, _ = tf.while_loop(
+			cond=cond,
+			body=body,
+			loop_vars=[
+				tf.constant(0),
+				tf.zeros([batch_size, beam_size, 0], dtype=tf.int32),
+				init_log_probs,
+				init_log_probs,
+				tf.zeros([batch_size, beam_size], dtype=tf.bool),
+				tf.zeros([batch_size, beam_size], dtype=tf.int32),
+				tile_beams(init_logits, beam_size),
+				init_cache
+			],
+			shape_invariants=[
+				tf.TensorShape([]),
+				tf.TensorShape([None, beam_size, None]),
+				tf.TensorShape([None, beam_size]),
+				tf.TensorShape([None, beam_size]),
+				tf.TensorShape([None, beam_size]),
+				tf.TensorShape([None, beam_size]),
+				tf.TensorShape([None, logits_shape[-1]]),
+				tf.TensorShape(cache_shape)
+			],
+			back_prop=back_prop,
+			swap_memory=swap_memory)
+
+	# beams that stopped early are padded with end_token
+	decoded_length = tf.shape(alive_seq)[-1]
+	tokens = tf.pad(alive_seq, [[0, 0], [0, 0], [0, max_decode_length - decoded_length]],
+					constant_values=end_token)
+
+	return {
+		"tokens":tokens,
+		"lengths":lengths,
+		"log_probs":log_probs,
+		"scores":keys,
+		"finished":finished
+	}
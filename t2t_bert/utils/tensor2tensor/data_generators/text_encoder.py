@@ -27,11 +27,14 @@ from __future__ import print_function
 import collections
 from itertools import chain
 import math
+import multiprocessing
 import re
 import tempfile
 import time
+import zlib
 import numpy as np
 import six
+from six.moves import cPickle as pickle
 from six.moves import range  # pylint: disable=redefined-builtin
 from tensor2tensor.data_generators import tokenizer
 
@@ -646,7 +649,8 @@ class SubwordTextEncoder(TextEncoder):
                            generator,
                            target_size,
                            max_subtoken_length=None,
-                           reserved_tokens=None):
+                           reserved_tokens=None,
+                           num_workers=1):
     """Builds a SubwordTextEncoder from the generated text.
 
     Args:
@@ -659,6 +663,7 @@ class SubwordTextEncoder(TextEncoder):
       reserved_tokens: List of reserved tokens. The global variable
         `RESERVED_TOKENS` must be a prefix of `reserved_tokens`. If this
         argument is `None`, it will use `RESERVED_TOKENS`.
+      num_workers: An integer; number of processes counting subtokens.
 
     Returns:
       SubwordTextEncoder with `vocab_size` approximately `target_size`.
@@ -670,7 +675,8 @@ class SubwordTextEncoder(TextEncoder):
     encoder = cls.build_to_target_size(
         target_size, token_counts, 1, 1e3,
         max_subtoken_length=max_subtoken_length,
-        reserved_tokens=reserved_tokens)
+        reserved_tokens=reserved_tokens,
+        num_workers=num_workers)
     return encoder
 
   @classmethod
@@ -681,7 +687,8 @@ class SubwordTextEncoder(TextEncoder):
                            max_val,
                            max_subtoken_length=None,
                            reserved_tokens=None,
-                           num_iterations=4):
+                           num_iterations=4,
+                           num_workers=1):
     """Builds a SubwordTextEncoder that has `vocab_size` near `target_size`.
 
     Uses simple recursive binary search to find a minimum token count that most
@@ -700,6 +707,9 @@ class SubwordTextEncoder(TextEncoder):
         `RESERVED_TOKENS` must be a prefix of `reserved_tokens`. If this
         argument is `None`, it will use `RESERVED_TOKENS`.
       num_iterations: An integer; how many iterations of refinement.
+      num_workers: An integer; if greater than 1, subtoken candidates are
+        counted by a ParallelSubtokenCounter shared by all bisection probes.
+        The vocabulary is the same as with a single process.
 
     Returns:
       A SubwordTextEncoder instance.
@@ -716,6 +726,10 @@ class SubwordTextEncoder(TextEncoder):
     if reserved_tokens is None:
       reserved_tokens = RESERVED_TOKENS
 
+    subtoken_counter = None
+    if num_workers > 1:
+      subtoken_counter = ParallelSubtokenCounter(token_counts, num_workers)
+
     def bisect(min_val, max_val):
       """Bisection to find the right size."""
       present_count = (max_val + min_val) // 2
@@ -724,7 +738,8 @@ class SubwordTextEncoder(TextEncoder):
       subtokenizer.build_from_token_counts(
           token_counts, present_count, num_iterations,
           max_subtoken_length=max_subtoken_length,
-          reserved_tokens=reserved_tokens)
+          reserved_tokens=reserved_tokens,
+          subtoken_counter=subtoken_counter)
 
       # Being within 1% of the target size is ok.
       is_ok = abs(subtokenizer.vocab_size - target_size) * 100 < target_size
@@ -745,14 +760,52 @@ class SubwordTextEncoder(TextEncoder):
         return other_subtokenizer
       return subtokenizer
 
-    return bisect(min_val, max_val)
+    try:
+      return bisect(min_val, max_val)
+    finally:
+      if subtoken_counter is not None:
+        subtoken_counter.close()
+
+  def _count_subtoken_candidates(self, token_counts, max_subtoken_length=None):
+    """Counts the substrings of tokens that break along current subtoken
+    boundaries.
+
+    Args:
+      token_counts: an iterable of (Unicode token, int count) pairs.
+      max_subtoken_length: Maximum length of a subtoken.
+
+    Returns:
+      a defaultdict of substrings to counts.
+    """
+    subtoken_counts = collections.defaultdict(int)
+    for token, count in token_counts:
+      iter_start_time = time.time()
+      escaped_token = _escape_token(token, self._alphabet)
+      subtokens = self._escaped_token_to_subtoken_strings(escaped_token)
+      start = 0
+      for subtoken in subtokens:
+        last_position = len(escaped_token) + 1
+        if max_subtoken_length is not None:
+          last_position = min(last_position, start + max_subtoken_length)
+
+        for end in range(start + 1, last_position):
+          new_subtoken = escaped_token[start:end]
+          subtoken_counts[new_subtoken] += count
+        start += len(subtoken)
+      iter_time_secs = time.time() - iter_start_time
+      if iter_time_secs > 0.1:
+        tf.logging.info(u"Processing token [{0}] took {1} seconds, consider "
+                        "setting Text2TextProblem.max_subtoken_length to a "
+                        "smaller value.".format(token, iter_time_secs))
+    return subtoken_counts
 
   def build_from_token_counts(self,
                               token_counts,
                               min_count,
                               num_iterations=4,
                               reserved_tokens=None,
-                              max_subtoken_length=None):
+                              max_subtoken_length=None,
+                              subtoken_counter=None):
     """Train a SubwordTextEncoder based on a dictionary of word counts.
 
     Args:
@@ -766,6 +819,8 @@ class SubwordTextEncoder(TextEncoder):
         then the runtime and memory use of creating the vocab is quadratic in
         the length of the longest token. If this is set, then it is instead
         O(max_subtoken_length * length of longest token).
+      subtoken_counter: (optional) a ParallelSubtokenCounter of the same
+        `token_counts`, counts candidates in worker processes.
 
     Raises:
       ValueError: if reserved is not 0 or len(RESERVED_TOKENS). In this case, it
@@ -803,26 +858,11 @@ class SubwordTextEncoder(TextEncoder):
 
       # Collect all substrings of the encoded token that break along current
       # subtoken boundaries.
-      subtoken_counts = collections.defaultdict(int)
-      for token, count in six.iteritems(token_counts):
-        iter_start_time = time.time()
-        escaped_token = _escape_token(token, self._alphabet)
-        subtokens = self._escaped_token_to_subtoken_strings(escaped_token)
-        start = 0
-        for subtoken in subtokens:
-          last_position = len(escaped_token) + 1
-          if max_subtoken_length is not None:
-            last_position = min(last_position, start + max_subtoken_length)
-
-          for end in range(start + 1, last_position):
-            new_subtoken = escaped_token[start:end]
-            subtoken_counts[new_subtoken] += count
-          start += len(subtoken)
-        iter_time_secs = time.time() - iter_start_time
-        if iter_time_secs > 0.1:
-          tf.logging.info(u"Processing token [{0}] took {1} seconds, consider "
-                          "setting Text2TextProblem.max_subtoken_length to a "
-                          "smaller value.".format(token, iter_time_secs))
+      if subtoken_counter is not None:
+        subtoken_counts = subtoken_counter(self, max_subtoken_length)
+      else:
+        subtoken_counts = self._count_subtoken_candidates(
+            six.iteritems(token_counts), max_subtoken_length)
 
       # Array of sets of candidate subtoken strings, by length.
       len_to_subtoken_strings = []
@@ -949,6 +989,98 @@ class SubwordTextEncoder(TextEncoder):
           f.write(unicode_to_native(subtoken_string) + "\n")
 
 
+# Per process (token, count) pairs of a ParallelSubtokenCounter worker.
+_counter_worker_token_counts = None
+
+
+def _init_counter_worker(token_counts):
+  global _counter_worker_token_counts
+  _counter_worker_token_counts = token_counts
+
+
+def _subtoken_partition(subtoken, num_partitions):
+  # crc32 rather than hash(), which differs between spawned processes
+  return zlib.crc32(subtoken.encode("utf-8")) % num_partitions
+
+
+def _count_subtoken_shard(args):
+  """Candidate counts of one shard of the worker's token counts, split
+  into num_partitions pickled dicts of disjoint candidates."""
+  (shard, num_shards, num_partitions, alphabet, subtoken_strings,
+   max_subtoken_length) = args
+  encoder = SubwordTextEncoder()
+  encoder._alphabet = alphabet  # pylint: disable=protected-access
+  encoder._init_subtokens_from_list(subtoken_strings)  # pylint: disable=protected-access
+  counts = encoder._count_subtoken_candidates(  # pylint: disable=protected-access
+      _counter_worker_token_counts[shard::num_shards], max_subtoken_length)
+  partitions = [{} for _ in range(num_partitions)]
+  for subtoken, count in six.iteritems(counts):
+    partitions[_subtoken_partition(subtoken, num_partitions)][subtoken] = count
+  # pickled once here, the parent only forwards the bytes
+  return [pickle.dumps(partition, pickle.HIGHEST_PROTOCOL)
+          for partition in partitions]
+
+
+def _merge_subtoken_partition(pickled_counts):
+  """Sums the counts of one partition over all shards."""
+  subtoken_counts = pickle.loads(pickled_counts[0])
+  for pickled in pickled_counts[1:]:
+    for subtoken, count in six.iteritems(pickle.loads(pickled)):
+      subtoken_counts[subtoken] = subtoken_counts.get(subtoken, 0) + count
+  return subtoken_counts
+
+
+class ParallelSubtokenCounter(object):
+  """Counts subtoken candidates of `token_counts` in worker processes.
+
+  Every call splits the tokens into shards and counts the candidates of
+  each shard in a process pool. Shard counts are split by a hash of the
+  candidate into num_workers partitions, and every partition is summed
+  over the shards in the pool as well, so the parent only joins disjoint
+  dicts. The result is exactly the single process count. Results are
+  cached by vocabulary, so the first refinement
+  iteration, which starts from the alphabet in every probe of
+  `build_to_target_size`, is only counted once.
+  """
+
+  def __init__(self, token_counts, num_workers, num_shards=None, cache_size=2):
+    self._num_shards = num_shards or num_workers
+    self._num_partitions = num_workers
+    self._pool = multiprocessing.Pool(
+        num_workers, initializer=_init_counter_worker,
+        initargs=(list(six.iteritems(token_counts)),))
+    self._cache = collections.OrderedDict()
+    self._cache_size = cache_size
+
+  def __call__(self, encoder, max_subtoken_length=None):
+    # pylint: disable=protected-access
+    subtoken_strings = sorted(encoder._subtoken_string_to_id)
+    key = (tuple(sorted(encoder._alphabet)), tuple(subtoken_strings),
+           max_subtoken_length)
+    if key not in self._cache:
+      shard_partitions = self._pool.map(
+          _count_subtoken_shard,
+          [(shard, self._num_shards, self._num_partitions, encoder._alphabet,
+            subtoken_strings, max_subtoken_length)
+           for shard in range(self._num_shards)])
+      partition_counts = self._pool.map(
+          _merge_subtoken_partition,
+          [[partitions[partition] for partitions in shard_partitions]
+           for partition in range(self._num_partitions)])
+      subtoken_counts = {}
+      for counts in partition_counts:
+        subtoken_counts.update(counts)
+      self._cache[key] = subtoken_counts
+      while len(self._cache) > self._cache_size:
+        self._cache.popitem(last=False)
+    # build_from_token_counts decrements the counts it is given
+    return collections.defaultdict(int, self._cache[key])
+
+  def close(self):
+    self._pool.close()
+    self._pool.join()
+
+
 class ImageEncoder(object):
   """Encoder class for saving and loading images."""
 
@@ -47,6 +47,8 @@ tf.flags.DEFINE_integer('corpus_max_lines', 10000,
                         'How many lines of corpus to read')
 tf.flags.DEFINE_integer('num_iterations', 4, 'Number of iterations')
 tf.flags.DEFINE_bool('split_on_newlines', True, 'Break corpus into lines.')
+tf.flags.DEFINE_integer('num_workers', 1,
+                        'Processes counting subtoken candidates')
 FLAGS = tf.flags.FLAGS
 
 
@@ -69,9 +71,16 @@ def main(unused_argv):
     raise ValueError(
         'Must provide one of --corpus_filepattern or --vocab_filepattern')
 
+  subtoken_counter = None
+  if FLAGS.num_workers > 1:
+    subtoken_counter = text_encoder.ParallelSubtokenCounter(token_counts,
+                                                            FLAGS.num_workers)
   encoder = text_encoder.SubwordTextEncoder()
   encoder.build_from_token_counts(token_counts, FLAGS.min_count,
-                                  FLAGS.num_iterations)
+                                  FLAGS.num_iterations,
+                                  subtoken_counter=subtoken_counter)
+  if subtoken_counter is not None:
+    subtoken_counter.close()
   encoder.store_to_file(FLAGS.output_filename)
 
 
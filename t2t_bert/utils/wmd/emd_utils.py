@@ -1,63 +1,193 @@
+import heapq
 import numpy as np
 from pyemd import emd
+from concurrent.futures import ProcessPoolExecutor
 
+"""
+Word mover's distance, http://proceedings.mlr.press/v37/kusnerb15.pdf
 
-def wmd_distance(w2v_model, document1, document2, distance_metric=None):
-	len_pre_oov1 = len(document1)
-	len_pre_oov2 = len(document2)
-	document1 = [token for token in document1 if token in w2v_model]
-	document2 = [token for token in document2 if token in w2v_model]
-	diff1 = len_pre_oov1 - len(document1)
-	diff2 = len_pre_oov2 - len(document2)
+WMDEngine keeps the word vectors and nBOW weights of a corpus as one
+matrix and answers nearest neighbor queries with prefetch and prune:
+candidates are ordered by the word centroid distance (WCD), pruned with
+the relaxed WMD (RWMD) lower bound, and only the survivors are solved
+exactly with emd, in a process pool when n_jobs > 1.
+"""
+
+def pairwise_distance(x, y, distance_metric='euclidean'):
+	"""Word distances [m, n] of x [m, d] and y [n, d], for cosine
+	x and y are expected to be l2 normalized."""
+	if distance_metric == 'cosine':
+		return np.maximum(1.0 - np.dot(x, y.T), 0.0)
+	distance = np.dot(x, y.T)
+	distance *= -2
+	distance += np.sum(np.square(x), axis=1)[:, None]
+	distance += np.sum(np.square(y), axis=1)[None, :]
+	return np.sqrt(np.maximum(distance, 0.0, out=distance))
+
+def nbow(w2v_model, document, distance_metric='euclidean'):
+	"""Unique in-vocabulary tokens, their vectors and normalized word
+	frequencies of a tokenized document."""
+	tokens, counts = {}, []
+	for token in document:
+		if token not in w2v_model:
+			continue
+		if token not in tokens:
+			tokens[token] = len(counts)
+			counts.append(0.0)
+		counts[tokens[token]] += 1
+	tokens = sorted(tokens, key=tokens.get)
+	if not tokens:
+		return tokens, np.zeros((0, 0)), np.zeros(0)
+	vectors = np.array([w2v_model[token] for token in tokens], dtype=np.double)
+	if distance_metric == 'cosine':
+		vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-10
+	weights = np.array(counts) / np.sum(counts)
+	return tokens, vectors, weights
+
+def exact_wmd(args):
+	"""emd between weights1 [m] and weights2 [n] with word distances [m, n]."""
+	weights1, weights2, distance = args
+	if np.sum(distance) == 0.0:
+		# `emd` gets stuck if the distance matrix contains only zeros.
+		return 1e-10
+	m, n = distance.shape
+	distance_matrix = np.zeros((m + n, m + n), dtype=np.double)
+	distance_matrix[:m, m:] = distance
+	distance_matrix[m:, :m] = distance.T
+	return emd(np.concatenate([weights1, np.zeros(n)]),
+				np.concatenate([np.zeros(m), weights2]),
+				distance_matrix)
 
-	dictionary = list(set(document1+document2))
-	vocab_len = len(dictionary)
+def wmd_distance(w2v_model, document1, document2, distance_metric=None):
+	tokens1, vectors1, weights1 = nbow(w2v_model, document1, distance_metric)
+	tokens2, vectors2, weights2 = nbow(w2v_model, document2, distance_metric)
 
-	if vocab_len == 1:
+	if len(set(tokens1 + tokens2)) == 1:
 		# Both documents are composed by a single unique token
 		return 0.0
 
-	# Sets for faster look-up.
-	docset1 = set(document1)
-	docset2 = set(document2)
+	distance = pairwise_distance(vectors1, vectors2, distance_metric)
+	return exact_wmd((weights1, weights2, distance))
 
-	# Compute distance matrix.
-	distance_matrix = np.zeros((vocab_len, vocab_len), dtype=np.double)
-	for i, t1 in enumerate(dictionary):
-		if t1 not in docset1:
-			continue
-		for j, t2 in enumerate(dictionary):
-			if t2 not in docset2 or distance_matrix[i, j] != 0.0:
-				continue
-			if distance_metric == 'euclidean':
-				# Compute Euclidean distance between word vectors.
-				euclidean_distance = sqrt(np.sum((w2v_model[t1] - w2v_model[t2])**2))
-				distance_matrix[i, j] = distance_matrix[j, i] = euclidean_distance
-			elif distance_metric == 'cosine':
-				t1_norm = np.sqrt(np.sum(np.power((w2v_model[t1]), 2)))
-				t2_norm = np.sqrt(np.sum(np.power((w2v_model[t2]), 2)))
-				cos_distance = np.sum(w2v_model[t1]*w2v_model[t2]) / (t1_norm*t2_norm+1e-10) 
-				distance_matrix[i, j] = distance_matrix[j, i] = 1 - cos_distance
-			else:
-				euclidean_distance = np.sqrt(np.sum((w2v_model[t1] - w2v_model[t2])**2))
-				distance_matrix[i, j] = distance_matrix[j, i] = euclidean_distance
-	
-	if np.sum(distance_matrix) == 0.0:
-		# `emd` gets stuck if the distance matrix contains only zeros.
-		return 1e-10
+class WMDEngine(object):
+	def __init__(self, w2v_model, documents, distance_metric='euclidean',
+				n_jobs=1, chunk_size=4096):
+		self.w2v_model = w2v_model
+		self.distance_metric = distance_metric
+		self.n_jobs = n_jobs
+		self.chunk_size = chunk_size
+		self.executor = None
+
+		vectors, weights, lengths = [], [], []
+		for document in documents:
+			_, doc_vectors, doc_weights = nbow(w2v_model, document, distance_metric)
+			if len(doc_weights):
+				vectors.append(doc_vectors)
+				weights.append(doc_weights)
+			lengths.append(len(doc_weights))
+		self.vectors = np.concatenate(vectors, axis=0) if vectors else np.zeros((0, 0))
+		self.weights = np.concatenate(weights) if weights else np.zeros(0)
+		dim = self.vectors.shape[1]
+		self.offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+		self.num_documents = len(lengths)
+		self.non_empty = np.where(np.asarray(lengths) > 0)[0]
+
+		# word centroids, WCD <= WMD for euclidean word distances
+		self.centroids = np.zeros((self.num_documents, dim))
+		for index in self.non_empty:
+			start, end = self.offsets[index], self.offsets[index+1]
+			self.centroids[index] = np.dot(self.weights[start:end], self.vectors[start:end])
+
+	def close(self):
+		if self.executor is not None:
+			self.executor.shutdown()
+			self.executor = None
+
+	def _word_index(self, doc_index):
+		"""Rows of the corpus word matrix of doc_index and their local offsets."""
+		starts = self.offsets[doc_index]
+		lengths = self.offsets[doc_index+1] - starts
+		local_offsets = np.concatenate([[0], np.cumsum(lengths)])
+		word_index = np.repeat(starts - local_offsets[:-1], lengths) + np.arange(local_offsets[-1])
+		return word_index, local_offsets
+
+	def wcd(self, query_vectors, query_weights, doc_index):
+		centroid = np.dot(query_weights, query_vectors)
+		return np.linalg.norm(self.centroids[doc_index] - centroid[None, :], axis=1)
+
+	def rwmd(self, query_vectors, query_weights, doc_index):
+		"""Relaxed WMD of the query against doc_index (non empty documents),
+		computed chunk by chunk with one distance block per chunk."""
+		output = []
+		for start in range(0, len(doc_index), self.chunk_size):
+			word_index, local_offsets = self._word_index(doc_index[start:start+self.chunk_size])
+			distance = pairwise_distance(query_vectors, self.vectors[word_index], self.distance_metric)
+			# every query word moves to its closest word of the document
+			query_cost = np.dot(query_weights,
+								np.minimum.reduceat(distance, local_offsets[:-1], axis=1))
+			# every document word moves to its closest query word
+			doc_cost = np.add.reduceat(self.weights[word_index] * np.min(distance, axis=0),
+										local_offsets[:-1])
+			output.append(np.maximum(query_cost, doc_cost))
+		return np.concatenate(output) if output else np.zeros(0)
+
+	def _exact(self, query_vectors, query_weights, doc_index):
+		args = []
+		for index in doc_index:
+			start, end = self.offsets[index], self.offsets[index+1]
+			args.append((query_weights, self.weights[start:end],
+						pairwise_distance(query_vectors, self.vectors[start:end],
+										self.distance_metric)))
+		if self.n_jobs > 1 and len(args) > 1:
+			if self.executor is None:
+				self.executor = ProcessPoolExecutor(max_workers=self.n_jobs)
+			return list(self.executor.map(exact_wmd, args,
+										chunksize=max(1, len(args) // (4 * self.n_jobs))))
+		return [exact_wmd(item) for item in args]
+
+	def nearest_neighbors(self, document, k=10, block_size=None):
+		"""k closest corpus documents of a tokenized document as a list of
+		(doc index, wmd) sorted by wmd. The result is exact, the bounds
+		only decide which documents need an emd solve."""
+		_, query_vectors, query_weights = nbow(self.w2v_model, document, self.distance_metric)
+		if not len(query_weights) or not len(self.non_empty):
+			return []
+		block_size = block_size or max(k, 4 * self.n_jobs)
+
+		# max heap of the best k as (-wmd, doc index)
+		heap = []
+		def push(doc_index, distances):
+			for index, distance in zip(doc_index, distances):
+				if len(heap) < k:
+					heapq.heappush(heap, (-distance, index))
+				elif distance < -heap[0][0]:
+					heapq.heapreplace(heap, (-distance, index))
+
+		def threshold():
+			return -heap[0][0] if len(heap) == k else np.inf
+
+		candidates = self.non_empty
+		lower_bound = np.zeros(len(candidates))
+		if self.distance_metric != 'cosine':
+			# prefetch: exact solves of the k best WCD documents
+			lower_bound = self.wcd(query_vectors, query_weights, candidates)
+			order = np.argsort(lower_bound, kind="mergesort")
+			push(candidates[order[:k]], self._exact(query_vectors, query_weights, candidates[order[:k]]))
+			order = order[k:]
+			order = order[lower_bound[order] < threshold()]
+			candidates, lower_bound = candidates[order], lower_bound[order]
+
+		lower_bound = np.maximum(lower_bound, self.rwmd(query_vectors, query_weights, candidates))
+		order = np.argsort(lower_bound, kind="mergesort")
+		candidates, lower_bound = candidates[order], lower_bound[order]
+		for start in range(0, len(candidates), block_size):
+			keep = lower_bound[start:start+block_size] < threshold()
+			if not np.any(keep):
+				break
+			block = candidates[start:start+block_size][keep]
+			push(block, self._exact(query_vectors, query_weights, block))
+
+		return sorted([(index, -distance) for distance, index in heap], key=lambda item: item[1])
 
-	keys = dict((e[1], e[0]) for e in enumerate(dictionary))
-	def nbow(document):
-		d = np.zeros(vocab_len, dtype=np.double)
-		for word in document:
-			d[keys[word]] += 1
-		doc_len = len(document)
-		for idx, freq in enumerate(d):
-			d[idx] = freq / float(doc_len)  # Normalized word frequencies.
-		return d
-
-	# Compute nBOW representation of documents.
-	d1 = nbow(document1)
-	d2 = nbow(document2)
-
-	return emd(d1, d2, distance_matrix)
\ No newline at end of file
+	def batch_nearest_neighbors(self, documents, k=10, block_size=None):
+		return [self.nearest_neighbors(document, k, block_size) for document in documents]